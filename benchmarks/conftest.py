@@ -0,0 +1,116 @@
+"""Benchmark fixture with baselines.
+
+Every benchmark measures the best time of several runs and compares it with the baseline stored
+in `baseline.json`. Benchmark fails if it is slower than the baseline by more than the tolerance.
+Baselines depend on a machine, so regenerate them with `--bench-update` before comparing changes locally.
+"""
+import gc
+import json
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+import pytest
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    """Add benchmark options."""
+    group = parser.getgroup("benchmarks")
+    group.addoption(
+        "--bench-update",
+        action="store_true",
+        default=False,
+        help="store measured times as new baselines instead of comparing with them",
+    )
+    group.addoption(
+        "--bench-tolerance",
+        type=float,
+        default=2.0,
+        help="maximum allowed ratio of measured time to the baseline (default: 2.0)",
+    )
+    group.addoption(
+        "--bench-baseline",
+        type=Path,
+        default=BASELINE_PATH,
+        help=f"path to baselines file (default: {BASELINE_PATH.name} near benchmarks)",
+    )
+
+
+class Benchmark:
+    """Measure callable and check the result against the baseline."""
+
+    # timer resolution and scheduling noise make relative comparison of tiny times meaningless
+    MIN_SLACK = 0.001
+
+    def __init__(self, name: str, baseline: Optional[float], tolerance: float, results: Dict[str, float]) -> None:
+        """Init benchmark with its name and baseline time in seconds."""
+        self.name = name
+        self.baseline = baseline
+        self.tolerance = tolerance
+        self.results = results
+
+    def __call__(self, func: Callable[[], object], repeat: int = 5) -> float:
+        """Run callable several times and get the best time in seconds. Garbage collection is disabled meanwhile.
+
+        Raises:
+            pytest.fail.Exception: time exceeds the baseline.
+        """
+        func()  # warm up caches
+        best = float("inf")
+        gc_enabled = gc.isenabled()
+        gc.disable()  # garbage collection pauses are the main source of noise, the same as for `timeit`
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func()
+                best = min(best, time.perf_counter() - start)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.results[self.name] = best
+
+        if self.baseline is not None:
+            limit = max(self.baseline * self.tolerance, self.baseline + self.MIN_SLACK)
+            if best > limit:
+                pytest.fail(
+                    f"{self.name}: {best * 1000:.2f} ms is slower than baseline {self.baseline * 1000:.2f} ms "
+                    f"(tolerance {self.tolerance}x)"
+                )
+        return best
+
+
+@pytest.fixture(scope="session")
+def bench_results(request: pytest.FixtureRequest) -> Iterator[Dict[str, float]]:
+    """Times measured within the session. Baselines are updated with them at the end if requested."""
+    results: Dict[str, float] = {}
+    yield results
+
+    config = request.config
+    path: Path = config.getoption("--bench-baseline")
+    if config.getoption("--bench-update") and results:
+        baselines = _load_baselines(path)
+        baselines.update(results)
+        path.write_text(json.dumps({k: round(v, 6) for k, v in sorted(baselines.items())}, indent=1) + "\n")
+
+
+@pytest.fixture
+def benchmark(request: pytest.FixtureRequest, bench_results: Dict[str, float]) -> Benchmark:
+    """Benchmark for the current test. Benchmark is named after the test."""
+    config = request.config
+    name = request.node.nodeid.split("::", 1)[1]
+    baseline = None if config.getoption("--bench-update") else _load_baselines(config.getoption("--bench-baseline"))
+    return Benchmark(
+        name=name,
+        baseline=None if baseline is None else baseline.get(name),
+        tolerance=config.getoption("--bench-tolerance"),
+        results=bench_results,
+    )
+
+
+def _load_baselines(path: Path) -> Dict[str, float]:
+    """Load stored baselines."""
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
@@ -0,0 +1,73 @@
+"""Generators of synthetic package sets.
+
+Shape of a package set is a mapping from package name to names of its dependencies, where dependencies are
+always listed before the package. The same shape can be turned into already resolved packages to benchmark
+graph algorithms in isolation, or installed into a site directory to benchmark real metadata lookups.
+"""
+import random
+from pathlib import Path
+from typing import Dict, List
+
+from pip_hdl.metainfo import PackageMetaInfo
+from tests.conftest import FakeSitePackages
+
+Shape = Dict[str, List[str]]
+
+
+def chain(size: int) -> Shape:
+    """Every package requires the previous one."""
+    return {f"chain_{i}": [f"chain_{i - 1}"] if i else [] for i in range(size)}
+
+
+def fan_out(size: int) -> Shape:
+    """Single common package is required by all the others."""
+    shape: Shape = {"common": []}
+    shape.update({f"consumer_{i}": ["common"] for i in range(size - 1)})
+    return shape
+
+
+def layered_diamond(layers: int, width: int) -> Shape:
+    """Layers of packages, where every package requires all packages of the previous layer.
+
+    The first and the last layers consist of a single package, so the shape starts and ends with a diamond tip.
+    """
+    shape: Shape = {"bottom": []}
+    previous = ["bottom"]
+    for layer in range(layers):
+        current = [f"layer_{layer}_{i}" for i in range(width)]
+        shape.update({name: list(previous) for name in current})
+        previous = current
+    shape["top"] = previous
+    return shape
+
+
+def random_dag(size: int, fanout: int = 4, seed: int = 0) -> Shape:
+    """Every package requires up to `fanout` random packages created before it."""
+    rng = random.Random(seed)
+    shape: Shape = {}
+    for i in range(size):
+        shape[f"ip_core_{i}"] = rng.sample(list(shape), min(fanout, len(shape)))
+    return shape
+
+
+def requested(shape: Shape) -> List[str]:
+    """Packages nobody depends on, i.e. the ones to be requested by a user."""
+    required = {dep for deps in shape.values() for dep in deps}
+    return [name for name in shape if name not in required]
+
+
+def resolved_packages(shape: Shape) -> List[PackageMetaInfo]:
+    """Create already resolved packages of the shape, no metadata lookups are done for them. Requested are returned."""
+    packages: Dict[str, PackageMetaInfo] = {}
+    for name, deps in shape.items():
+        filelist = Path("/site-packages") / name / PackageMetaInfo.FILELIST_NAME
+        packages[name] = PackageMetaInfo.from_resolved(name, filelist, [packages[d] for d in deps])
+    return [packages[name] for name in requested(shape)]
+
+
+def install(shape: Shape, root: Path) -> FakeSitePackages:
+    """Install packages of the shape into a site directory the same way as pip does it."""
+    site = FakeSitePackages(root)
+    for name, deps in shape.items():
+        site.install(name, requires=[d.replace("_", "-") for d in deps])
+    return site
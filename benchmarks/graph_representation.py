@@ -0,0 +1,87 @@
+"""Measure memory footprint and traversal time of `DependencyGraph`.
+
+Memory is compared with the same graph, where nodes and meta-information of packages keep their attributes
+within per-instance dictionaries (as before they got `__slots__`). Such graph differs only by sizes of
+these instances, so it is estimated by replacing sizes of slotted instances with sizes of dictionary-based copies.
+
+Usage:
+    python -m benchmarks.graph_representation [NODES] [FANOUT]
+"""
+import sys
+import time
+import tracemalloc
+from typing import Callable, Iterable, List, Tuple, TypeVar
+
+from benchmarks.generators import random_dag, resolved_packages
+from pip_hdl.graph import DependencyGraph
+
+T = TypeVar("T")
+
+
+def measure_memory(build: Callable[[], T]) -> Tuple[T, int]:
+    """Build an object and get number of bytes allocated for it."""
+    tracemalloc.start()
+    try:
+        obj = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return obj, size
+
+
+class _Unslotted:
+    """Object with attributes kept within a per-instance dictionary."""
+
+
+def instances_size(objs: Iterable[object], unslotted: bool) -> int:
+    """Get number of bytes taken by objects themselves, or by their copies with per-instance dictionaries."""
+    size = 0
+    for obj in objs:
+        if not unslotted:
+            size += sys.getsizeof(obj)
+            continue
+        copy = _Unslotted()
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if hasattr(obj, name):
+                    setattr(copy, name, getattr(obj, name))
+        size += sys.getsizeof(copy) + sys.getsizeof(copy.__dict__)
+    return size
+
+
+def measure_time(func: Callable[[], object], repeat: int = 5) -> float:
+    """Get the best time of several runs in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    """Run benchmark and print results."""
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    fanout = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    packages, packages_bytes = measure_memory(lambda: resolved_packages(random_dag(nodes, fanout)))
+    graph, graph_bytes = measure_memory(lambda: DependencyGraph(packages))
+
+    instances = [*graph.nodes.values(), *(n.metainfo for n in graph.nodes.values())]
+    slotted_bytes = packages_bytes + graph_bytes
+    unslotted_bytes = slotted_bytes - instances_size(instances, False) + instances_size(instances, True)
+
+    print(f"{nodes} nodes, up to {fanout} dependencies per node")
+    print(f"{'':24}{'__dict__':>12}{'__slots__':>12}")
+    print(f"{'memory, KiB':24}{unslotted_bytes / 1024:12.1f}{slotted_bytes / 1024:12.1f}")
+    print(f"{'memory per node, B':24}{unslotted_bytes / nodes:12.1f}{slotted_bytes / nodes:12.1f}")
+    rows: List[Tuple[str, Callable[[], object]]] = [
+        ("traverse, ms", lambda: list(graph)),
+        ("traverse by id, ms", lambda: list(graph.traverse(key=lambda n: n.id))),
+        ("levels, ms", graph.levels),
+    ]
+    for title, func in rows:
+        print(f"{title:24}{'':12}{measure_time(func) * 1000:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
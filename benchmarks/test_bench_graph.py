@@ -0,0 +1,58 @@
+"""Benchmarks of graph algorithms on synthetic package sets."""
+import random
+
+import pytest
+
+from benchmarks.conftest import Benchmark
+from benchmarks.generators import Shape, chain, fan_out, layered_diamond, random_dag, resolved_packages
+from pip_hdl.graph import DependencyGraph
+
+SHAPES = {
+    "chain": chain(5_000),
+    "fan_out": fan_out(5_000),
+    "layered_diamond": layered_diamond(layers=50, width=20),
+    "random_dag": random_dag(5_000),
+}
+
+
+@pytest.fixture(params=list(SHAPES))
+def shape(request: pytest.FixtureRequest) -> Shape:
+    """Package set of every shape."""
+    return SHAPES[request.param]
+
+
+def test_construction(benchmark: Benchmark, shape: Shape):
+    """Build graph from resolved packages."""
+    packages = resolved_packages(shape)
+    benchmark(lambda: DependencyGraph(packages))
+
+
+def test_traverse(benchmark: Benchmark, shape: Shape):
+    """Traverse graph in discovery order."""
+    graph = DependencyGraph(resolved_packages(shape))
+    benchmark(lambda: list(graph))
+
+
+def test_traverse_by_id(benchmark: Benchmark, shape: Shape):
+    """Traverse graph in deterministic order."""
+    graph = DependencyGraph(resolved_packages(shape))
+    benchmark(lambda: list(graph.traverse(key=lambda n: n.id)))
+
+
+def test_levels(benchmark: Benchmark, shape: Shape):
+    """Group graph nodes by levels."""
+    graph = DependencyGraph(resolved_packages(shape))
+    benchmark(graph.levels)
+
+
+def test_reachability(benchmark: Benchmark, shape: Shape):
+    """Build reachability index and query it many times."""
+    packages = resolved_packages(shape)
+    ids = random.Random(0).sample(list(shape), 1_000)
+
+    def run() -> None:
+        graph = DependencyGraph(packages)
+        for node_id in ids:
+            graph.descendants([node_id])
+
+    benchmark(run, repeat=3)
@@ -0,0 +1,74 @@
+"""Benchmarks of metadata resolution and CLI on packages installed into a site directory."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import pytest
+
+from benchmarks.conftest import Benchmark
+from benchmarks.generators import install, random_dag, requested
+from pip_hdl.graph import DependencyGraph
+from pip_hdl.requirements import load_packages
+
+REPO_ROOT = Path(__file__).parent.parent
+
+
+@pytest.fixture(scope="module")
+def requirements(tmp_path_factory: pytest.TempPathFactory) -> Iterator[Path]:
+    """Requirements file for a random set of packages installed into a site directory visible for the interpreter."""
+    root = tmp_path_factory.mktemp("bench")
+    shape = random_dag(300)
+    site = install(shape, root / "site-packages")
+    path = root / "requirements.txt"
+    path.write_text("".join(f"{name}\n" for name in requested(shape)))
+
+    sys.path.insert(0, str(site.root))
+    modules_before = set(sys.modules)
+    yield path
+    sys.path.remove(str(site.root))
+    for module in set(sys.modules) - modules_before:
+        del sys.modules[module]
+
+
+@pytest.fixture
+def cli_env(requirements: Path, tmp_path: Path) -> Dict[str, str]:
+    """Environment to run CLI in a subprocess with the same site directory."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(REPO_ROOT), str(requirements.parent / "site-packages")])
+    env["PIP_HDL_CACHE_DIR"] = str(tmp_path / "cache")
+    env["PIP_HDL_SOCKET"] = str(tmp_path / "no-daemon.sock")
+    return env
+
+
+def _inspect(env: Dict[str, str], *args: str) -> None:
+    """Run `pip-hdl inspect` in a subprocess."""
+    cmd: List[str] = [sys.executable, "-c", "from pip_hdl.cli import enter_cli; enter_cli()", "inspect", *args]
+    subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def test_resolve(benchmark: Benchmark, requirements: Path):
+    """Resolve packages from requirements file and build a graph."""
+    benchmark(lambda: DependencyGraph(load_packages(str(requirements))), repeat=3)
+
+
+def test_resolve_filelists(benchmark: Benchmark, requirements: Path):
+    """Resolve packages and find filelists of all of them."""
+
+    def run() -> None:
+        for node in DependencyGraph(load_packages(str(requirements))):
+            node.metainfo.filelist
+
+    benchmark(run, repeat=3)
+
+
+def test_inspect_no_cache(benchmark: Benchmark, requirements: Path, cli_env: Dict[str, str]):
+    """End-to-end latency of `inspect` resolving packages from scratch."""
+    benchmark(lambda: _inspect(cli_env, str(requirements), "all_filelists", "--no-cache"), repeat=3)
+
+
+def test_inspect_cached(benchmark: Benchmark, requirements: Path, cli_env: Dict[str, str]):
+    """End-to-end latency of `inspect` with warm cache."""
+    _inspect(cli_env, str(requirements), "all_filelists")
+    benchmark(lambda: _inspect(cli_env, str(requirements), "all_filelists"), repeat=3)
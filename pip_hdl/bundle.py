@@ -0,0 +1,272 @@
+"""Bundle of package sources staged into a single directory.
+
+Sources root of every package in a graph is mirrored to `OUTDIR/<package>/`, and filelists of all packages
+are merged into a single `OUTDIR/filelist.f` in dependency-aware order, where all paths are relative
+to `OUTDIR`. So the bundle doesn't need any environment variables and can be moved as a whole.
+
+Files are not copied if it can be avoided: hardlinks are tried first, then reflinks (copy-on-write clones),
+and a regular copy is done only if neither is supported (e.g. bundle is on another filesystem).
+Bundle is staged incrementally: packages are restaged only if any file within their sources root is changed.
+"""
+from __future__ import annotations
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+from . import timings
+from .filelist import EntryKind, FilelistEntry, expand_graph
+from .graph import DependencyGraph, GraphNode
+from .report import write_if_changed
+
+
+class LinkMode(str, Enum):
+    """How files are staged into a bundle."""
+
+    AUTO = "auto"  # hardlink, then reflink, then copy
+    HARDLINK = "hardlink"
+    REFLINK = "reflink"
+    SYMLINK = "symlink"
+    COPY = "copy"
+
+
+class BundleResult(NamedTuple):
+    """Result of bundle staging."""
+
+    filelist: Path
+    staged: List[str]  # packages staged during this run
+    unchanged: List[str]
+    removed: List[str]  # packages removed from the bundle, as they are not in the graph anymore
+    methods: Dict[str, int]  # number of files staged with every method
+
+
+def _reflink(src: str, dst: str) -> None:
+    """Clone file with copy-on-write (Linux `FICLONE` ioctl), data is shared until any of files is changed."""
+    if sys.platform != "linux":
+        raise OSError(errno.EOPNOTSUPP, "reflinks are supported only on Linux")
+    import fcntl
+
+    ficlone = 0x40049409
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), ficlone, fsrc.fileno())
+        except OSError:
+            os.unlink(dst)
+            raise
+
+
+def _symlink(src: str, dst: str) -> None:
+    """Create symlink to the absolute path of the source."""
+    os.symlink(os.path.abspath(src), dst)
+
+
+def _copy(src: str, dst: str) -> None:
+    """Copy file with metadata."""
+    shutil.copy2(src, dst)
+
+
+_LINK_FUNCS: Dict[str, Callable[[str, str], None]] = {
+    "hardlink": os.link,
+    "reflink": _reflink,
+    "symlink": _symlink,
+    "copy": _copy,
+}
+
+_METHODS = {
+    LinkMode.AUTO: ("hardlink", "reflink", "copy"),
+    LinkMode.HARDLINK: ("hardlink", "copy"),
+    LinkMode.REFLINK: ("reflink", "copy"),
+    LinkMode.SYMLINK: ("symlink", "copy"),
+    LinkMode.COPY: ("copy",),
+}
+
+# Errors which mean that a method is not supported for the bundle at all, so it is not tried anymore
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOSYS, errno.EPERM, errno.EINVAL}
+_UNSUPPORTED_ERRNOS.add(getattr(errno, "ENOTTY", errno.EINVAL))
+
+# Directories within sources roots, which are never staged
+_IGNORED_DIRS = {"__pycache__"}
+
+
+class _Linker:
+    """Stage files with the first supported method."""
+
+    def __init__(self, mode: LinkMode) -> None:
+        """Init linker with methods to be tried in order."""
+        self.methods = list(_METHODS[mode])
+        self.unsupported: Set[str] = set()
+
+    def link(self, src: str, dst: str) -> str:
+        """Stage file. Returns name of the method used."""
+        error: Optional[OSError] = None
+        for method in self.methods:
+            if method in self.unsupported:
+                continue
+            try:
+                _LINK_FUNCS[method](src, dst)
+                return method
+            except OSError as e:
+                if e.errno in _UNSUPPORTED_ERRNOS and method != "copy":
+                    self.unsupported.add(method)  # set update is atomic, so it is safe to do from any thread
+                error = e
+        raise error or OSError(errno.EOPNOTSUPP, f"no method to stage {src}")
+
+
+class Bundle:
+    """Directory with sources of all packages and a merged filelist."""
+
+    FORMAT_VERSION = 1
+    FILELIST_NAME = "filelist.f"
+    MANIFEST_NAME = ".pip-hdl-bundle.json"
+
+    def __init__(self, outdir: Path) -> None:
+        """Init bundle within a directory and load state of the previous staging if any."""
+        self.outdir = outdir
+        self.mode: Optional[str] = None
+        self.packages: Dict[str, Tuple[str, str]] = {}  # package -> (sources root, digest of the tree)
+
+        manifest = outdir / self.MANIFEST_NAME
+        try:
+            with manifest.open("r") as f:
+                data = json.load(f)
+            if data.get("version") == self.FORMAT_VERSION:
+                self.mode = data["mode"]
+                self.packages = {k: (v[0], v[1]) for k, v in data["packages"].items()}
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            pass  # bundle is staged from scratch
+
+    def stage(
+        self,
+        graph: DependencyGraph,
+        mode: LinkMode = LinkMode.AUTO,
+        env: Optional[Mapping[str, str]] = None,
+        jobs: Optional[int] = None,
+    ) -> BundleResult:
+        """Stage sources of all packages in the graph and write merged filelist.
+
+        Args:
+            graph: Graph with packages to bundle.
+            mode: How files are staged.
+            env: Environment variables to substitute along with variables for sources of all packages.
+                Process environment is used if not provided.
+            jobs: Number of packages to scan and stage in parallel.
+        """
+        nodes = list(graph.traverse(key=lambda n: n.id))
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        linker = _Linker(mode)
+        previous = self.packages if self.mode == mode.value else {}  # files staged with another method are restaged
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            with timings.span("bundle.scan"):
+                trees = dict(zip((n.id for n in nodes), pool.map(_scan_tree, (n.metainfo.sources_root for n in nodes))))
+            changed = [
+                n
+                for n in nodes
+                if previous.get(n.id) != (str(n.metainfo.sources_root), trees[n.id][0])
+                or not (self.outdir / n.id).is_dir()
+            ]
+            with timings.span("bundle.stage"):
+                staged = list(pool.map(lambda n: self._stage_package(n, trees[n.id][1], linker), changed))
+
+        methods: Dict[str, int] = {}
+        for counts in staged:
+            for method, count in counts.items():
+                methods[method] = methods.get(method, 0) + count
+
+        removed = sorted(set(self.packages) - {n.id for n in nodes})
+        for name in removed:
+            shutil.rmtree(self.outdir / name, ignore_errors=True)
+
+        self.mode = mode.value
+        self.packages = {n.id: (str(n.metainfo.sources_root), trees[n.id][0]) for n in nodes}
+        filelist = self.outdir / self.FILELIST_NAME
+        with timings.span("bundle.filelist"):
+            write_if_changed(filelist, self._merged_filelist(graph, nodes, env))
+        self._save()
+
+        changed_ids = {n.id for n in changed}
+        return BundleResult(
+            filelist=filelist,
+            staged=[n.id for n in changed],
+            unchanged=[n.id for n in nodes if n.id not in changed_ids],
+            removed=removed,
+            methods=methods,
+        )
+
+    def _stage_package(self, node: GraphNode, files: List[str], linker: _Linker) -> Dict[str, int]:
+        """Stage sources root of a package. Previous staging is replaced only when the new one is complete."""
+        with timings.span("bundle.package", package=node.id):
+            root = str(node.metainfo.sources_root)
+            tmp_dir = self.outdir / f".{node.id}.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            tmp_dir.mkdir()
+
+            methods: Dict[str, int] = {}
+            for rel_path in files:
+                dst = os.path.join(tmp_dir, rel_path)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                method = linker.link(os.path.join(root, rel_path), dst)
+                methods[method] = methods.get(method, 0) + 1
+
+            pkg_dir = self.outdir / node.id
+            shutil.rmtree(pkg_dir, ignore_errors=True)
+            os.replace(tmp_dir, pkg_dir)
+        return methods
+
+    def _merged_filelist(self, graph: DependencyGraph, nodes: List[GraphNode], env: Optional[Mapping[str, str]]) -> str:
+        """Expand all filelists and relocate paths within sources roots to the bundle."""
+        # the longest roots go first, so a path is relocated to the innermost root if roots are nested
+        roots = sorted(((os.path.normpath(n.metainfo.sources_root), n.id) for n in nodes), key=lambda r: -len(r[0]))
+
+        def relocate(path: str) -> str:
+            normpath = os.path.normpath(path)
+            for root, name in roots:
+                if normpath == root or normpath.startswith(root + os.sep):
+                    return str(PurePosixPath(name, *Path(os.path.relpath(normpath, root)).parts))
+            return path  # path is outside of all packages, so it is kept as is
+
+        def relocate_entry(entry: FilelistEntry) -> FilelistEntry:
+            if entry.kind in (EntryKind.SOURCE, EntryKind.INCDIR):
+                return FilelistEntry(entry.kind, relocate(entry.value))
+            option, _, arg = entry.value.partition(" ")
+            if entry.kind == EntryKind.OPTION and option in ("-v", "-y") and arg:
+                return FilelistEntry(entry.kind, f"{option} {relocate(arg)}")
+            return entry
+
+        lines = ["// Generated by pip-hdl. Do not edit. Paths are relative to this file (pass it with -F)."]
+        lines.extend(str(relocate_entry(e)) for e in expand_graph(graph, env))
+        return "\n".join(lines) + "\n"
+
+    def _save(self) -> None:
+        """Save state of the staging."""
+        data = {
+            "version": self.FORMAT_VERSION,
+            "mode": self.mode,
+            "packages": {k: list(v) for k, v in self.packages.items()},
+        }
+        write_if_changed(self.outdir / self.MANIFEST_NAME, json.dumps(data, indent=1, sort_keys=True) + "\n")
+
+
+def _scan_tree(root: Path) -> Tuple[str, List[str]]:
+    """List all files within a directory. Returns digest of paths, sizes and modification times, and the files."""
+    digest = hashlib.sha256()
+    files: List[str] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in _IGNORED_DIRS)
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(path, root)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # broken symlink
+            files.append(rel_path)
+            digest.update(f"{rel_path}\0{st.st_size}\0{st.st_mtime_ns}\0".encode())
+    return digest.hexdigest(), files
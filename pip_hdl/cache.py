@@ -0,0 +1,194 @@
+"""Persistent on-disk cache of resolved packages.
+
+Resolution of packages (metadata lookups, imports, search of filelists) is repeated on every `pip-hdl` call,
+while the environment is rarely changed. So the result of resolution is stored on disk and reused,
+until requested packages or the environment are changed.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from packaging.utils import canonicalize_name
+
+from .graph import DependencyGraph
+from .metainfo import PackageMetaInfo
+
+
+class CacheStats(NamedTuple):
+    """Cache usage statistics."""
+
+    hits: int
+    misses: int
+
+
+class ResolutionCache:
+    """On-disk cache of resolved dependency graphs.
+
+    Cache entry is keyed by a request (content of requirements file or package name) and a fingerprint
+    of the environment, which includes all `.dist-info` and `.egg-info` directories visible on `sys.path`.
+    Thus any install or uninstall makes previous entries unreachable.
+    """
+
+    FORMAT_VERSION = 1
+    ROOT_ENV_VAR = "PIP_HDL_CACHE_DIR"
+    STATS_FILE = "stats.json"
+    RENDERS_DIR = "renders"
+    SYMBOLS_DIR = "symbols"
+
+    def __init__(self, root: Optional[Path] = None) -> None:
+        """Init cache within `root` directory. Default location is used if it is not provided."""
+        self.root: Path = self.default_root() if root is None else root
+
+    @classmethod
+    def default_root(cls) -> Path:
+        """Default cache directory, which can be overridden with environment variable."""
+        if cls.ROOT_ENV_VAR in os.environ:
+            return Path(os.environ[cls.ROOT_ENV_VAR])
+        return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "pip-hdl"
+
+    @staticmethod
+    def environment_fingerprint() -> str:
+        """Fingerprint of all installed distributions available for the current interpreter."""
+        digest = hashlib.sha256(sys.executable.encode())
+        for entry in sys.path:
+            try:
+                with os.scandir(entry or ".") as it:
+                    dists = sorted(e.name for e in it if e.name.endswith((".dist-info", ".egg-info", ".pth")))
+                mtime = os.stat(entry or ".").st_mtime_ns
+            except OSError:
+                continue  # zip archives or non-existent paths
+            digest.update(f"{entry}\0{mtime}\0{':'.join(dists)}\n".encode())
+        return digest.hexdigest()
+
+    def key(self, request: str) -> str:
+        """Get cache key for a request within the current environment."""
+        digest = hashlib.sha256(f"{self.FORMAT_VERSION}\0{self.environment_fingerprint()}\0{request}".encode())
+        return digest.hexdigest()
+
+    def load(self, key: str) -> Optional[List[PackageMetaInfo]]:
+        """Load requested packages with all their dependencies already resolved. Return `None` on miss."""
+        try:
+            with (self.root / f"{key}.json").open("r") as f:
+                entry = json.load(f)
+
+            resolved: Dict[str, PackageMetaInfo] = {}
+            for pkg in entry["packages"]:  # packages are stored in dependency-aware order
+                resolved[canonicalize_name(pkg["name"])] = PackageMetaInfo.from_resolved(
+                    pkg["name"],
+                    filelist=Path(pkg["filelist"]),
+                    dependencies=[resolved[canonicalize_name(d)] for d in pkg["dependencies"]],
+                )
+            requested = [resolved[canonicalize_name(name)] for name in entry["requested"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            # missing or corrupted entry
+            self._update_stats(hit=False)
+            return None
+
+        self._update_stats(hit=True)
+        return requested
+
+    def store(self, key: str, requested: Sequence[PackageMetaInfo], graph: DependencyGraph) -> None:
+        """Store requested packages and the graph built from them.
+
+        Cache is only an optimization, so packages which can't be fully resolved are not stored,
+        and failures to write are ignored.
+        """
+        try:
+            entry = {
+                "requested": [p.name for p in requested],
+                "packages": [
+                    {
+                        "name": node.id,
+                        "filelist": str(node.metainfo.filelist),
+                        "dependencies": sorted(u.id for u in node.upstreams),
+                    }
+                    for node in graph.traverse(key=lambda n: n.id)
+                ],
+            }
+            self._write_atomic(self.root / f"{key}.json", entry)
+        except (OSError, ImportError):
+            pass
+
+    def load_render(self, key: str, suffix: str, path: Path) -> bool:
+        """Copy rendered image stored by the key to the path. Return `False` if there is no such image."""
+        try:
+            shutil.copyfile(self.root / self.RENDERS_DIR / f"{key}{suffix}", path)
+        except OSError:
+            return False
+        return True
+
+    def store_render(self, key: str, path: Path) -> None:
+        """Store rendered image by the key. Images are keyed by their source, so they don't depend on environment."""
+        renders = self.root / self.RENDERS_DIR
+        try:
+            renders.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=renders, suffix=".tmp")
+            os.close(fd)
+        except OSError:
+            return
+        try:
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, renders / f"{key}{path.suffix}")
+        except OSError:
+            os.unlink(tmp_path)
+
+    @property
+    def symbols_dir(self) -> Path:
+        """Directory for symbols of packages lexed by `SymbolIndex`."""
+        return self.root / self.SYMBOLS_DIR
+
+    def clear(self) -> int:
+        """Remove all cache entries, rendered images, symbols and statistics. Return number of removed entries."""
+        removed = 0
+        for path in self.root.glob("*.json"):
+            if path.name != self.STATS_FILE:
+                removed += 1
+            path.unlink()
+        shutil.rmtree(self.root / self.RENDERS_DIR, ignore_errors=True)
+        shutil.rmtree(self.symbols_dir, ignore_errors=True)
+        return removed
+
+    @property
+    def entries(self) -> int:
+        """Number of cache entries."""
+        return len([p for p in self.root.glob("*.json") if p.name != self.STATS_FILE])
+
+    @property
+    def stats(self) -> CacheStats:
+        """Hits and misses accumulated since the last clear."""
+        try:
+            with (self.root / self.STATS_FILE).open("r") as f:
+                return CacheStats(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return CacheStats(hits=0, misses=0)
+
+    def _update_stats(self, hit: bool) -> None:
+        """Count cache access. Concurrent processes may lose some updates, so statistics are approximate."""
+        stats = self.stats
+        if hit:
+            stats = stats._replace(hits=stats.hits + 1)
+        else:
+            stats = stats._replace(misses=stats.misses + 1)
+        try:
+            self._write_atomic(self.root / self.STATS_FILE, stats._asdict())
+        except OSError:
+            pass
+
+    def _write_atomic(self, path: Path, data: Any) -> None:
+        """Write JSON file, so concurrent readers never observe partially written content."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
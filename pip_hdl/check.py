@@ -0,0 +1,151 @@
+"""Health check of filelists and all paths referenced by them.
+
+Every filelist in a graph is parsed with environment variables of all packages substituted, and every
+referenced source, include directory and library path is checked to exist and to be readable.
+Filesystem checks are I/O bound (and slow on network filesystems), so they are done concurrently,
+and every unique path is checked only once.
+"""
+from __future__ import annotations
+
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from .filelist import EntryKind, FilelistEntry, FilelistError, FilelistParser
+from .graph import DependencyGraph
+
+
+class PathProblem(NamedTuple):
+    """Problem with a path referenced by a package."""
+
+    package: str
+    kind: str  # e.g. "missing source", "duplicate source", "filelist error"
+    path: str
+    details: str = ""
+
+    def __str__(self) -> str:
+        """Format problem as a single line."""
+        return f"{self.kind} {self.path}" + (f" ({self.details})" if self.details else "")
+
+
+class HealthReport(NamedTuple):
+    """Result of a health check."""
+
+    packages: int
+    paths: int
+    problems: List[PathProblem]
+
+    @property
+    def ok(self) -> bool:
+        """Check passed."""
+        return not self.problems
+
+    def format(self) -> str:
+        """Format problems grouped by package, and a summary line."""
+        by_package: Dict[str, List[PathProblem]] = {}
+        for problem in self.problems:
+            by_package.setdefault(problem.package, []).append(problem)
+
+        lines: List[str] = []
+        for package, problems in by_package.items():
+            lines.append(f"{package}:")
+            lines.extend(f"  {p}" for p in problems)
+        status = "OK" if self.ok else f"{len(self.problems)} problems in {len(by_package)} packages"
+        lines.append(f"{status}: {self.paths} paths of {self.packages} packages checked")
+        return "\n".join(lines)
+
+
+# Entry kinds mapped to the expected file type: file or directory
+_EXPECTED_KINDS = {EntryKind.SOURCE: ("source", False), EntryKind.INCDIR: ("incdir", True)}
+_OPTIONS_WITH_PATH = {"-v": ("library file", False), "-y": ("library directory", True)}
+
+
+def check_graph(graph: DependencyGraph, env: Optional[Mapping[str, str]] = None, jobs: int = 32) -> HealthReport:
+    """Check filelists of all packages in the graph and all paths referenced by them.
+
+    Args:
+        graph: Graph to check.
+        env: Environment variables to substitute along with variables for sources of all packages.
+            Process environment is used if not provided.
+        jobs: Number of threads to parse filelists and check paths concurrently.
+    """
+    nodes = list(graph.traverse(key=lambda n: n.id))
+    full_env = dict(os.environ if env is None else env)
+    full_env.update(n.metainfo.sources_var for n in nodes)
+    parser = FilelistParser(full_env)
+
+    def parse(filelist: Path) -> Tuple[List[FilelistEntry], Optional[str]]:
+        entries: List[FilelistEntry] = []
+        try:
+            entries.extend(parser.parse(filelist))
+        except (FilelistError, OSError) as e:
+            return entries, str(e)
+        return entries, None
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        filelists = [n.metainfo.filelist for n in nodes]
+        parsed = list(pool.map(parse, filelists))
+
+        problems: List[PathProblem] = []
+        # (package, kind, path, expect directory) for every referenced path in order of appearance
+        references: List[Tuple[str, str, str, bool]] = []
+        for node, filelist, (entries, error) in zip(nodes, filelists, parsed):
+            if error is not None:
+                problems.append(PathProblem(node.id, "filelist error", str(filelist), error))
+            for entry in entries:
+                reference = _reference(entry)
+                if reference is not None:
+                    references.append((node.id, *reference))
+
+        unique_paths = list({(os.path.normpath(path), is_dir): None for _, _, path, is_dir in references})
+        statuses = dict(zip(unique_paths, pool.map(_check_path, unique_paths)))
+
+    first_owner: Dict[str, str] = {}
+    for package, kind, path, is_dir in references:
+        normpath = os.path.normpath(path)
+        status = statuses[(normpath, is_dir)]
+        if status is not None:
+            problems.append(PathProblem(package, f"{status[0]} {kind}", path, status[1]))
+        if kind == "source":
+            if normpath in first_owner:
+                problems.append(PathProblem(package, "duplicate source", path, f"also in {first_owner[normpath]}"))
+            else:
+                first_owner[normpath] = package
+
+    order = {n.id: i for i, n in enumerate(nodes)}
+    problems.sort(key=lambda p: order[p.package])  # stable, so order of appearance is kept within a package
+    return HealthReport(packages=len(nodes), paths=len(unique_paths), problems=problems)
+
+
+def _reference(entry: FilelistEntry) -> Optional[Tuple[str, str, bool]]:
+    """Get kind of a referenced path, the path itself and whether it has to be a directory."""
+    if entry.kind in _EXPECTED_KINDS:
+        kind, is_dir = _EXPECTED_KINDS[entry.kind]
+        return kind, entry.value, is_dir
+    if entry.kind == EntryKind.OPTION:
+        option, _, path = entry.value.partition(" ")
+        if option in _OPTIONS_WITH_PATH and path:
+            kind, is_dir = _OPTIONS_WITH_PATH[option]
+            return kind, path, is_dir
+    return None
+
+
+def _check_path(path_is_dir: Tuple[str, bool]) -> Optional[Tuple[str, str]]:
+    """Check path. Returns status and details of a problem, or `None` if everything is fine."""
+    path, is_dir = path_is_dir
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return "missing", ""
+    except OSError as e:
+        return "unreadable", e.strerror or ""
+
+    if is_dir and not stat.S_ISDIR(mode):
+        return "invalid", "not a directory"
+    if not is_dir and stat.S_ISDIR(mode):
+        return "invalid", "directory"
+    if not os.access(path, os.R_OK | (os.X_OK if is_dir else 0)):
+        return "unreadable", "permission denied"
+    return None
@@ -1,16 +1,33 @@
 """pip-hdl command line helper utility."""
 
 import argparse
+import glob
+import hashlib
+import os
+import signal
+import socket
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from pathlib import Path
-from typing import Any, Optional, Sequence
-
-from packaging.requirements import Requirement
+from typing import Any, Dict, List, NoReturn, Optional, Sequence, Tuple
 
+from . import timings
+from .bundle import Bundle, LinkMode
+from .cache import ResolutionCache
+from .check import check_graph
+from .export import to_dot, to_json, to_mermaid
+from .filelist import expand_graph, expand_nodes
 from .graph import DependencyGraph
-from .metainfo import PackageMetaInfo
-from .template import ask_user_for_config, template_package_example
+from .lockfile import Lockfile, LockfileError, is_lockfile
+from .manifest import BuildManifest
+from .metainfo import DistributionIndex, PackageMetaInfo
+from .ninja import TOOLS, NinjaTool, generate_ninja
+from .report import InspectionReport, write_if_changed
+from .requirements import load_packages, request_key
+from .scheduler import CommandTask, GraphExecutionError, run_graph
+from .symbols import SymbolIndex
+from .template import SpecError, ask_user_for_config, load_spec, template_package_example, template_packages
 from .version import __version__
 
 
@@ -19,6 +36,15 @@ class _CliCommands(str, Enum):
 
     NEW = "new"
     INSPECT = "inspect"
+    CACHE = "cache"
+    RUN = "run"
+    MANIFEST = "manifest"
+    SERVE = "serve"
+    LOCK = "lock"
+    BUNDLE = "bundle"
+    NINJA = "ninja"
+    WATCH = "watch"
+    SYMBOLS = "symbols"
 
 
 class _CliInspectCmd(str, Enum):
@@ -32,6 +58,39 @@ class _CliInspectCmd(str, Enum):
     ALL_SOURCES_ROOTS = "all_sources_roots"
     ALL_SOURCES_VARS = "all_sources_vars"
     DEPENDENCY_GRAPH = "dependency_graph"
+    GRAPH_DOT = "graph_dot"
+    GRAPH_JSON = "graph_json"
+    GRAPH_MERMAID = "graph_mermaid"
+    FLAT_FILELIST = "flat_filelist"
+    AS_MAKEFILE = "as_makefile"
+    AS_SHELL = "as_shell"
+    AS_JSON = "as_json"
+    CHECK = "check"
+
+
+# These attributes depend on a client state (working directory, environment), so they are never sent to a daemon
+_LOCAL_INSPECT_CMDS = (_CliInspectCmd.DEPENDENCY_GRAPH, _CliInspectCmd.FLAT_FILELIST, _CliInspectCmd.CHECK)
+
+
+class _CliCacheCmd(str, Enum):
+    """Specify action for cache operation."""
+
+    INFO = "info"
+    CLEAR = "clear"
+
+
+class _CliManifestCmd(str, Enum):
+    """Specify action for manifest operation."""
+
+    STATUS = "status"
+    UPDATE = "update"
+
+
+class _CliSymbolsCmd(str, Enum):
+    """Specify action for symbols operation."""
+
+    DUPLICATES = "duplicates"
+    PRUNE = "prune"
 
 
 class _ArgumentParser(argparse.ArgumentParser):
@@ -47,8 +106,17 @@ class _ArgumentParser(argparse.ArgumentParser):
         """Configure parser with arguments, subparsers, etc."""
         self.description = """
 avaliable commands:
-    new     - interactively create a new package
-    inspect - inspect meta-information of the provided package or requirements.txt
+    new      - interactively create a new package
+    inspect  - inspect meta-information of the provided package or requirements.txt
+    cache    - manage cache of resolved packages
+    run      - run a command for every package in dependency-aware order
+    manifest - track changes of package sources between builds
+    serve    - run resolver daemon to speed up inspect queries
+    lock     - write lockfile with resolved packages to inspect them without resolution
+    bundle   - stage sources of all packages into a single directory with a merged filelist
+    ninja    - generate Ninja build file to compile every package into its own library
+    watch    - report packages affected by every change of sources
+    symbols  - index HDL design units to find duplicates or prune packages unused by a top module
 
 add -h/--help argument to any command to get more information and specific arguments"""
 
@@ -59,16 +127,66 @@ add -h/--help argument to any command to get more information and specific argum
             version=__version__,
         )
 
+        self.add_argument(
+            "--timings",
+            action="store_true",
+            dest="timings",
+            help=f"print time spent in every phase to stderr (or set {timings.ENV_VAR}=1)",
+        )
+
+        self.add_argument(
+            "--trace",
+            metavar="FILE",
+            type=Path,
+            default=None,
+            dest="trace",
+            help=f"write timings as Chrome trace events JSON to the file (or set {timings.TRACE_ENV_VAR}=FILE)",
+        )
+
         subparsers = self.add_subparsers(help="cli command", dest="cmd", required=True)
         inspect_subparser = subparsers.add_parser("inspect")
         self._configure_inspect_subparser(inspect_subparser)
         new_subparser = subparsers.add_parser("new")
         self._configure_new_subparser(new_subparser)
+        cache_subparser = subparsers.add_parser("cache")
+        self._configure_cache_subparser(cache_subparser)
+        run_subparser = subparsers.add_parser("run")
+        self._configure_run_subparser(run_subparser)
+        manifest_subparser = subparsers.add_parser("manifest")
+        self._configure_manifest_subparser(manifest_subparser)
+        serve_subparser = subparsers.add_parser("serve")
+        self._configure_serve_subparser(serve_subparser)
+        lock_subparser = subparsers.add_parser("lock")
+        self._configure_lock_subparser(lock_subparser)
+        bundle_subparser = subparsers.add_parser("bundle")
+        self._configure_bundle_subparser(bundle_subparser)
+        ninja_subparser = subparsers.add_parser("ninja")
+        self._configure_ninja_subparser(ninja_subparser)
+        watch_subparser = subparsers.add_parser("watch")
+        self._configure_watch_subparser(watch_subparser)
+        symbols_subparser = subparsers.add_parser("symbols")
+        self._configure_symbols_subparser(symbols_subparser)
 
     def _configure_new_subparser(self, subparser: argparse.ArgumentParser) -> None:
         """Configure subparser for `new` command."""
         subparser.description = """
 follow interactive instructions to create a new package project
+
+use --spec to create (or update) many projects at once from a JSON or TOML file without any questions;
+existing projects are updated in place, and only files with changed content are rewritten
+
+example of spec:
+    [defaults]
+    author_name = "John Doe <johndoe@mail.com>"
+    is_private_package = true
+
+    [[packages]]
+    package_name = "my_lib"
+
+    [[packages]]
+    package_name = "my_ip"
+    package_description = "My IP core"
+    dependencies = {my-lib = "^0.1.0"}
 """
         subparser.add_argument(
             metavar="OUTDIR",
@@ -79,6 +197,25 @@ follow interactive instructions to create a new package project
             help="output dir to create a new package project inside",
         )
 
+        subparser.add_argument(
+            "--spec",
+            metavar="FILE",
+            type=Path,
+            default=None,
+            dest="spec",
+            help="JSON or TOML file with configurations of packages to create",
+        )
+
+        subparser.add_argument(
+            "-j",
+            "--jobs",
+            metavar="N",
+            type=_positive_int,
+            default=None,
+            dest="jobs",
+            help="number of packages to create in parallel",
+        )
+
     def _configure_inspect_subparser(self, subparser: argparse.ArgumentParser) -> None:
         """Configure subparser for `inspect` command."""
         subparser.description = """
@@ -91,12 +228,26 @@ avaliable attributes for inspection:
     all_sources_roots     - show absolute paths to all sources directories
     all_sources_vars      - show all environment variables for all sources
     dependency_graph      - dump dependency graph as in image (graphviz required)
+    graph_dot             - show dependency graph in DOT language
+    graph_json            - show dependency graph as JSON
+    graph_mermaid         - show dependency graph as Mermaid flowchart
+    flat_filelist         - show all filelists expanded into a single filelist (nested filelists are included,
+                            environment variables are substituted, repeated sources and incdirs are removed)
+    as_makefile           - show all attributes above (except graph) as Makefile fragment to be included
+    as_shell              - show all attributes above (except graph) as shell script to be sourced
+    as_json               - show all attributes above (except graph) as JSON
+    check                 - check that all sources, incdirs and libraries referenced by filelists exist and are
+                            readable, and no source is listed by several packages; problems are reported grouped
+                            by package, and exit code is non-zero if there are any
 """
         subparser.add_argument(
             metavar="OBJ",
             type=str,
-            dest="obj",
-            help="object for inspection: name of pip-hdl-powered package or requirements.txt with such packages",
+            nargs="+",
+            dest="objs",
+            help="object for inspection: name of pip-hdl-powered package, requirements.txt with such packages\n"
+            "or lockfile (see `lock` command); many requirements files or glob patterns\n"
+            "(e.g. 'tb/*/requirements.txt') can be inspected at once, then shared packages are resolved only once",
         )
 
         subparser.add_argument(
@@ -107,6 +258,585 @@ avaliable attributes for inspection:
             help="attribute to inspect (list of available attributes is above)",
         )
 
+        subparser.add_argument(
+            "--no-cache",
+            action="store_false",
+            dest="use_cache",
+            help="resolve packages from scratch and don't store the result",
+        )
+
+        subparser.add_argument(
+            "-o",
+            "--output",
+            metavar="FILE",
+            type=Path,
+            dest="output",
+            help="write result to the file instead of printing it (file is not touched if result is the same);\n"
+            "for many objects it is a template with {dir}, {name} and {stem} fields of every object path,\n"
+            "e.g. '{dir}/pip_hdl.mk', otherwise results are printed one after another with headers",
+        )
+
+        subparser.add_argument(
+            "-j",
+            "--jobs",
+            metavar="N",
+            type=_positive_int,
+            default=1,
+            dest="jobs",
+            help="number of objects to inspect in parallel (default: 1)",
+        )
+
+        subparser.add_argument(
+            "--no-daemon",
+            action="store_false",
+            dest="use_daemon",
+            help="don't query resolver daemon (see `serve` command) even if it is running",
+        )
+
+        subparser.add_argument(
+            "--root",
+            metavar="NAME",
+            action="append",
+            default=[],
+            dest="roots",
+            help="inspect only this package and its dependencies instead of all requested packages\n"
+            "(can be repeated; package has to be in the dependency graph of OBJ)",
+        )
+
+        subparser.add_argument(
+            "--reduce",
+            action="store_true",
+            dest="reduce",
+            help="drop dependency graph edges implied by other edges (transitive reduction)",
+        )
+
+    def _configure_cache_subparser(self, subparser: argparse.ArgumentParser) -> None:
+        """Configure subparser for `cache` command."""
+        subparser.description = f"""
+resolved packages are cached on disk until the environment is changed
+cache location can be changed with {ResolutionCache.ROOT_ENV_VAR} environment variable
+
+avaliable actions:
+    info  - show cache location, number of entries and hit/miss statistics
+    clear - remove all cache entries and statistics
+"""
+        subparser.add_argument(
+            metavar="ACTION",
+            type=_CliCacheCmd,
+            choices=[e.value for e in _CliCacheCmd],
+            dest="action",
+            help="action to do with cache (list of available actions is above)",
+        )
+
+    def _configure_run_subparser(self, subparser: argparse.ArgumentParser) -> None:
+        """Configure subparser for `run` command."""
+        subparser.description = """
+run a shell command for every package: command for a package is started as soon as commands
+for all its dependencies are succeeded, so independent packages are processed in parallel
+
+command is a template with fields to be replaced with values of a package:
+    {name}         - package name
+    {filelist}     - absolute path to filelist
+    {sources_root} - absolute path to sources root
+    {sources_var}  - name of environment variable for sources root
+
+other braces (e.g. shell ${VAR} or awk '{print $1}') are kept as is
+environment variables for all sources are exported for every command
+
+example:
+    pip-hdl run requirements.txt "vlog -work {name} -f {filelist}" -j 8
+"""
+        subparser.add_argument(
+            metavar="OBJ",
+            type=str,
+            dest="obj",
+            help="name of pip-hdl-powered package or requirements.txt with such packages",
+        )
+
+        subparser.add_argument(
+            metavar="CMD",
+            type=str,
+            dest="command",
+            help="command template to run for every package",
+        )
+
+        subparser.add_argument(
+            "-j",
+            "--jobs",
+            metavar="N",
+            type=_positive_int,
+            default=1,
+            dest="jobs",
+            help="number of commands to run in parallel (default: 1)",
+        )
+
+        subparser.add_argument(
+            "-k",
+            "--keep-going",
+            action="store_true",
+            dest="keep_going",
+            help="keep going when some command fails (only packages which depend on it are skipped)",
+        )
+
+        subparser.add_argument(
+            "--no-cache",
+            action="store_false",
+            dest="use_cache",
+            help="resolve packages from scratch and don't store the result",
+        )
+
+    def _configure_manifest_subparser(self, subparser: argparse.ArgumentParser) -> None:
+        """Configure subparser for `manifest` command."""
+        subparser.description = """
+manifest stores content hashes of all files referenced by filelists of every package,
+so packages to be recompiled can be found
+
+avaliable actions:
+    status - show packages changed since the last update and all packages which depend on them
+    update - store current hashes of all packages (e.g. after successful build)
+
+example:
+    DIRTY=$(pip-hdl manifest requirements.txt status)
+    # ... recompile $DIRTY packages ...
+    pip-hdl manifest requirements.txt update
+"""
+        subparser.add_argument(
+            metavar="OBJ",
+            type=str,
+            dest="obj",
+            help="name of pip-hdl-powered package or requirements.txt with such packages",
+        )
+
+        subparser.add_argument(
+            metavar="ACTION",
+            type=_CliManifestCmd,
+            choices=[e.value for e in _CliManifestCmd],
+            dest="action",
+            help="action to do with manifest (list of available actions is above)",
+        )
+
+        subparser.add_argument(
+            "-m",
+            "--manifest",
+            metavar="FILE",
+            type=Path,
+            default=BuildManifest.DEFAULT_PATH,
+            dest="manifest",
+            help=f"path to manifest file (default: {BuildManifest.DEFAULT_PATH})",
+        )
+
+        subparser.add_argument(
+            "-j",
+            "--jobs",
+            metavar="N",
+            type=_positive_int,
+            default=None,
+            dest="jobs",
+            help="number of files to hash in parallel",
+        )
+
+        subparser.add_argument(
+            "--no-cache",
+            action="store_false",
+            dest="use_cache",
+            help="resolve packages from scratch and don't store the result",
+        )
+
+    def _configure_serve_subparser(self, subparser: argparse.ArgumentParser) -> None:
+        """Configure subparser for `serve` command."""
+        subparser.description = """
+run resolver daemon, which keeps resolved packages in memory and answers `inspect` queries
+over a local Unix socket, until it is stopped with Ctrl+C
+
+`inspect` queries daemon automatically if it is running and resolves packages by itself otherwise
+daemon drops resolved packages as soon as any package is installed or uninstalled
+socket is unique for every Python environment, set PIP_HDL_SOCKET environment variable to override it
+socket is created within a private directory, and queries from other users or environments are rejected
+"""
+        subparser.add_argument(
+            "--socket",
+            metavar="PATH",
+            type=Path,
+            default=None,
+            dest="socket_path",
+            help="socket path to listen",
+        )
+
+    def _configure_lock_subparser(self, subparser: argparse.ArgumentParser) -> None:
+        """Configure subparser for `lock` command."""
+        subparser.description = f"""
+write lockfile with all resolved packages in dependency-aware order, their versions, filelists,
+sources roots, environment variables and hashes of sources
+
+lockfile can be passed to `inspect` instead of requirements.txt, then packages are not resolved at all
+paths inside site-packages are stored relative to it, so environment can be relocated along with lockfile
+
+example:
+    pip-hdl lock requirements.txt
+    pip-hdl inspect {Lockfile.DEFAULT_PATH} all_filelists_as_args
+    pip-hdl lock --verify  # exits with non-zero code if environment doesn't match lockfile
+"""
+        subparser.add_argument(
+            metavar="OBJ",
+            type=str,
+            nargs="?",
+            default=None,
+            dest="obj",
+            help="name of pip-hdl-powered package or requirements.txt with such packages",
+        )
+
+        subparser.add_argument(
+            "-f",
+            "--file",
+            metavar="FILE",
+            type=Path,
+            default=Lockfile.DEFAULT_PATH,
+            dest="lockfile",
+            help=f"path to lockfile (default: {Lockfile.DEFAULT_PATH})",
+        )
+
+        subparser.add_argument(
+            "--verify",
+            action="store_true",
+            dest="verify",
+            help="check that installed versions and filelists match lockfile instead of writing it",
+        )
+
+        subparser.add_argument(
+            "--hashes",
+            action="store_true",
+            dest="check_hashes",
+            help="check hashes of sources as well during verification",
+        )
+
+        subparser.add_argument(
+            "-j",
+            "--jobs",
+            metavar="N",
+            type=_positive_int,
+            default=None,
+            dest="jobs",
+            help="number of files to hash in parallel",
+        )
+
+    def _configure_bundle_subparser(self, subparser: argparse.ArgumentParser) -> None:
+        """Configure subparser for `bundle` command."""
+        subparser.description = f"""
+stage sources root of every package to OUTDIR/<package>/ and write merged filelist
+OUTDIR/{Bundle.FILELIST_NAME} in dependency-aware order with paths relative to OUTDIR,
+so no environment variables are needed to compile the bundle
+
+files are hardlinked or reflinked if possible and copied otherwise (see --mode)
+rerun restages only packages with changed files
+
+example:
+    pip-hdl bundle requirements.txt /scratch/bundle
+    xrun -F /scratch/bundle/{Bundle.FILELIST_NAME}
+"""
+        subparser.add_argument(
+            metavar="OBJ",
+            type=str,
+            dest="obj",
+            help="name of pip-hdl-powered package or requirements.txt with such packages",
+        )
+
+        subparser.add_argument(
+            metavar="OUTDIR",
+            type=Path,
+            dest="outdir",
+            help="directory to stage bundle to",
+        )
+
+        subparser.add_argument(
+            "--mode",
+            type=LinkMode,
+            choices=[e.value for e in LinkMode],
+            default=LinkMode.AUTO,
+            dest="mode",
+            help="how files are staged: 'auto' tries hardlink, then reflink, then copy (default: auto)",
+        )
+
+        subparser.add_argument(
+            "--root",
+            metavar="NAME",
+            action="append",
+            default=[],
+            dest="roots",
+            help="bundle only this package and its dependencies (can be repeated)",
+        )
+
+        subparser.add_argument(
+            "-j",
+            "--jobs",
+            metavar="N",
+            type=_positive_int,
+            default=None,
+            dest="jobs",
+            help="number of packages to stage in parallel",
+        )
+
+        subparser.add_argument(
+            "--no-cache",
+            action="store_false",
+            dest="use_cache",
+            help="resolve packages from scratch and don't store the result",
+        )
+
+    def _configure_ninja_subparser(self, subparser: argparse.ArgumentParser) -> None:
+        """Configure subparser for `ninja` command."""
+        subparser.description = """
+generate Ninja build file with a compilation edge per package, so packages are compiled into their own
+libraries in parallel, and only packages with changed sources (or filelists) are recompiled
+
+every package is compiled after all its dependencies, use --rebuild-dependants to recompile
+packages when any of their dependencies is recompiled (e.g. when SystemVerilog packages are imported)
+
+command templates have the following fields (values are quoted for shell):
+    {name}          - name of the package
+    {filelist}      - filelist of the package
+    {sources_root}  - sources root of the package
+    {lib}           - library to compile the package into (BUILDDIR/<name>)
+    {libs}          - library argument for every direct or indirect dependency
+    {filelists}     - `-f FILELIST` for every direct or indirect dependency
+
+library argument template has {name} and {lib} fields of a dependency
+other braces (e.g. shell ${VAR}) are kept as is in both templates
+
+example:
+    pip-hdl ninja requirements.txt --tool questa
+    ninja -j 8
+    pip-hdl ninja requirements.txt --command 'xrun -compile -work {name} -f {filelist}'
+"""
+        subparser.add_argument(
+            metavar="OBJ",
+            type=str,
+            dest="obj",
+            help="name of pip-hdl-powered package or requirements.txt with such packages",
+        )
+
+        subparser.add_argument(
+            "-o",
+            "--output",
+            metavar="FILE",
+            type=Path,
+            default=Path("build.ninja"),
+            dest="output",
+            help="build file to write (default: build.ninja; file is not touched if it is the same)",
+        )
+
+        subparser.add_argument(
+            "--tool",
+            type=str,
+            choices=sorted(TOOLS),
+            default="questa",
+            dest="tool",
+            help="tool with predefined command templates (default: questa)",
+        )
+
+        subparser.add_argument(
+            "--command",
+            metavar="TEMPLATE",
+            type=str,
+            default=None,
+            dest="command",
+            help="compilation command template, overrides one of the tool",
+        )
+
+        subparser.add_argument(
+            "--library-arg",
+            metavar="TEMPLATE",
+            type=str,
+            default=None,
+            dest="library_arg",
+            help="library argument template, overrides one of the tool",
+        )
+
+        subparser.add_argument(
+            "--builddir",
+            metavar="DIR",
+            type=str,
+            default="pip_hdl_build",
+            dest="builddir",
+            help="directory for libraries relative to the build file (default: pip_hdl_build)",
+        )
+
+        subparser.add_argument(
+            "--rebuild-dependants",
+            action="store_true",
+            dest="rebuild_dependants",
+            help="recompile packages when any of their dependencies is recompiled",
+        )
+
+        subparser.add_argument(
+            "--root",
+            metavar="NAME",
+            action="append",
+            default=[],
+            dest="roots",
+            help="compile only this package and its dependencies (can be repeated)",
+        )
+
+        subparser.add_argument(
+            "--no-cache",
+            action="store_false",
+            dest="use_cache",
+            help="resolve packages from scratch and don't store the result",
+        )
+
+    def _configure_watch_subparser(self, subparser: argparse.ArgumentParser) -> None:
+        """Configure subparser for `watch` command."""
+        subparser.description = """
+watch sources root and filelist of every package and print a line for every change:
+comma-separated changed packages, then all packages to recompile (changed ones and their dependants)
+in dependency-aware order
+
+changes are debounced, so a burst of changes (e.g. git checkout) is reported once,
+but changes going on for longer than --max-delay are reported in several events;
+inotify is used on Linux, otherwise files are polled
+
+example:
+    pip-hdl watch requirements.txt | while read -r changed affected; do make $affected; done
+    pip-hdl watch requirements.txt --json
+"""
+        subparser.add_argument(
+            metavar="OBJ",
+            type=str,
+            dest="obj",
+            help="name of pip-hdl-powered package or requirements.txt with such packages",
+        )
+
+        subparser.add_argument(
+            "--json",
+            action="store_true",
+            dest="as_json",
+            help="print every event as a JSON line with 'changed', 'affected' and 'paths' fields",
+        )
+
+        subparser.add_argument(
+            "--debounce",
+            metavar="SEC",
+            type=float,
+            default=0.2,
+            dest="debounce",
+            help="report changes after no new ones for this time (default: 0.2)",
+        )
+
+        subparser.add_argument(
+            "--max-delay",
+            metavar="SEC",
+            type=float,
+            default=2.0,
+            dest="max_delay",
+            help="report changes after this time since the first one, even if changes go on (default: 2.0)",
+        )
+
+        subparser.add_argument(
+            "--interval",
+            metavar="SEC",
+            type=float,
+            default=0.5,
+            dest="interval",
+            help="polling interval, if inotify is not used (default: 0.5)",
+        )
+
+        subparser.add_argument(
+            "--poll",
+            action="store_false",
+            dest="use_inotify",
+            default=None,
+            help="always poll files, e.g. for network filesystems, where inotify doesn't see remote changes",
+        )
+
+        subparser.add_argument(
+            "--root",
+            metavar="NAME",
+            action="append",
+            default=[],
+            dest="roots",
+            help="watch only this package and its dependencies (can be repeated)",
+        )
+
+        subparser.add_argument(
+            "--no-cache",
+            action="store_false",
+            dest="use_cache",
+            help="resolve packages from scratch and don't store the result",
+        )
+
+    def _configure_symbols_subparser(self, subparser: argparse.ArgumentParser) -> None:
+        """Configure subparser for `symbols` command."""
+        subparser.description = """
+index modules, interfaces, packages and classes (entities and packages for VHDL) declared and referenced
+by sources of every package; files are lexed in parallel and the index is cached between runs
+
+avaliable actions:
+    duplicates - show design units declared by more than one package (exit code is 1 if there are any)
+    prune      - show flat filelist of packages needed to compile the top module(s) only
+
+example:
+    pip-hdl symbols requirements.txt duplicates
+    pip-hdl symbols requirements.txt prune --top tb_top -o pruned.f
+"""
+        subparser.add_argument(
+            metavar="OBJ",
+            type=str,
+            dest="obj",
+            help="name of pip-hdl-powered package or requirements.txt with such packages",
+        )
+
+        subparser.add_argument(
+            metavar="ACTION",
+            type=_CliSymbolsCmd,
+            choices=[e.value for e in _CliSymbolsCmd],
+            dest="action",
+            help="action to do with index (list of available actions is above)",
+        )
+
+        subparser.add_argument(
+            "--top",
+            metavar="MODULE",
+            action="append",
+            default=[],
+            dest="tops",
+            help="top module to prune packages for (can be repeated)",
+        )
+
+        subparser.add_argument(
+            "-o",
+            "--output",
+            metavar="FILE",
+            type=Path,
+            default=None,
+            dest="output",
+            help="write result to the file instead of stdout (file is not touched if it is the same)",
+        )
+
+        subparser.add_argument(
+            "-j",
+            "--jobs",
+            metavar="N",
+            type=_positive_int,
+            default=None,
+            dest="jobs",
+            help="number of processes to lex files in parallel (default: number of CPUs)",
+        )
+
+        subparser.add_argument(
+            "--root",
+            metavar="NAME",
+            action="append",
+            default=[],
+            dest="roots",
+            help="index only this package and its dependencies (can be repeated)",
+        )
+
+        subparser.add_argument(
+            "--no-cache",
+            action="store_false",
+            dest="use_cache",
+            help="resolve packages and lex files from scratch and don't store the result",
+        )
+
     def parse_args(  # type: ignore
         self,
         args: Optional[Sequence[str]] = None,
@@ -129,45 +859,543 @@ def enter_cli() -> None:
     parser.configure()
     args = parser.parse_args()
 
+    print_timings = args.timings or timings.summary_requested()
+    trace = args.trace or timings.trace_requested()
+    recorder = timings.enable() if print_timings or trace else None
+    try:
+        with timings.span(f"cli.{args.cmd.value}"):
+            _dispatch(args)
+    finally:
+        if recorder is not None:
+            timings.disable()
+            if print_timings:
+                print(recorder.summary(), file=sys.stderr)
+            if trace:
+                trace.write_text(recorder.chrome_trace())
+
+
+def _dispatch(args: argparse.Namespace) -> None:
+    """Do command."""
     if args.cmd == _CliCommands.INSPECT:
-        _do_inspect(obj=args.obj, attr=args.attr)
+        _do_inspect(
+            objs=args.objs,
+            attr=args.attr,
+            use_cache=args.use_cache,
+            output=args.output,
+            use_daemon=args.use_daemon,
+            roots=args.roots,
+            reduce=args.reduce,
+            jobs=args.jobs,
+        )
     elif args.cmd == _CliCommands.NEW:
-        _do_new(outdir=args.outdir)
+        _do_new(outdir=args.outdir, spec=args.spec, jobs=args.jobs)
+    elif args.cmd == _CliCommands.CACHE:
+        _do_cache(action=args.action)
+    elif args.cmd == _CliCommands.MANIFEST:
+        _do_manifest(obj=args.obj, action=args.action, manifest=args.manifest, jobs=args.jobs, use_cache=args.use_cache)
+    elif args.cmd == _CliCommands.SERVE:
+        _do_serve(socket_path=args.socket_path)
+    elif args.cmd == _CliCommands.LOCK:
+        _do_lock(
+            obj=args.obj, lockfile=args.lockfile, verify=args.verify, check_hashes=args.check_hashes, jobs=args.jobs
+        )
+    elif args.cmd == _CliCommands.BUNDLE:
+        _do_bundle(
+            obj=args.obj, outdir=args.outdir, mode=args.mode, roots=args.roots, jobs=args.jobs, use_cache=args.use_cache
+        )
+    elif args.cmd == _CliCommands.NINJA:
+        tool = TOOLS[args.tool]
+        _do_ninja(
+            obj=args.obj,
+            output=args.output,
+            tool=NinjaTool(args.command or tool.command, args.library_arg or tool.library_arg),
+            builddir=args.builddir,
+            rebuild_dependants=args.rebuild_dependants,
+            roots=args.roots,
+            use_cache=args.use_cache,
+        )
+    elif args.cmd == _CliCommands.WATCH:
+        _do_watch(
+            obj=args.obj,
+            as_json=args.as_json,
+            debounce=args.debounce,
+            max_delay=args.max_delay,
+            interval=args.interval,
+            use_inotify=args.use_inotify,
+            roots=args.roots,
+            use_cache=args.use_cache,
+        )
+    elif args.cmd == _CliCommands.SYMBOLS:
+        _do_symbols(
+            obj=args.obj,
+            action=args.action,
+            tops=args.tops,
+            output=args.output,
+            jobs=args.jobs,
+            roots=args.roots,
+            use_cache=args.use_cache,
+        )
+    elif args.cmd == _CliCommands.RUN:
+        _do_run(
+            obj=args.obj, command=args.command, jobs=args.jobs, keep_going=args.keep_going, use_cache=args.use_cache
+        )
     else:
         raise ValueError(f"Unsupported command '{args.cmd}'")
 
 
-def _do_inspect(obj: str, attr: _CliInspectCmd) -> None:
+def _resolve(
+    obj: str, use_cache: bool, index: Optional[DistributionIndex] = None
+) -> Tuple[List[PackageMetaInfo], DependencyGraph]:
+    """Get packages for inspection and build dependency graph for them, using cache if allowed.
+
+    Packages are looked up within the index if provided, so packages shared with other requests are reused.
+    """
+    if not use_cache or is_lockfile(obj):
+        packages = load_packages(obj, index)
+        return packages, DependencyGraph(packages)
+
+    cache = ResolutionCache()
+    with timings.span("cache.load"):
+        key = cache.key(request_key(obj))
+        cached_packages = cache.load(key)
+    if cached_packages is not None:
+        return cached_packages, DependencyGraph(cached_packages)
+
+    packages = load_packages(obj, index)
+    graph = DependencyGraph(packages)
+    with timings.span("cache.store"):
+        cache.store(key, packages, graph)
+    return packages, graph
+
+
+def _restrict(
+    packages: List[PackageMetaInfo], graph: DependencyGraph, roots: Sequence[str]
+) -> Tuple[List[PackageMetaInfo], DependencyGraph]:
+    """Restrict resolved packages to the roots and their dependencies. Unknown root is reported as an error."""
+    try:
+        return _subgraph(packages, graph, roots)
+    except KeyError as e:
+        _exit_with_error(e.args[0])
+
+
+def _subgraph(
+    packages: List[PackageMetaInfo], graph: DependencyGraph, roots: Sequence[str]
+) -> Tuple[List[PackageMetaInfo], DependencyGraph]:
+    """Restrict resolved packages to the roots and their dependencies. Roots become the requested packages.
+
+    Raises:
+        KeyError: root is not in the graph.
+    """
+    if not roots:
+        return packages, graph
+    subgraph = graph.subgraph(roots)
+    return [subgraph.find(r).metainfo for r in roots], subgraph
+
+
+def _do_inspect(
+    objs: Sequence[str],
+    attr: _CliInspectCmd,
+    use_cache: bool = True,
+    output: Optional[Path] = None,
+    use_daemon: bool = True,
+    roots: Sequence[str] = (),
+    reduce: bool = False,
+    jobs: int = 1,
+) -> None:
     """Do `inspect` command."""
-    if Path(obj).exists():
-        with Path(obj).open("r") as f:
-            packages = [PackageMetaInfo(Requirement(line).name) for line in f.readlines()]
+    if len(objs) == 1 and not _is_glob(objs[0]):
+        text, ok = _inspect_obj(objs[0], attr, use_cache, use_daemon, roots, reduce)
+        _output(text, output)
+        if not ok:
+            sys.exit(1)
+        return
+
+    paths = _expand_objs(objs)
+    if output is not None and len(paths) > 1 and "{" not in str(output):
+        _exit_with_error("output has to be a template with {dir}, {name} or {stem} fields for many objects")
+
+    # all objects share the same index, so every package is resolved only once
+    index = DistributionIndex()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(
+            pool.map(lambda obj: _inspect_obj(obj, attr, use_cache, use_daemon, roots, reduce, index), paths)
+        )
+
+    for obj, (text, _) in zip(paths, results):
+        if output is None:
+            print(f"==> {obj} <==\n{text}")
+        else:
+            path = Path(obj)
+            _output(text, Path(str(output).format(dir=path.parent, name=path.name, stem=path.stem)))
+    if not all(ok for _, ok in results):
+        sys.exit(1)
+
+
+def _inspect_obj(
+    obj: str,
+    attr: _CliInspectCmd,
+    use_cache: bool,
+    use_daemon: bool,
+    roots: Sequence[str],
+    reduce: bool,
+    index: Optional[DistributionIndex] = None,
+) -> Tuple[str, bool]:
+    """Inspect a single object. Returns result and whether it is successful (`check` may fail)."""
+    if use_daemon and use_cache and attr not in _LOCAL_INSPECT_CMDS:
+        text = _query_daemon(obj, attr, roots, reduce)
+        if text is not None:
+            return text, True
+
+    packages, graph = _restrict(*_resolve(obj, use_cache, index), roots)
+    if attr == _CliInspectCmd.CHECK:
+        # result is reported with exit code as well, so it is processed separately from the other attributes
+        with timings.span("cli.check"):
+            report = check_graph(graph)
+        return report.format(), report.ok
+    return _inspect(packages, graph, obj, attr, reduce=reduce, use_cache=use_cache), True
+
+
+def _is_glob(obj: str) -> bool:
+    """Check if object is a glob pattern. Brackets are not considered, as they are used for package extras."""
+    return "*" in obj or "?" in obj
+
+
+def _expand_objs(objs: Sequence[str]) -> List[str]:
+    """Expand glob patterns into sorted paths. Duplicates are removed, the first occurrence is kept."""
+    paths: List[str] = []
+    for obj in objs:
+        if _is_glob(obj):
+            matches = sorted(glob.glob(obj, recursive=True))
+            if not matches:
+                _exit_with_error(f"no files match '{obj}'")
+            paths.extend(matches)
+        else:
+            paths.append(obj)
+    return list(dict.fromkeys(paths))
+
+
+def _positive_int(value: str) -> int:
+    """Parse argument, which has to be a positive integer, e.g. number of jobs."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"positive integer is expected, got '{value}'")
+    return number
+
+
+def _exit_with_error(msg: str) -> NoReturn:
+    """Print error and exit with non-zero code."""
+    print(f"pip-hdl: {msg}", file=sys.stderr)
+    sys.exit(1)
+
+
+def _output(text: str, output: Optional[Path]) -> None:
+    """Print text or write it to the file."""
+    if output is None:
+        print(text)
     else:
-        packages = [PackageMetaInfo(obj)]
-    graph = DependencyGraph(packages)
+        write_if_changed(output, text + "\n")
+
+
+def _inspect(
+    packages: List[PackageMetaInfo],
+    graph: DependencyGraph,
+    obj: str,
+    attr: _CliInspectCmd,
+    reduce: bool = False,
+    use_cache: bool = False,
+) -> str:
+    """Get attribute of resolved packages."""
+    with timings.span("cli.format", attr=attr.value):
+        return _inspect_attr(packages, graph, obj, attr, reduce, use_cache)
+
+
+def _inspect_attr(
+    packages: List[PackageMetaInfo],
+    graph: DependencyGraph,
+    obj: str,
+    attr: _CliInspectCmd,
+    reduce: bool,
+    use_cache: bool,
+) -> str:
+    """Get attribute of resolved packages without instrumentation."""
+    ordered = [node.metainfo for node in graph.traverse(key=lambda n: n.id)]
 
     if attr == _CliInspectCmd.FILELIST:
-        print(packages[0].filelist)
+        text = str(packages[0].filelist)
     elif attr == _CliInspectCmd.SOURCES_ROOT:
-        print(packages[0].sources_root)
+        text = str(packages[0].sources_root)
     elif attr == _CliInspectCmd.SOURCES_VAR:
         var = packages[0].sources_var
-        print(f"{var.name}={var.value}")
+        text = f"{var.name}={var.value}"
     elif attr == _CliInspectCmd.ALL_FILELISTS:
-        print(" ".join([str(p.metainfo.filelist) for p in graph]))
+        text = " ".join([str(p.filelist) for p in ordered])
     elif attr == _CliInspectCmd.ALL_FILELISTS_AS_ARGS:
-        print("-f " + " -f ".join([str(p.metainfo.filelist) for p in graph]))
+        text = "-f " + " -f ".join([str(p.filelist) for p in ordered])
     elif attr == _CliInspectCmd.ALL_SOURCES_ROOTS:
-        print(" ".join([str(p.metainfo.sources_root) for p in graph]))
+        text = " ".join([str(p.sources_root) for p in ordered])
     elif attr == _CliInspectCmd.ALL_SOURCES_VARS:
-        print(" ".join([f"{p.metainfo.sources_var.name}={p.metainfo.sources_var.value}" for p in graph]))
+        text = " ".join([f"{p.sources_var.name}={p.sources_var.value}" for p in ordered])
     elif attr == _CliInspectCmd.DEPENDENCY_GRAPH:
-        result = graph.render(cleanup=True, format="png", outfile=f"{Path(obj).stem}_graph.png")
-        print(result.resolve())
+        text = str(_render(graph, Path(f"{Path(obj).stem}_graph.png"), reduce, use_cache).resolve())
+    elif attr == _CliInspectCmd.GRAPH_DOT:
+        text = to_dot(graph, reduce).rstrip("\n")
+    elif attr == _CliInspectCmd.GRAPH_JSON:
+        text = to_json(graph, reduce).rstrip("\n")
+    elif attr == _CliInspectCmd.GRAPH_MERMAID:
+        text = to_mermaid(graph, reduce).rstrip("\n")
+    elif attr == _CliInspectCmd.FLAT_FILELIST:
+        text = "\n".join(str(entry) for entry in expand_graph(graph))
+    elif attr == _CliInspectCmd.AS_MAKEFILE:
+        text = InspectionReport(packages, graph).as_makefile().rstrip("\n")
+    elif attr == _CliInspectCmd.AS_SHELL:
+        text = InspectionReport(packages, graph).as_shell().rstrip("\n")
+    elif attr == _CliInspectCmd.AS_JSON:
+        text = InspectionReport(packages, graph).as_json().rstrip("\n")
     else:
         raise ValueError(f"Attribute '{attr.value}' is not supported yet!")
 
+    return text
+
+
+def _render(graph: DependencyGraph, outfile: Path, reduce: bool, use_cache: bool) -> Path:
+    """Render graph to image file. Images are cached by their DOT source, so unchanged graphs are not re-rendered."""
+    cache = ResolutionCache() if use_cache else None
+    key = hashlib.sha256(f"{outfile.suffix}\0{to_dot(graph, reduce)}".encode()).hexdigest()
+    if cache is not None and cache.load_render(key, outfile.suffix, outfile):
+        return outfile
+
+    with timings.span("cli.render"):
+        result = graph.render(reduce=reduce, cleanup=True, format=outfile.suffix[1:], outfile=outfile)
+    if cache is not None:
+        cache.store_render(key, result)
+    return result
+
+
+def _query_daemon(obj: str, attr: _CliInspectCmd, roots: Sequence[str] = (), reduce: bool = False) -> Optional[str]:
+    """Try to get attribute from a resolver daemon. Returns `None` if daemon is not running or failed to answer."""
+    if not hasattr(socket, "AF_UNIX"):
+        return None
 
-def _do_new(outdir: Path) -> None:
+    # Unix sockets are not available on some platforms, so import only if daemon can exist
+    from .server import default_socket_path, query
+
+    try:
+        socket_path = default_socket_path()
+    except OSError:
+        return None  # no private directory for sockets, so no trusted daemon
+    abs_obj = str(Path(obj).resolve()) if Path(obj).exists() else obj
+    with timings.span("cli.query_daemon"):
+        response = query(socket_path, {"obj": abs_obj, "attr": attr.value, "roots": list(roots), "reduce": reduce})
+    if response is None or "text" not in response:
+        return None  # errors are reproduced within the local resolution to be reported properly
+    return response["text"]
+
+
+def _do_new(outdir: Path, spec: Optional[Path] = None, jobs: Optional[int] = None) -> None:
     """Do `new` command."""
-    template_package_example(outdir=outdir, cfg=ask_user_for_config())
+    if spec is None:
+        template_package_example(outdir=outdir, cfg=ask_user_for_config())
+        return
+
+    try:
+        configs = load_spec(spec)
+    except SpecError as e:
+        _exit_with_error(str(e))
+    for name, written in template_packages(outdir, configs, jobs=jobs).items():
+        print(f"{name}: {len(written)} files written" if written else f"{name}: unchanged")
+
+
+def _do_cache(action: _CliCacheCmd) -> None:
+    """Do `cache` command."""
+    cache = ResolutionCache()
+    if action == _CliCacheCmd.INFO:
+        stats = cache.stats
+        print(f"location: {cache.root}")
+        print(f"entries:  {cache.entries}")
+        print(f"hits:     {stats.hits}")
+        print(f"misses:   {stats.misses}")
+    elif action == _CliCacheCmd.CLEAR:
+        print(f"{cache.clear()} entries removed from {cache.root}")
+    else:
+        raise ValueError(f"Action '{action.value}' is not supported yet!")
+
+
+def _do_run(obj: str, command: str, jobs: int, keep_going: bool, use_cache: bool = True) -> None:
+    """Do `run` command."""
+    _, graph = _resolve(obj, use_cache)
+    env = dict(os.environ)
+    env.update(node.metainfo.sources_var for node in graph.nodes.values())
+
+    try:
+        run_graph(graph, CommandTask(command, env), jobs=jobs, keep_going=keep_going)
+    except GraphExecutionError as e:
+        print(f"pip-hdl: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def _do_manifest(
+    obj: str, action: _CliManifestCmd, manifest: Path, jobs: Optional[int] = None, use_cache: bool = True
+) -> None:
+    """Do `manifest` command."""
+    _, graph = _resolve(obj, use_cache)
+    build_manifest = BuildManifest(manifest)
+    digests = build_manifest.scan(graph, jobs=jobs)
+
+    if action == _CliManifestCmd.STATUS:
+        print(" ".join(node.id for node in build_manifest.dirty(graph, digests)))
+    elif action == _CliManifestCmd.UPDATE:
+        build_manifest.update(digests)
+    else:
+        raise ValueError(f"Action '{action.value}' is not supported yet!")
+    # file stamps are always saved to speed up the next scan
+    build_manifest.save()
+
+
+def _do_lock(
+    obj: Optional[str], lockfile: Path, verify: bool = False, check_hashes: bool = False, jobs: Optional[int] = None
+) -> None:
+    """Do `lock` command."""
+    if verify:
+        try:
+            problems = Lockfile.read(lockfile).verify(check_hashes=check_hashes, jobs=jobs)
+        except (OSError, LockfileError) as e:
+            problems = [str(e)]
+        for problem in problems:
+            print(f"pip-hdl: {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+        return
+
+    if obj is None:
+        _exit_with_error("package or requirements file to lock is required, unless --verify is used")
+    packages = load_packages(obj)
+    Lockfile.from_graph(packages, DependencyGraph(packages), jobs=jobs).write(lockfile)
+
+
+def _do_bundle(
+    obj: str,
+    outdir: Path,
+    mode: LinkMode = LinkMode.AUTO,
+    roots: Sequence[str] = (),
+    jobs: Optional[int] = None,
+    use_cache: bool = True,
+) -> None:
+    """Do `bundle` command."""
+    _, graph = _restrict(*_resolve(obj, use_cache), roots)
+    result = Bundle(outdir).stage(graph, mode=mode, jobs=jobs)
+    methods = ", ".join(f"{count} {method}" for method, count in sorted(result.methods.items()))
+    print(
+        f"{len(result.staged)} packages staged" + (f" ({methods})" if methods else "") + f", "
+        f"{len(result.unchanged)} unchanged, {len(result.removed)} removed: {result.filelist}"
+    )
+
+
+def _do_ninja(
+    obj: str,
+    output: Path,
+    tool: NinjaTool,
+    builddir: str = "pip_hdl_build",
+    rebuild_dependants: bool = False,
+    roots: Sequence[str] = (),
+    use_cache: bool = True,
+) -> None:
+    """Do `ninja` command."""
+    _, graph = _restrict(*_resolve(obj, use_cache), roots)
+    write_if_changed(output, generate_ninja(graph, tool, builddir=builddir, rebuild_dependants=rebuild_dependants))
+
+
+def _do_watch(
+    obj: str,
+    as_json: bool = False,
+    debounce: float = 0.2,
+    max_delay: float = 2.0,
+    interval: float = 0.5,
+    use_inotify: Optional[bool] = None,
+    roots: Sequence[str] = (),
+    use_cache: bool = True,
+) -> None:
+    """Do `watch` command."""
+    # inotify backend is Linux-specific, so import only if sources are actually watched
+    from .watch import SourceWatcher
+
+    _, graph = _restrict(*_resolve(obj, use_cache), roots)
+    # stop gracefully on termination as well, so watches are released
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    with SourceWatcher(
+        graph, debounce=debounce, interval=interval, use_inotify=use_inotify, max_delay=max_delay
+    ) as watcher:
+        print(f"Watching {len(graph.nodes)} packages, press Ctrl+C to stop", file=sys.stderr, flush=True)
+        try:
+            for event in watcher.events():
+                print(event.to_json() if as_json else event, flush=True)
+        except KeyboardInterrupt:
+            pass
+
+
+def _do_symbols(
+    obj: str,
+    action: _CliSymbolsCmd,
+    tops: Sequence[str] = (),
+    output: Optional[Path] = None,
+    jobs: Optional[int] = None,
+    roots: Sequence[str] = (),
+    use_cache: bool = True,
+) -> None:
+    """Do `symbols` command."""
+    if action == _CliSymbolsCmd.PRUNE and not tops:
+        _exit_with_error("At least one --top module is required to prune packages")
+
+    _, graph = _restrict(*_resolve(obj, use_cache), roots)
+    cache_dir = ResolutionCache().symbols_dir if use_cache else None
+    index = SymbolIndex.build(graph, jobs=jobs, cache_dir=cache_dir)
+
+    if action == _CliSymbolsCmd.DUPLICATES:
+        duplicates = index.duplicates()
+        _output("\n".join(str(d) for d in duplicates) or "No duplicates", output)
+        if duplicates:
+            sys.exit(1)
+    elif action == _CliSymbolsCmd.PRUNE:
+        try:
+            required = index.required(graph, tops)
+        except KeyError as e:
+            _exit_with_error(e.args[0])
+        print(
+            f"{len(required)} of {len(graph.nodes)} packages are required: {' '.join(n.id for n in required)}",
+            file=sys.stderr,
+        )
+        _output("\n".join(str(entry) for entry in expand_nodes(required)), output)
+    else:
+        raise ValueError(f"Action '{action.value}' is not supported yet!")
+
+
+def _do_serve(socket_path: Optional[Path] = None) -> None:
+    """Do `serve` command."""
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("Resolver daemon requires Unix sockets, which are not supported on this platform")
+
+    # Unix sockets are not available on some platforms, so import only if daemon can exist
+    from .server import ResolverServer, WarmResolver, default_socket_path
+
+    resolver = WarmResolver()
+
+    def handle(request: Dict[str, Any]) -> str:
+        attr = _CliInspectCmd(request["attr"])
+        if attr in _LOCAL_INSPECT_CMDS:
+            raise ValueError(f"Attribute '{attr.value}' can't be inspected by daemon")
+        packages, graph = _subgraph(*resolver.resolve(request["obj"]), request.get("roots", []))
+        return _inspect(packages, graph, request["obj"], attr, reduce=request.get("reduce", False))
+
+    # stop gracefully on termination as well, so socket file is removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    path = default_socket_path() if socket_path is None else socket_path
+    with ResolverServer(path, handle) as server:
+        print(f"Serving at {path}, press Ctrl+C to stop", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    print(f"Queries served: {resolver.hits + resolver.misses} ({resolver.misses} resolved from scratch)")
@@ -0,0 +1,78 @@
+"""Text exporters of a dependency graph.
+
+Graph can be exported as DOT, JSON or Mermaid without `graphviz` package. Exports are deterministic:
+nodes are listed in dependency-aware order with ties broken by id, and edges are sorted.
+Edge goes from a package to its dependency.
+"""
+from __future__ import annotations
+
+import json
+from typing import Dict, List
+
+from .graph import DependencyGraph
+
+
+def dependency_edges(graph: DependencyGraph, reduce: bool = False) -> Dict[str, List[str]]:
+    """Get dependencies of every node by node id, in dependency-aware order of nodes.
+
+    Args:
+        graph: Graph to export.
+        reduce: Apply transitive reduction, i.e. drop edge to a dependency if it is already required
+            through another dependency. Reachability between packages is kept the same.
+    """
+    if reduce:
+        return transitive_reduction(graph)
+    return {node.id: sorted(u.id for u in node.upstreams) for node in graph.traverse(key=lambda n: n.id)}
+
+
+def transitive_reduction(graph: DependencyGraph) -> Dict[str, List[str]]:
+    """Get the minimal set of edges with the same reachability as the graph has.
+
+    Dependency is implied if it is an ancestor of any other dependency of the node. Ancestors are taken
+    from the reachability index, so the reduction costs O(E) bitwise operations.
+    """
+    index = graph.reachability
+    edges: Dict[str, List[str]] = {}
+    for node in index.nodes:
+        implied = 0
+        for upstream in node.upstreams:
+            implied |= index.ancestors[index.positions[upstream]]
+        edges[node.id] = sorted(u.id for u in node.upstreams if not implied >> index.positions[u] & 1)
+    return edges
+
+
+def to_dot(graph: DependencyGraph, reduce: bool = False) -> str:
+    """Export graph in DOT language of Graphviz."""
+    lines = ['digraph "graph" {', "    rankdir=RL"]
+    for node_id, upstreams in dependency_edges(graph, reduce).items():
+        if upstreams:
+            lines.extend(f"    {_dot_id(node_id)} -> {_dot_id(u)}" for u in upstreams)
+        else:
+            lines.append(f"    {_dot_id(node_id)}")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def to_json(graph: DependencyGraph, reduce: bool = False) -> str:
+    """Export graph as JSON with list of nodes, where every node has id and ids of its dependencies."""
+    nodes = [
+        {"id": node_id, "dependencies": upstreams} for node_id, upstreams in dependency_edges(graph, reduce).items()
+    ]
+    return json.dumps({"nodes": nodes}, indent=2) + "\n"
+
+
+def to_mermaid(graph: DependencyGraph, reduce: bool = False) -> str:
+    """Export graph as Mermaid flowchart, which can be embedded into Markdown."""
+    edges = dependency_edges(graph, reduce)
+    # package names may contain characters not allowed in Mermaid ids, so names are used as labels only
+    ids = {node_id: f"n{i}" for i, node_id in enumerate(edges)}
+    lines = ["graph RL"]
+    lines.extend(f'    {ids[node_id]}["{node_id}"]' for node_id in edges)
+    for node_id, upstreams in edges.items():
+        lines.extend(f"    {ids[node_id]} --> {ids[u]}" for u in upstreams)
+    return "\n".join(lines) + "\n"
+
+
+def _dot_id(name: str) -> str:
+    """Quote identifier for DOT."""
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
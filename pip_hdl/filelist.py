@@ -0,0 +1,209 @@
+"""EDA filelists parsing and expansion.
+
+Filelists of all packages in a graph can be expanded into a single flat list of sources, include directories
+and other options, where all nested filelists are included and environment variables are substituted.
+Filelists are parsed line by line, so even huge generated filelists are never loaded into memory at once.
+"""
+from __future__ import annotations
+
+import os
+import re
+from enum import Enum
+from pathlib import Path
+from typing import Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .graph import DependencyGraph, GraphNode
+
+
+class FilelistError(ValueError):
+    """Filelist can't be parsed."""
+
+    def __init__(self, path: Path, lineno: int, msg: str) -> None:
+        """Init error with location inside a filelist."""
+        self.path = path
+        self.lineno = lineno
+        super().__init__(f"{path}:{lineno}: {msg}")
+
+
+class EntryKind(str, Enum):
+    """Kind of filelist entry."""
+
+    SOURCE = "source"
+    INCDIR = "incdir"
+    DEFINE = "define"
+    OPTION = "option"
+
+
+class FilelistEntry(NamedTuple):
+    """Single resolved filelist entry."""
+
+    kind: EntryKind
+    value: str
+
+    def __str__(self) -> str:
+        """Format entry as it would be written within a filelist."""
+        if self.kind == EntryKind.INCDIR:
+            return f"+incdir+{self.value}"
+        elif self.kind == EntryKind.DEFINE:
+            return f"+define+{self.value}"
+        return self.value
+
+
+class FilelistParser:
+    """Parser of filelists with nested filelists and environment variables.
+
+    Supported syntax:
+        - `//` and `/* */` comments, and lines started with `#`
+        - `-f FILE` to include a filelist, relative paths are relative to the current working directory
+        - `-F FILE` to include a filelist, relative paths inside which are relative to the filelist itself
+        - `+incdir+DIR1+DIR2...` and `+define+NAME1=VAL1+NAME2...`
+        - `-v FILE` and `-y DIR`, which are kept as options with an argument
+        - any other `-` or `+` prefixed tokens are kept as options
+        - all the rest tokens are sources
+        - `${VAR}`, `$(VAR)` and `$VAR` environment variables anywhere
+    """
+
+    _VAR_RE = re.compile(r"\$(?:\{(\w+)\}|\((\w+)\)|(\w+))")
+    _OPTIONS_WITH_ARG = ("-v", "-y")
+
+    def __init__(self, env: Optional[Mapping[str, str]] = None) -> None:
+        """Init parser with environment variables to substitute. Process environment is used if not provided."""
+        self.env: Mapping[str, str] = os.environ if env is None else env
+
+    def parse(self, filelist: Path) -> Iterator[FilelistEntry]:
+        """Parse filelist and all nested filelists. Entries are yielded in order of appearance without dedup."""
+        # stack of (path, token stream, base directory for relative paths) to avoid recursion for nested filelists
+        stack: List[Tuple[Path, Iterator[Tuple[str, int]], Optional[Path]]] = []
+        active: Set[Path] = set()
+
+        def include(path: Path, relative_to_self: bool, lineno: int = 0) -> None:
+            resolved = path.resolve()
+            if resolved in active:
+                raise FilelistError(stack[-1][0], lineno, f"recursive include of {path}")
+            if not path.is_file():
+                if stack:
+                    raise FilelistError(stack[-1][0], lineno, f"filelist {path} not found")
+                raise FileNotFoundError(f"Filelist {path} not found")
+            active.add(resolved)
+            stack.append((path, self._tokens(path), path.parent if relative_to_self else None))
+
+        include(filelist, relative_to_self=False)
+        while stack:
+            path, tokens, base = stack[-1]
+            token_lineno = next(tokens, None)
+            if token_lineno is None:
+                stack.pop()
+                active.discard(path.resolve())
+                continue
+
+            token, lineno = token_lineno
+            token = self._substitute(token, path, lineno)
+            if token in ("-f", "-F") or token in self._OPTIONS_WITH_ARG:
+                arg_lineno = next(tokens, None)
+                if arg_lineno is None:
+                    raise FilelistError(path, lineno, f"argument is expected after {token}")
+                arg = self._relative_to(base, self._substitute(arg_lineno[0], path, arg_lineno[1]))
+                if token in self._OPTIONS_WITH_ARG:
+                    yield FilelistEntry(EntryKind.OPTION, f"{token} {arg}")
+                else:
+                    include(Path(arg), relative_to_self=(token == "-F"), lineno=lineno)
+            elif token.startswith("+incdir+"):
+                for incdir in token.split("+")[2:]:
+                    if incdir:
+                        yield FilelistEntry(EntryKind.INCDIR, self._relative_to(base, incdir))
+            elif token.startswith("+define+"):
+                for define in token.split("+")[2:]:
+                    if define:
+                        yield FilelistEntry(EntryKind.DEFINE, define)
+            elif token.startswith(("-", "+")):
+                yield FilelistEntry(EntryKind.OPTION, token)
+            else:
+                yield FilelistEntry(EntryKind.SOURCE, self._relative_to(base, token))
+
+    def _substitute(self, token: str, path: Path, lineno: int) -> str:
+        """Substitute environment variables within a token."""
+        if "$" not in token:
+            return token
+
+        def replace(match: re.Match) -> str:
+            name = next(g for g in match.groups() if g is not None)
+            if name not in self.env:
+                raise FilelistError(path, lineno, f"environment variable '{name}' is not defined")
+            return self.env[name]
+
+        return self._VAR_RE.sub(replace, token)
+
+    @staticmethod
+    def _relative_to(base: Optional[Path], path: str) -> str:
+        """Make relative path to be relative to the base directory."""
+        if base is None or os.path.isabs(path):
+            return path
+        return str(base / path)
+
+    @staticmethod
+    def _tokens(path: Path) -> Iterator[Tuple[str, int]]:
+        """Read filelist line by line and split it to tokens without comments."""
+        in_comment = False
+        with path.open("r") as f:
+            for lineno, line in enumerate(f, start=1):
+                if not in_comment and line.lstrip().startswith("#"):
+                    continue
+                text, in_comment = _strip_comments(line, in_comment)
+                for token in text.split():
+                    yield token, lineno
+
+
+def _strip_comments(line: str, in_comment: bool) -> Tuple[str, bool]:
+    """Remove comments from a line. Returns line without comments and whether block comment is still open."""
+    text = ""
+    while line:
+        if in_comment:
+            _, found, line = line.partition("*/")
+            if not found:
+                return text, True
+            in_comment = False
+            text += " "
+        else:
+            block_start = line.find("/*")
+            line_start = line.find("//")
+            if line_start >= 0 and (block_start < 0 or line_start < block_start):
+                return text + line[:line_start], False
+            if block_start < 0:
+                return text + line, False
+            text += line[:block_start]
+            line = line.partition("/*")[2]
+            in_comment = True
+    return text, in_comment
+
+
+def dedup(entries: Iterable[FilelistEntry]) -> Iterator[FilelistEntry]:
+    """Remove repeated sources and include directories, only the first occurrence is kept."""
+    seen: Set[Tuple[EntryKind, str]] = set()
+    for entry in entries:
+        if entry.kind in (EntryKind.SOURCE, EntryKind.INCDIR):
+            key = (entry.kind, os.path.normpath(entry.value))
+            if key in seen:
+                continue
+            seen.add(key)
+        yield entry
+
+
+def expand_graph(graph: DependencyGraph, env: Optional[Mapping[str, str]] = None) -> Iterator[FilelistEntry]:
+    """Expand filelists of all packages in the graph into a single flat list in dependency-aware order.
+
+    Environment variables for sources of all packages are substituted along with variables from `env`
+    (process environment by default). Repeated sources and include directories are removed.
+    """
+    yield from expand_nodes(list(graph.traverse(key=lambda n: n.id)), env)
+
+
+def expand_nodes(nodes: Sequence[GraphNode], env: Optional[Mapping[str, str]] = None) -> Iterator[FilelistEntry]:
+    """Expand filelists of packages, which are already in dependency-aware order, into a single flat list.
+
+    It is the same as `expand_graph()`, but for an arbitrary selection of packages.
+    """
+    full_env = dict(os.environ if env is None else env)
+    full_env.update(n.metainfo.sources_var for n in nodes)
+
+    parser = FilelistParser(full_env)
+    yield from dedup(entry for node in nodes for entry in parser.parse(node.metainfo.filelist))
@@ -5,16 +5,33 @@ which can be traversed in the correct (dependency-aware) order.
 """
 from __future__ import annotations
 
+import asyncio
+import heapq
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Deque, Iterable, Iterator, List, Sequence, Set
+from typing import Any, Callable, Deque, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
+from packaging.utils import canonicalize_name
+
+from . import timings
 from .metainfo import PackageMetaInfo
 
 
+class CircularDependencyError(RuntimeError):
+    """Dependency graph contains a cycle, so it can't be traversed in a dependency-aware order."""
+
+    def __init__(self, cycle: Sequence[str]) -> None:
+        """Init error with names of packages forming a loop, where every package requires the next one."""
+        self.cycle: List[str] = list(cycle)
+        super().__init__(f"Circular dependency detected: {' -> '.join(self.cycle + self.cycle[:1])}")
+
+
 class GraphNode:
     """Graph node, which represents a package."""
 
+    __slots__ = ("metainfo", "upstreams", "downstreams")
+
     def __init__(self, metainfo: PackageMetaInfo) -> None:
         """Init node."""
         self.metainfo: PackageMetaInfo = metainfo
@@ -33,76 +50,602 @@ class GraphNode:
             node.downstreams.add(self)
 
 
+# meta-information and upstreams of a node, which are restored if an update of the graph fails
+_NodeState = Tuple[PackageMetaInfo, FrozenSet[GraphNode]]
+
+
+class ReachabilityIndex:
+    """Precomputed transitive closure of a graph to answer reachability queries without traversals.
+
+    Nodes are numbered in a dependency-aware order and sets of nodes are stored as bitsets (Python integers),
+    where bit `i` stands for the node `i`. So the closure of any number of nodes is just a bitwise OR of their
+    masks, and the result can be decoded back in a dependency-aware order.
+    """
+
+    def __init__(self, order: Sequence[GraphNode]) -> None:
+        """Build index for nodes in dependency-aware order in O(V*E/w), where w is a machine word size."""
+        self.nodes: List[GraphNode] = list(order)
+        self.positions: Dict[GraphNode, int] = {node: i for i, node in enumerate(self.nodes)}
+
+        # upstreams are always numbered before the node, and downstreams after, so a single pass is enough
+        self.ancestors: List[int] = [0] * len(self.nodes)
+        for i, node in enumerate(self.nodes):
+            mask = 0
+            for upstream in node.upstreams:
+                j = self.positions[upstream]
+                mask |= self.ancestors[j] | (1 << j)
+            self.ancestors[i] = mask
+
+        self.descendants: List[int] = [0] * len(self.nodes)
+        for i in reversed(range(len(self.nodes))):
+            mask = 0
+            for downstream in self.nodes[i].downstreams:
+                j = self.positions[downstream]
+                mask |= self.descendants[j] | (1 << j)
+            self.descendants[i] = mask
+
+    def mask(self, nodes: Iterable[GraphNode]) -> int:
+        """Get bitset of nodes."""
+        mask = 0
+        for node in nodes:
+            mask |= 1 << self.positions[node]
+        return mask
+
+    def decode(self, mask: int) -> List[GraphNode]:
+        """Get nodes from bitset in dependency-aware order."""
+        nodes: List[GraphNode] = []
+        while mask:
+            lowest = mask & -mask
+            nodes.append(self.nodes[lowest.bit_length() - 1])
+            mask ^= lowest
+        return nodes
+
+
 class DependencyGraph:
     """Directed Acyclic Graph to operate with package dependecies conveniently."""
 
     def __init__(self, packages: Sequence[PackageMetaInfo]) -> None:
         """Create dependecy DAG from provided packages."""
-        # create nodes
-        self.nodes = {n.id: n for n in self._packages_to_nodes(packages)}
+        self.nodes: Dict[str, GraphNode] = {}
+        self._reachability: Optional[ReachabilityIndex] = None
+        # nodes by normalized name, and topological order with positions of nodes in it; all are built lazily
+        # on the first use and then maintained by incremental updates
+        self._by_key: Optional[Dict[str, GraphNode]] = None
+        self._order: Optional[List[GraphNode]] = None
+        self._positions: Dict[GraphNode, int] = {}
+        with timings.span("graph.build"):
+            self._expand(packages, {})
+
+    @classmethod
+    async def from_packages_async(cls, packages: Sequence[PackageMetaInfo], concurrency: int = 32) -> DependencyGraph:
+        """Create dependency DAG, doing blocking metadata lookups of packages concurrently.
 
-        # link nodes
-        for node in self.nodes.values():
-            node.add_upstreams([self.nodes[d.metainfo.name] for d in node.metainfo.dependencies])
+        Every lookup (distribution metadata, imports, filelist search) is a blocking filesystem round trip,
+        which is slow on network filesystems. Here the whole dependency frontier is expanded at once:
+        lookups of all discovered packages are run in a thread pool, and dependencies of every package are
+        scheduled as soon as it is resolved. Then the graph is built from already resolved packages
+        exactly as the constructor does it, so the result is the same.
+
+        Args:
+            packages: Requested packages.
+            concurrency: Maximum number of packages resolved at the same time.
+        """
+        with timings.span("graph.prefetch"):
+            await _prefetch(packages, concurrency)
+        return cls(packages)
 
     def __iter__(self) -> Iterator[GraphNode]:
         """Iterate through nodes in dependency-aware order."""
-        # need to start from "roots" - nodes without dependecies
-        initial_nodes = [node for node in self.nodes.values() if len(node.upstreams) == 0]
+        yield from self.traverse()
+
+    def traverse(self, key: Optional[Callable[[GraphNode], Any]] = None) -> Iterator[GraphNode]:
+        """Iterate through nodes in dependency-aware order.
+
+        Node is yielded only if all its dependencies were already yielded. By default, nodes which are ready
+        at the same time are yielded in a discovery (FIFO) order. This order is computed once and then maintained
+        by incremental updates (`add_package()`, etc.), so it may differ from the order of the same graph built
+        from scratch. Provide `key` to break ties deterministically, e.g. `key=lambda n: n.id` to get the same order
+        regardless of how graph was built or updated.
+
+        Raises:
+            CircularDependencyError: graph has a cycle. Nothing is yielded in this case.
+        """
+        yield from self._topological_order(key)
+
+    def levels(self) -> List[List[GraphNode]]:
+        """Group nodes by dependency levels.
+
+        Level of a node is the length of the longest path to it from any node without dependencies.
+        Nodes within a level are independent from each other and depend only on nodes from previous levels,
+        so every level can be processed in parallel. Nodes within a level are sorted by id.
+        """
+        node_levels: Dict[GraphNode, int] = {}
+        levels: List[List[GraphNode]] = []
+        for node in self._topological_order(key=lambda n: n.id):
+            level = max((node_levels[u] + 1 for u in node.upstreams), default=0)
+            node_levels[node] = level
+            if level == len(levels):
+                levels.append([])
+            levels[level].append(node)
+        for nodes in levels:
+            nodes.sort(key=lambda n: n.id)
+        return levels
+
+    @property
+    def reachability(self) -> ReachabilityIndex:
+        """Reachability index of the graph. It is built on the first access and reused by all further queries.
+
+        Raises:
+            CircularDependencyError: graph has a cycle.
+        """
+        if self._reachability is None:
+            order = self._topological_order(key=lambda n: n.id)
+            with timings.span("graph.reachability"):
+                self._reachability = ReachabilityIndex(order)
+        return self._reachability
+
+    def ancestors(self, ids: Iterable[str], inclusive: bool = False) -> List[GraphNode]:
+        """Get all direct and indirect dependencies of the packages.
+
+        Packages are identified by node id or any other spelling of the package name.
+        Nodes are returned in dependency-aware order, the same as `traverse(key=lambda n: n.id)` gives.
+
+        Args:
+            ids: Packages to get dependencies of.
+            inclusive: Include the packages themselves in the result.
+
+        Raises:
+            KeyError: package is not in the graph.
+        """
+        index = self.reachability
+        nodes = [self.find(i) for i in ids]
+        mask = index.mask(nodes) if inclusive else 0
+        for node in nodes:
+            mask |= index.ancestors[index.positions[node]]
+        return index.decode(mask)
+
+    def descendants(self, ids: Iterable[str], inclusive: bool = False) -> List[GraphNode]:
+        """Get all packages, which depend on the packages directly or indirectly, i.e. affected by their changes.
+
+        Arguments, result and errors are the same as for `ancestors()`.
+        """
+        index = self.reachability
+        nodes = [self.find(i) for i in ids]
+        mask = index.mask(nodes) if inclusive else 0
+        for node in nodes:
+            mask |= index.descendants[index.positions[node]]
+        return index.decode(mask)
+
+    def depends_on(self, node_id: str, other_id: str) -> bool:
+        """Check if package depends on the other one directly or indirectly."""
+        index = self.reachability
+        ancestors = index.ancestors[index.positions[self.find(node_id)]]
+        return bool(ancestors >> index.positions[self.find(other_id)] & 1)
+
+    def subgraph(self, ids: Iterable[str]) -> DependencyGraph:
+        """Get graph with the packages and all their dependencies only.
+
+        Nodes of the new graph are new objects, but meta-information of packages is shared,
+        so nothing is resolved again.
+        """
+        nodes = self.ancestors(ids, inclusive=True)
+        subgraph = DependencyGraph([])
+        for node in nodes:
+            subgraph.nodes[node.id] = GraphNode(node.metainfo)
+        for node in nodes:
+            subgraph.nodes[node.id].add_upstreams(subgraph.nodes[u.id] for u in node.upstreams)
+        return subgraph
+
+    def find(self, node_id: str) -> GraphNode:
+        """Get node by id or any other spelling of the package name.
+
+        Raises:
+            KeyError: package is not in the graph.
+        """
+        node = self.nodes.get(node_id) or self._key_index().get(canonicalize_name(node_id))
+        if node is None:
+            raise KeyError(f"Package '{node_id}' is not in the dependency graph")
+        return node
+
+    def add_package(self, metainfo: PackageMetaInfo) -> GraphNode:
+        """Add package along with all its dependencies, which are not in the graph yet.
+
+        Existing nodes are reused for dependencies, and nothing is changed if the package is already
+        in the graph with the same extras (use `update_package()` to change it). Only new nodes are resolved
+        and ordered, unless an existing package is now required with more extras: then its optional dependencies
+        are added as well, and the order is computed again.
+
+        Raises:
+            CircularDependencyError: new packages form a cycle.
+            PackageNotFoundError: a new package is not installed.
 
-        if self.nodes and (len(initial_nodes) == 0):
-            raise RuntimeError("Can't find packages without dependencies to start iteration. Circular dependency?")
+        Graph is not changed if any error is raised.
+        """
+        keys = self._key_index()
+        existing = keys.get(canonicalize_name(metainfo.name))
+        if existing is not None and metainfo.extras <= existing.metainfo.extras:
+            return existing
+
+        order = self._cached_order()
+        length = len(order)
+        new_nodes, widened = self._expand([metainfo], keys)
+        try:
+            self._append(new_nodes, order)
+            if widened:
+                self._reset_order()
+        except BaseException:
+            self._rollback(new_nodes, widened, length)
+            raise
+        return keys[canonicalize_name(metainfo.name)]
+
+    def remove_package(self, node_id: str) -> None:
+        """Remove package, which is not required by any other package. Its dependencies are kept.
+
+        Raises:
+            KeyError: package is not in the graph.
+            ValueError: package is required by other packages.
+        """
+        node = self.find(node_id)
+        if node.downstreams:
+            required_by = ", ".join(sorted(d.id for d in node.downstreams))
+            raise ValueError(f"Package '{node.id}' can't be removed, it is required by {required_by}")
+
+        order = self._cached_order()
+        self._discard([node])
+        position = self._positions.pop(node)
+        del order[position]
+        for i in range(position, len(order)):
+            self._positions[order[i]] = i
+
+    def update_package(self, metainfo: PackageMetaInfo) -> GraphNode:
+        """Replace meta-information of a package and relink it to its current dependencies.
+
+        New dependencies are added to the graph, dependencies which are not required anymore are kept.
+        Topological order is patched only within the region between the package and its new dependencies.
+
+        Raises:
+            KeyError: package is not in the graph.
+            CircularDependencyError: new dependencies introduce a cycle.
+            PackageNotFoundError: a new dependency is not installed.
+
+        Graph is not changed if any error is raised.
+        """
+        node = self.find(metainfo.name)
+        dependencies = [d.metainfo for d in metainfo.dependencies]
+        keys = self._key_index()
+        order = self._cached_order()
+
+        length = len(order)
+        new_nodes, widened = self._expand(dependencies, keys)
+        try:
+            self._append(new_nodes, order)
+            if widened:
+                order = self._reset_order()
+            upstreams = list(dict.fromkeys(keys[canonicalize_name(d.name)] for d in dependencies))
+            added = [u for u in upstreams if u not in node.upstreams]
+            for upstream in added:
+                cycle = self._path_to(node, upstream)
+                if cycle is not None:
+                    # every node in the path is required by the next one, so the cycle is the reversed path
+                    raise CircularDependencyError([node.id] + [n.id for n in reversed(cycle[1:])])
+        except BaseException:
+            self._rollback(new_nodes, widened, length)
+            raise
+
+        for upstream in node.upstreams - set(upstreams):
+            node.upstreams.discard(upstream)
+            upstream.downstreams.discard(node)
+        if metainfo.name != node.id:
+            del self.nodes[node.id]
+            self.nodes[metainfo.name] = node
+        node.metainfo = metainfo
+        for upstream in added:
+            node.add_upstreams([upstream])
+            self._reorder(upstream, node, order)
+        self._reachability = None
+        return node
+
+    def _key_index(self) -> Dict[str, GraphNode]:
+        """Get nodes by normalized name."""
+        if self._by_key is None:
+            self._by_key = {canonicalize_name(node.id): node for node in self.nodes.values()}
+        return self._by_key
+
+    def _cached_order(self) -> List[GraphNode]:
+        """Get topological order maintained between updates.
+
+        Raises:
+            CircularDependencyError: graph has a cycle.
+        """
+        if self._order is None:
+            self._order = self._kahn(None)
+            self._positions = {node: i for i, node in enumerate(self._order)}
+        return self._order
+
+    def _reset_order(self) -> List[GraphNode]:
+        """Compute topological order from scratch, e.g. after new dependencies of existing nodes were linked.
+
+        Raises:
+            CircularDependencyError: graph has a cycle.
+        """
+        self._order = None
+        self._positions = {}
+        self._reachability = None
+        return self._cached_order()
+
+    def _append(self, nodes: List[GraphNode], order: List[GraphNode]) -> None:
+        """Add new nodes to the end of the topological order.
+
+        Raises:
+            CircularDependencyError: new nodes form a cycle. Caller is responsible to roll them back.
+        """
+        new = set(nodes)
+        in_degree = {node: sum(u in new for u in node.upstreams) for node in nodes}
+        ready = deque(node for node in nodes if in_degree[node] == 0)
+        while ready:
+            node = ready.popleft()
+            self._positions[node] = len(order)
+            order.append(node)
+            # existing nodes may depend on new ones only if they got more extras, they are reordered by the caller
+            for downstream in node.downstreams & new:
+                in_degree[downstream] -= 1
+                if in_degree[downstream] == 0:
+                    ready.append(downstream)
+
+        unresolved = [node for node in nodes if in_degree[node] > 0]
+        if unresolved:
+            raise CircularDependencyError(self._find_cycle(unresolved))
+        self._reachability = None
+
+    def _rollback(self, nodes: List[GraphNode], widened: Dict[GraphNode, _NodeState], length: int) -> None:
+        """Undo expansion: remove new nodes and restore nodes, which got more extras.
+
+        Topological order is truncated to the given length, or computed again on demand if it was reset.
+        """
+        for node, (metainfo, upstreams) in widened.items():
+            for upstream in node.upstreams - upstreams:
+                upstream.downstreams.discard(node)
+            node.upstreams = set(upstreams)
+            node.metainfo = metainfo
+        if self._order is not None and not widened:
+            for node in self._order[length:]:
+                del self._positions[node]
+            del self._order[length:]
+        else:
+            self._order = None
+            self._positions = {}
+        self._discard(nodes)
+
+    def _discard(self, nodes: Iterable[GraphNode]) -> None:
+        """Unlink nodes and remove them from the graph."""
+        keys = self._key_index()
+        for node in nodes:
+            for upstream in node.upstreams:
+                upstream.downstreams.discard(node)
+            del self.nodes[node.id]
+            del keys[canonicalize_name(node.id)]
+        self._reachability = None
+
+    def _path_to(self, node: GraphNode, target: GraphNode) -> Optional[List[GraphNode]]:
+        """Find path from the node to the target through dependants, if target can be reached this way.
+
+        Target can be reached only if it goes after the node in the topological order, so only nodes
+        between them are visited.
+        """
+        limit = self._positions[target]
+        parents: Dict[GraphNode, Optional[GraphNode]] = {node: None}
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current is target:
+                path: List[GraphNode] = []
+                step: Optional[GraphNode] = current
+                while step is not None:
+                    path.append(step)
+                    step = parents[step]
+                return list(reversed(path))
+            for downstream in current.downstreams:
+                if downstream not in parents and self._positions[downstream] <= limit:
+                    parents[downstream] = current
+                    stack.append(downstream)
+        return None
+
+    def _reorder(self, upstream: GraphNode, node: GraphNode, order: List[GraphNode]) -> None:
+        """Restore topological order after a new edge from the upstream to the node (Pearce-Kelly algorithm).
+
+        Only nodes between them in the current order are affected: the node with its dependants, which go before
+        the upstream, are moved right after the upstream with its dependencies, which go after the node.
+        """
+        lower, upper = self._positions[node], self._positions[upstream]
+        if upper < lower:
+            return
+
+        def region(start: GraphNode, forward: bool) -> List[GraphNode]:
+            seen = {start}
+            stack = [start]
+            while stack:
+                current = stack.pop()
+                for n in current.downstreams if forward else current.upstreams:
+                    if n not in seen and lower <= self._positions[n] <= upper:
+                        seen.add(n)
+                        stack.append(n)
+            return sorted(seen, key=self._positions.__getitem__)
+
+        moved_forward = region(node, forward=True)
+        moved_backward = region(upstream, forward=False)
+        slots = sorted(self._positions[n] for n in moved_forward + moved_backward)
+        for slot, n in zip(slots, moved_backward + moved_forward):
+            order[slot] = n
+            self._positions[n] = slot
+
+    def _topological_order(self, key: Optional[Callable[[GraphNode], Any]] = None) -> List[GraphNode]:
+        """Sort nodes topologically using Kahn's algorithm in O(V+E). Order without key is cached."""
+        with timings.span("graph.topological_order"):
+            if key is None:
+                return list(self._cached_order())
+            return self._kahn(key)
+
+    def _kahn(self, key: Optional[Callable[[GraphNode], Any]]) -> List[GraphNode]:
+        """Kahn's algorithm itself."""
+        in_degree: Dict[GraphNode, int] = {node: len(node.upstreams) for node in self.nodes.values()}
+        roots = [node for node, degree in in_degree.items() if degree == 0]
+        order: List[GraphNode] = []
 
-        yield from self._traverse_from(initial_nodes)
+        if key is None:
+            ready: Deque[GraphNode] = deque(roots)
+            while ready:
+                node = ready.popleft()
+                order.append(node)
+                for downstream in node.downstreams:
+                    in_degree[downstream] -= 1
+                    if in_degree[downstream] == 0:
+                        ready.append(downstream)
+        else:
+            # sequence number makes heap entries unique, so nodes themselves are never compared
+            heap: List[Tuple[Any, int, GraphNode]] = [(key(node), i, node) for i, node in enumerate(roots)]
+            heapq.heapify(heap)
+            seq = len(heap)
+            while heap:
+                _, _, node = heapq.heappop(heap)
+                order.append(node)
+                for downstream in node.downstreams:
+                    in_degree[downstream] -= 1
+                    if in_degree[downstream] == 0:
+                        heapq.heappush(heap, (key(downstream), seq, downstream))
+                        seq += 1
 
-    def _traverse_from(self, nodes: Iterable[GraphNode]) -> Iterator[GraphNode]:
-        """Traverse through a DAG starting from provided `nodes` and visiting all their downstreams.
+        if len(order) != len(self.nodes):
+            raise CircularDependencyError(self._find_cycle([n for n, degree in in_degree.items() if degree > 0]))
+        return order
 
-        Nodes are yielded in a dependency-aware manner - node is yielded only if it's dependencies were already yielded.
-        Non-recursive BFS-like algorithm is used here.
+    @staticmethod
+    def _find_cycle(nodes: Sequence[GraphNode]) -> List[str]:
+        """Find a cycle among nodes, which were left unresolved by topological sort.
+
+        Every such node has at least one unresolved upstream, so walking upstreams from any of them
+        inevitably returns to an already seen node. Path from that node onwards is the cycle.
         """
-        visited: List[GraphNode] = []
-        planned: Deque[GraphNode] = deque(nodes)
+        unresolved = set(nodes)
+        path: List[GraphNode] = []
+        position: Dict[GraphNode, int] = {}
+        node = nodes[0]
+        while node not in position:
+            position[node] = len(path)
+            path.append(node)
+            node = min((n for n in node.upstreams if n in unresolved), key=lambda n: n.id)
+        cycle_start = position[node]
+        return [n.id for n in path[cycle_start:]]
+
+    def _expand(
+        self, packages: Iterable[PackageMetaInfo], built: Dict[str, GraphNode]
+    ) -> Tuple[List[GraphNode], Dict[GraphNode, _NodeState]]:
+        """Create nodes for packages and all their dependencies, which are not built yet, then link them.
 
-        while len(planned):
-            node = planned.popleft()
+        Packages are identified by a normalized name, so every package is expanded and converted to a node only once,
+        no matter how many dependency paths lead to it. The only exception is a package required with extras, which
+        were not seen for it yet: extras are merged, and the package is expanded again to find optional dependencies.
+        Non-recursive DFS is used, so depth of dependency chains is not limited by the interpreter recursion limit.
 
-            if node in visited:
-                continue
-            if set(node.upstreams).intersection(set(planned)):
-                # dependencies are not resolved yet, plan the job again
-                planned.append(node)
-                continue
+        Returns:
+            New nodes in discovery order, and nodes which were built before, but got more extras,
+            with their previous state to roll the expansion back.
+
+        Raises:
+            PackageNotFoundError: package is not installed. Nothing is changed in this case.
+        """
+        upstream_keys: Dict[GraphNode, List[str]] = {}
+        new_nodes: List[GraphNode] = []
+        widened: Dict[GraphNode, _NodeState] = {}
+        planned: List[PackageMetaInfo] = list(reversed(list(packages)))
 
-            visited.append(node)
-            yield node
+        try:
+            while planned:
+                pkg = planned.pop()
+                key = canonicalize_name(pkg.name)
+                node = built.get(key)
+                if node is None:
+                    node = GraphNode(pkg)
+                    built[key] = node
+                    self.nodes[node.id] = node
+                    new_nodes.append(node)
+                elif pkg.extras <= node.metainfo.extras:
+                    continue
+                else:
+                    if node not in upstream_keys:
+                        widened[node] = (node.metainfo, frozenset(node.upstreams))
+                    node.metainfo = pkg = node.metainfo.with_extras(pkg.extras)
 
-            # plan all the following nodes
-            for downstream in node.downstreams:
-                planned.append(downstream)
+                dependencies = [d.metainfo for d in pkg.dependencies]
+                upstream_keys[node] = [canonicalize_name(d.name) for d in dependencies]
+                planned.extend(reversed(dependencies))
+        except BaseException:
+            for node, (metainfo, _) in widened.items():
+                node.metainfo = metainfo
+            for node in new_nodes:
+                del self.nodes[node.id]
+                del built[canonicalize_name(node.id)]
+            raise
 
-    def _packages_to_nodes(self, packages: Iterable[PackageMetaInfo]) -> Iterator[GraphNode]:
-        """Convert packages and all their dependencies to graph nodes recursivelly."""
-        for pkg in packages:
-            yield GraphNode(pkg)
-            yield from self._packages_to_nodes([d.metainfo for d in pkg.dependencies])
+        for node, keys in upstream_keys.items():
+            node.add_upstreams([built[k] for k in keys])
+        return new_nodes, widened
 
-    def render(self, **kwargs: Any) -> Path:
+    def render(self, reduce: bool = False, **kwargs: Any) -> Path:
         """Render current graph using `graphviz`.
 
-        Arguments are the same as in 'graphviz.Digraph.render()'.
+        Arguments are the same as in 'graphviz.Source.render()'. Set `reduce` to drop edges implied
+        by other edges, which makes large graphs much more readable. Use `pip_hdl.export` to get graph
+        as text without `graphviz`.
         """
         # This minor feature requires rendering engine presence in a system, which might be not the case.
         # So do lazy import here only if rendering actually requested.
         import graphviz
 
-        graph = graphviz.Digraph("graph", graph_attr={"rankdir": "RL"})
+        from .export import to_dot
+
+        return Path(graphviz.Source(to_dot(self, reduce=reduce)).render(**kwargs))
+
+
+async def _prefetch(packages: Sequence[PackageMetaInfo], concurrency: int) -> None:
+    """Resolve packages and all their dependencies concurrently.
+
+    Every package with the same name and extras is resolved only once, and other instances of it reuse
+    the lookups, so whichever instance the graph build picks, it is already resolved.
+    """
+    loop = asyncio.get_running_loop()
+    resolved: Dict[Tuple[str, FrozenSet[str]], PackageMetaInfo] = {}
+    duplicates: List[Tuple[PackageMetaInfo, PackageMetaInfo]] = []
+    pending: Set[asyncio.Future] = set()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+        def schedule(pkgs: Iterable[PackageMetaInfo]) -> None:
+            for pkg in pkgs:
+                key = (canonicalize_name(pkg.name), pkg.extras)
+                if key in resolved:
+                    duplicates.append((pkg, resolved[key]))
+                else:
+                    resolved[key] = pkg
+                    pending.add(loop.run_in_executor(executor, _expand, pkg))
+
+        schedule(packages)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                schedule(future.result())
+
+    for pkg, other in duplicates:
+        pkg.share_lookups(other)
+
 
-        for node in self.nodes.values():
-            if len(node.upstreams) == 0:
-                graph.node(node.id)
-            else:
-                for upstream in node.upstreams:
-                    graph.edge(node.id, upstream.id)
+def _expand(pkg: PackageMetaInfo) -> List[PackageMetaInfo]:
+    """Resolve package. Returns its dependencies, or nothing if it can't be resolved.
 
-        return Path(graph.render(**kwargs))
+    Error of the resolution is kept by the package, and it is raised by the graph build at the same point
+    as without prefetch, so both builds either produce the same graph or fail the same way.
+    """
+    pkg.prefetch()
+    try:
+        return [d.metainfo for d in pkg.dependencies]
+    except Exception:  # noqa
+        return []
@@ -0,0 +1,196 @@
+"""Lockfile with the fully resolved environment of HDL packages.
+
+Lockfile captures everything `inspect` needs: packages in dependency-aware order with their dependencies,
+versions, filelists, sources roots and environment variables, and content hashes of the sources.
+Packages are restored from a lockfile without any metadata lookups or imports.
+
+Paths within site-packages are stored relative to it, so the whole environment can be relocated
+(e.g. copied to another machine or virtual environment) along with the lockfile.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sysconfig
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from packaging.utils import canonicalize_name
+
+from .filelist import FilelistParser
+from .graph import DependencyGraph
+from .manifest import MISSING_DIGEST, hash_file, package_files
+from .metainfo import DistributionIndex, PackageMetaInfo
+from .report import write_if_changed
+
+
+class LockfileError(ValueError):
+    """Lockfile can't be read."""
+
+
+class LockedPackage(NamedTuple):
+    """Resolved package stored within a lockfile."""
+
+    name: str
+    distribution: Optional[str]
+    version: Optional[str]
+    dependencies: List[str]
+    filelist: str  # relative to site-packages, or absolute if package is installed elsewhere
+    sources_root: str  # same as above
+    sources_var: str
+    digest: str  # hash of all files referenced by the filelist
+
+
+def default_site_root() -> Path:
+    """Site-packages directory of the current interpreter, to which paths in a lockfile are relative."""
+    return Path(sysconfig.get_paths()["purelib"])
+
+
+def is_lockfile(obj: str) -> bool:
+    """Check if object for inspection is a lockfile."""
+    return obj.endswith(".lock") and Path(obj).is_file()
+
+
+class Lockfile:
+    """Resolved packages and the packages requested to resolve them."""
+
+    FORMAT_VERSION = 1
+    DEFAULT_PATH = Path("pip-hdl.lock")
+
+    def __init__(self, requested: Sequence[str], packages: Sequence[LockedPackage]) -> None:
+        """Init lockfile with names of requested packages and all resolved packages in dependency-aware order."""
+        self.requested: List[str] = list(requested)
+        self.packages: List[LockedPackage] = list(packages)
+
+    @classmethod
+    def from_graph(
+        cls,
+        requested: Sequence[PackageMetaInfo],
+        graph: DependencyGraph,
+        site_root: Optional[Path] = None,
+        jobs: Optional[int] = None,
+    ) -> Lockfile:
+        """Lock resolved packages. Sources are hashed in parallel."""
+        site_root = default_site_root() if site_root is None else site_root
+        nodes = list(graph.traverse(key=lambda n: n.id))
+        digests = _package_digests([n.metainfo for n in nodes], site_root, jobs)
+
+        packages = []
+        for node in nodes:
+            metainfo = node.metainfo
+            dist = metainfo.distribution
+            packages.append(
+                LockedPackage(
+                    name=node.id,
+                    distribution=None if dist is None else dist.metadata["Name"],
+                    version=None if dist is None else dist.version,
+                    dependencies=sorted(u.id for u in node.upstreams),
+                    filelist=_relative_to_site(metainfo.filelist, site_root),
+                    sources_root=_relative_to_site(metainfo.sources_root, site_root),
+                    sources_var=metainfo.sources_var.name,
+                    digest=digests[node.id],
+                )
+            )
+        return cls([p.name for p in requested], packages)
+
+    @classmethod
+    def read(cls, path: Path) -> Lockfile:
+        """Read lockfile.
+
+        Raises:
+            LockfileError: lockfile is corrupted or has unsupported format version.
+        """
+        try:
+            with path.open("r") as f:
+                data = json.load(f)
+            version = data.get("version")
+            if version == cls.FORMAT_VERSION:
+                return cls(data["requested"], [LockedPackage(**p) for p in data["packages"]])
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise LockfileError(f"{path}: lockfile is corrupted ({type(e).__name__}: {e})") from e
+        raise LockfileError(f"{path}: unsupported lockfile version {version}")
+
+    def write(self, path: Path) -> bool:
+        """Write lockfile. File is not touched if content is the same. Returns `True` if file was written."""
+        data = {
+            "version": self.FORMAT_VERSION,
+            "requested": self.requested,
+            "packages": [p._asdict() for p in self.packages],
+        }
+        return write_if_changed(path, json.dumps(data, indent=1) + "\n")
+
+    def load_packages(self, site_root: Optional[Path] = None) -> List[PackageMetaInfo]:
+        """Restore requested packages with all their dependencies already resolved."""
+        site_root = default_site_root() if site_root is None else site_root
+        resolved: Dict[str, PackageMetaInfo] = {}
+        for pkg in self.packages:  # packages are stored in dependency-aware order
+            resolved[canonicalize_name(pkg.name)] = PackageMetaInfo.from_resolved(
+                pkg.name,
+                filelist=site_root / pkg.filelist,
+                dependencies=[resolved[canonicalize_name(d)] for d in pkg.dependencies],
+            )
+        return [resolved[canonicalize_name(name)] for name in self.requested]
+
+    def verify(
+        self,
+        site_root: Optional[Path] = None,
+        check_hashes: bool = False,
+        index: Optional[DistributionIndex] = None,
+        jobs: Optional[int] = None,
+    ) -> List[str]:
+        """Check that the installed environment matches the lockfile. Returns descriptions of all mismatches.
+
+        By default, only versions of installed distributions (a single scan of `sys.path`) and presence
+        of filelists are checked. Set `check_hashes` to rehash all sources as well.
+        """
+        site_root = default_site_root() if site_root is None else site_root
+        index = DistributionIndex() if index is None else index
+        problems: List[str] = []
+        for pkg in self.packages:
+            dist = index.get(pkg.distribution or pkg.name)
+            version = None if dist is None else dist.version
+            if version != pkg.version:
+                problems.append(f"{pkg.name}: version {version or 'not installed'}, locked {pkg.version}")
+            elif not (site_root / pkg.filelist).is_file():
+                problems.append(f"{pkg.name}: filelist {site_root / pkg.filelist} not found")
+
+        if check_hashes and not problems:
+            packages = {p.name: p for p in self.packages}
+            metainfos = [PackageMetaInfo.from_resolved(p.name, site_root / p.filelist, []) for p in self.packages]
+            for name, digest in _package_digests(metainfos, site_root, jobs).items():
+                if digest != packages[name].digest:
+                    problems.append(f"{name}: sources are changed")
+        return problems
+
+
+def _relative_to_site(path: Path, site_root: Path) -> str:
+    """Make path relative to site-packages if it is located there."""
+    try:
+        return str(PurePosixPath(path.relative_to(site_root)))
+    except ValueError:
+        return str(path)
+
+
+def _package_digests(packages: Sequence[PackageMetaInfo], site_root: Path, jobs: Optional[int]) -> Dict[str, str]:
+    """Hash all files referenced by filelists of packages. Paths are hashed relative to site-packages."""
+    env = dict(os.environ)
+    env.update(p.sources_var for p in packages)
+    parser = FilelistParser(env)
+    files_by_package = {p.name: package_files(p, parser) for p in packages}
+
+    def digest_file(path: Path) -> str:
+        return hash_file(path) if path.is_file() else MISSING_DIGEST
+
+    unique_files = list({f for files in files_by_package.values() for f in files})
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        file_digests = dict(zip(unique_files, pool.map(digest_file, unique_files)))
+
+    digests: Dict[str, str] = {}
+    for name, files in files_by_package.items():
+        digest = hashlib.sha256()
+        for file in files:
+            digest.update(f"{_relative_to_site(file, site_root)}\0{file_digests[file]}\0".encode())
+        digests[name] = digest.hexdigest()
+    return digests
@@ -0,0 +1,145 @@
+"""Build manifest with content hashes of package sources.
+
+Manifest stores a hash for every package, which is computed over all files referenced by the package filelist.
+Comparison of the stored hashes with the current ones shows which packages (and their dependants)
+have to be recompiled.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Mapping, NamedTuple, Optional
+
+from .filelist import EntryKind, FilelistParser
+from .graph import DependencyGraph, GraphNode
+from .metainfo import PackageMetaInfo
+
+
+class FileStamp(NamedTuple):
+    """File state used to avoid rehashing of unchanged files."""
+
+    mtime_ns: int
+    size: int
+    digest: str
+
+
+MISSING_DIGEST = "missing"
+
+
+def package_files(metainfo: PackageMetaInfo, parser: FilelistParser) -> List[Path]:
+    """Get all files, which are compilation inputs of the package.
+
+    These are the filelist itself, sources, files passed with `-v`, and files located directly
+    within include directories.
+    """
+    files: List[Path] = [metainfo.filelist]
+    for entry in parser.parse(metainfo.filelist):
+        if entry.kind == EntryKind.SOURCE:
+            files.append(Path(entry.value))
+        elif entry.kind == EntryKind.INCDIR:
+            incdir = Path(entry.value)
+            if incdir.is_dir():
+                files.extend(sorted(p for p in incdir.iterdir() if p.is_file()))
+        elif entry.kind == EntryKind.OPTION and entry.value.startswith("-v "):
+            files.append(Path(entry.value.partition(" ")[2]))
+    return files
+
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Get SHA-256 of file content."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """Content hashes of packages stored between runs."""
+
+    FORMAT_VERSION = 1
+    DEFAULT_PATH = Path(".pip-hdl-manifest.json")
+
+    def __init__(self, path: Path = DEFAULT_PATH) -> None:
+        """Init manifest and load it from disk if it exists. Manifest, which can't be read, is treated as missing."""
+        self.path = path
+        self.packages: Dict[str, str] = {}
+        self.files: Dict[str, FileStamp] = {}
+
+        try:
+            with path.open("r") as f:
+                data = json.load(f)
+            if data.get("version") == self.FORMAT_VERSION:
+                packages = dict(data["packages"])
+                self.files = {k: FileStamp(*v) for k, v in data["files"].items()}
+                self.packages = packages
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass  # every package is changed
+
+    def save(self) -> None:
+        """Save manifest to disk."""
+        data = {
+            "version": self.FORMAT_VERSION,
+            "packages": self.packages,
+            "files": {k: list(v) for k, v in self.files.items()},
+        }
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with tmp_path.open("w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def scan(self, graph: DependencyGraph, jobs: Optional[int] = None) -> Dict[str, str]:
+        """Compute current hashes of all packages in the graph.
+
+        Files are hashed in parallel. Files with the same modification time and size as stored in the manifest
+        are not rehashed. Stored file stamps are updated, but package hashes are not, use `update()` for that.
+        """
+        nodes = list(graph.traverse(key=lambda n: n.id))
+        env = dict(os.environ)
+        env.update(n.metainfo.sources_var for n in nodes)
+        parser = FilelistParser(env)
+        files_by_package = {n.id: package_files(n.metainfo, parser) for n in nodes}
+
+        unique_files = {str(f) for files in files_by_package.values() for f in files}
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            stamps = dict(zip(unique_files, pool.map(self._stamp, unique_files)))
+        self.files = {path: stamp for path, stamp in stamps.items() if stamp.digest != MISSING_DIGEST}
+
+        digests: Dict[str, str] = {}
+        for pkg, files in files_by_package.items():
+            digest = hashlib.sha256(pkg.encode())
+            for file in files:
+                digest.update(f"\0{file}\0{stamps[str(file)].digest}".encode())
+            digests[pkg] = digest.hexdigest()
+        return digests
+
+    def _stamp(self, path: str) -> FileStamp:
+        """Get file stamp, reuse the stored digest if file is not changed."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return FileStamp(0, 0, MISSING_DIGEST)
+
+        stored = self.files.get(path)
+        if stored is not None and stored.mtime_ns == stat.st_mtime_ns and stored.size == stat.st_size:
+            return stored
+        try:
+            digest = hash_file(Path(path))
+        except OSError:
+            return FileStamp(0, 0, MISSING_DIGEST)  # removed after the listing, or it is a directory
+        return FileStamp(stat.st_mtime_ns, stat.st_size, digest)
+
+    def dirty(self, graph: DependencyGraph, digests: Mapping[str, str]) -> List[GraphNode]:
+        """Get packages which were changed since the last update along with all their dependants.
+
+        Packages are returned in dependency-aware order.
+        """
+        changed = [n.id for n in graph.nodes.values() if self.packages.get(n.id) != digests.get(n.id)]
+        return graph.descendants(changed, inclusive=True)
+
+    def update(self, digests: Mapping[str, str]) -> None:
+        """Store current package hashes, e.g. after successful compilation."""
+        self.packages.update(digests)
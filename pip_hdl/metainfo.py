@@ -2,13 +2,23 @@
 
 from __future__ import annotations
 
+import os
 import pkgutil
+import sys
+import threading
 from importlib import import_module, metadata
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 from types import ModuleType
-from typing import List, NamedTuple, Optional
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple
 
 from packaging.requirements import Requirement
+from packaging.utils import canonicalize_name
+
+from . import timings
+
+# Packages may be shared between threads, so resolution of dependencies is serialized per package. Locks are striped,
+# rather than stored within packages, to keep packages picklable. A lock is never held while another one is taken.
+_RESOLUTION_LOCKS = tuple(threading.Lock() for _ in range(64))
 
 
 class EnvVar(NamedTuple):
@@ -26,63 +36,287 @@ class PackageDependency(NamedTuple):
     metainfo: PackageMetaInfo
 
 
+class DistributionIndex:
+    """Installed distributions found within a single scan of `sys.path`, keyed by normalized name.
+
+    Every `importlib.metadata` lookup by name scans all `sys.path` entries, so sharing an index between
+    all lookups within a run makes resolution cost proportional to the number of packages only.
+    Distribution found first on `sys.path` wins, as it is for `importlib.metadata`.
+
+    Index is also a registry of packages created for lookups within it: the same package with the same extras
+    is represented by a single `PackageMetaInfo`, so it is resolved only once, even if it is required
+    by many requests (e.g. by many requirements files inspected within a single run).
+    """
+
+    def __init__(self, path: Optional[Iterable[str]] = None) -> None:
+        """Scan directories from `path` (`sys.path` by default) for distribution metadata."""
+        self._dists: Dict[str, metadata.Distribution] = {}
+        self._packages: Dict[Tuple[str, FrozenSet[str]], PackageMetaInfo] = {}
+        with timings.span("metainfo.index"):
+            for entry in sys.path if path is None else path:
+                self._scan(entry)
+
+    def _scan(self, entry: str) -> None:
+        """Add distributions from a single directory."""
+        try:
+            with os.scandir(entry or ".") as it:
+                names = [e.name for e in it if e.name.endswith((".dist-info", ".egg-info"))]
+        except OSError:
+            return  # zip archives or non-existent paths
+        for name in sorted(names):
+            # directory name is '<name>-<version>.dist-info' or '<name>.egg-info'
+            key = canonicalize_name(name.rsplit(".", 1)[0].split("-", 1)[0])
+            if key not in self._dists:
+                self._dists[key] = metadata.PathDistribution(Path(entry or ".", name))
+
+    def get(self, name: str) -> Optional[metadata.Distribution]:
+        """Get distribution by name in any spelling."""
+        return self._dists.get(canonicalize_name(name))
+
+    def __len__(self) -> int:
+        """Number of distributions."""
+        return len(self._dists)
+
+    def intern(self, metainfo: PackageMetaInfo) -> PackageMetaInfo:
+        """Get registered package with the same name and extras, or register this one if there is no such."""
+        # dict.setdefault is atomic, so packages can be registered from many threads
+        return self._packages.setdefault((canonicalize_name(metainfo.name), metainfo.extras), metainfo)
+
+
 class PackageMetaInfo:
     """HDL package meta information."""
 
     # All the HDL packages has to follow this conventions
     SOURCES_VAR_SUFFIX = "SOURCES_ROOT"
     FILELIST_NAME = "filelist.f"
+    ENTRY_POINT_GROUP = "pip_hdl"
 
-    def __init__(self, py_pkg_name: str) -> None:
-        """Init package meta-information."""
-        self.name: str = py_pkg_name
+    __slots__ = (
+        "name",
+        "extras",
+        "_index",
+        "_distribution",
+        "_dependencies",
+        "_dependencies_error",
+        "_filelist",
+        "_sources_root",
+        "_sources_var",
+        "_all_sources_vars",
+    )
 
+    def __init__(
+        self,
+        py_pkg_name: str,
+        distribution: Optional[metadata.Distribution] = None,
+        index: Optional[DistributionIndex] = None,
+        extras: Iterable[str] = (),
+    ) -> None:
+        """Init package meta-information.
+
+        Distribution is looked up by package name on demand, if it is not provided. Lookups are done
+        within the index if it is provided, and it is shared with all discovered dependencies.
+        Extras are used to select optional dependencies of the package.
+        """
+        self.name: str = sys.intern(py_pkg_name)
+        self.extras: FrozenSet[str] = frozenset(extras)
+
+        self._index = index
+        self._distribution: Optional[metadata.Distribution] = distribution
         self._dependencies: Optional[List[PackageDependency]] = None
+        self._dependencies_error: Optional[Exception] = None  # error of prefetch, kept until it is re-raised
         self._filelist: Optional[Path] = None
         self._sources_root: Optional[Path] = None
         self._sources_var: Optional[EnvVar] = None
         self._all_sources_vars: Optional[List[EnvVar]] = None
 
+    @classmethod
+    def from_resolved(
+        cls, py_pkg_name: str, filelist: Path, dependencies: Sequence[PackageMetaInfo]
+    ) -> PackageMetaInfo:
+        """Create package meta-information, which was already resolved before, e.g. restore it from a cache.
+
+        No metadata lookups or imports are done for such package later.
+        """
+        metainfo = cls(py_pkg_name)
+        metainfo._filelist = filelist
+        metainfo._dependencies = [PackageDependency(spec=d.name, module=None, metainfo=d) for d in dependencies]
+        return metainfo
+
+    @classmethod
+    def from_requirement(cls, requirement: Requirement, index: Optional[DistributionIndex] = None) -> PackageMetaInfo:
+        """Create meta-information for a required package.
+
+        Name of the Python package is taken from `pip_hdl` entry point of the distribution if available,
+        as it may differ from the distribution name.
+        """
+        if index is None:
+            return cls(requirement.name, extras=requirement.extras)
+        dist = index.get(requirement.name)
+        name = requirement.name
+        if dist is not None:
+            name = cls._entry_point_name(dist) or name
+        return index.intern(cls(name, dist, index=index, extras=requirement.extras))
+
+    @classmethod
+    def _entry_point_name(cls, dist: metadata.Distribution) -> Optional[str]:
+        """Get name of the package declared within `pip_hdl` entry point group."""
+        for entry_point in dist.entry_points:
+            if entry_point.group == cls.ENTRY_POINT_GROUP:
+                return entry_point.name
+        return None
+
+    @property
+    def distribution(self) -> Optional[metadata.Distribution]:
+        """Installed distribution of the package, if any."""
+        if self._distribution is None:
+            with timings.span("metainfo.distribution", package=self.name):
+                self._distribution = self._find_distribution(self.name)
+        return self._distribution
+
+    def _find_distribution(self, name: str) -> Optional[metadata.Distribution]:
+        """Find installed distribution by name."""
+        if self._index is not None:
+            return self._index.get(name)
+        try:
+            return metadata.distribution(name)
+        except metadata.PackageNotFoundError:
+            return None
+
     @property
     def dependencies(self) -> List[PackageDependency]:
         """Dependencies of the current package.
 
-        Dependency search is based on the presense of `metainfo` attribute within top-module.
+        Dependency is a pip-hdl package if its distribution declares an entry point in `pip_hdl` group.
+        Such dependencies are discovered from the installed metadata only, without any imports.
+        Packages created by older versions of pip-hdl don't have the entry point, so presence of `metainfo`
+        attribute within top-module is checked for them, but only if the distribution may contain a filelist.
+        Requirements with environment markers not matching the current environment or package extras are ignored.
         """
         if self._dependencies is None:
-            self._dependencies = []
-
-            required_packages = metadata.requires(self.name)
-            if required_packages is not None:
-                for spec in required_packages:
-                    try:
-                        module = import_module(Requirement(spec).name)
-                        if isinstance(module.metainfo, PackageMetaInfo):
-                            dependency = PackageDependency(spec=spec, module=module, metainfo=module.metainfo)
-                            self._dependencies.append(dependency)
-                    except (ImportError, AttributeError) as _:  # noqa
-                        pass
+            if self._dependencies_error is not None:
+                raise self._dependencies_error
+            with _RESOLUTION_LOCKS[id(self) % len(_RESOLUTION_LOCKS)]:
+                if self._dependencies is None:
+                    self._dependencies = self._resolve_dependencies()
         return self._dependencies
 
+    def _resolve_dependencies(self) -> List[PackageDependency]:
+        """Resolve dependencies. List is returned only when complete, so it is never seen partially filled."""
+        if self.distribution is None:
+            raise metadata.PackageNotFoundError(self.name)
+
+        dependencies: List[PackageDependency] = []
+        with timings.span("metainfo.dependencies", package=self.name):
+            for spec in self.distribution.requires or []:
+                requirement = Requirement(spec)
+                if requirement.marker is not None and not any(
+                    requirement.marker.evaluate({"extra": extra}) for extra in {"", *self.extras}
+                ):
+                    continue
+                dependency = self._discover_dependency(spec, requirement)
+                if dependency is not None:
+                    dependencies.append(dependency)
+        return dependencies
+
+    def _discover_dependency(self, spec: str, requirement: Requirement) -> Optional[PackageDependency]:
+        """Try to get meta-information for a required package."""
+        name = requirement.name
+        dist = self._find_distribution(name)
+
+        if dist is not None:
+            entry_point_name = self._entry_point_name(dist)
+            if entry_point_name is not None:
+                metainfo = PackageMetaInfo(entry_point_name, dist, index=self._index, extras=requirement.extras)
+                if self._index is not None:
+                    metainfo = self._index.intern(metainfo)
+                return PackageDependency(spec=spec, module=None, metainfo=metainfo)
+            if dist.files is not None and all(f.name != self.FILELIST_NAME for f in dist.files):
+                # there is nothing to compile within the distribution, so there is no need to import it
+                return None
+
+        try:
+            with timings.span("metainfo.import_module", package=name):
+                module = import_module(name)
+            if isinstance(module.metainfo, PackageMetaInfo):
+                return PackageDependency(spec=spec, module=module, metainfo=module.metainfo)
+        except (ImportError, AttributeError) as _:  # noqa
+            pass
+        return None
+
+    def prefetch(self) -> None:
+        """Do all blocking lookups of the package in advance: distribution, dependencies and filelist.
+
+        Errors are not raised here, they are raised on access to the corresponding attribute as usual.
+        An error of dependencies resolution is kept and raised again, so the failed lookup (e.g. an import
+        with side effects) is not repeated, and the error is exactly the one without prefetch.
+        """
+        try:
+            self.dependencies
+        except Exception as e:  # noqa
+            self._dependencies_error = e
+        try:
+            self.filelist
+        except Exception:  # noqa
+            pass
+
+    def with_extras(self, extras: Iterable[str]) -> PackageMetaInfo:
+        """Get the same package with extras added to the current ones. Lookups already done are reused."""
+        merged = self.extras | frozenset(extras)
+        if merged == self.extras:
+            return self
+        other = PackageMetaInfo(self.name, self._distribution, index=self._index, extras=merged)
+        other._filelist = self._filelist
+        return other if self._index is None else self._index.intern(other)
+
+    def share_lookups(self, other: PackageMetaInfo) -> None:
+        """Reuse lookups already done for the same package with the same extras, e.g. required by another package."""
+        self._distribution = self._distribution or other._distribution
+        self._dependencies = self._dependencies if self._dependencies is not None else other._dependencies
+        self._dependencies_error = self._dependencies_error or other._dependencies_error
+        self._filelist = self._filelist or other._filelist
+
     @property
     def filelist(self) -> Path:
-        """Path to an EDA filelist."""
+        """Path to an EDA filelist.
+
+        Filelist is searched within the distribution file records first, and then using package loader,
+        which is the only option for packages installed in editable mode.
+        """
         if self._filelist is None:
-            pkg_loader = pkgutil.get_loader(self.name)
-            if pkg_loader is None:
-                raise ModuleNotFoundError(f"Can't find package '{self.name}'. It has to be installed.")
+            with timings.span("metainfo.filelist", package=self.name):
+                pkg_filelist = self._find_recorded_filelist()
+                if pkg_filelist is None:
+                    pkg_filelist = self._find_loader_filelist()
+            self._filelist = pkg_filelist
+        return self._filelist
 
-            pkg_root = Path(pkg_loader.get_filename()).parent  # type: ignore
-            pkg_filelist = pkg_root / self.FILELIST_NAME
+    def _find_recorded_filelist(self) -> Optional[Path]:
+        """Find filelist using file records of the installed distribution."""
+        if self.distribution is None or self.distribution.files is None:
+            return None
 
-            if not pkg_filelist.exists():
-                raise FileNotFoundError(
-                    f"{self.FILELIST_NAME} was not found within '{self.name}' component at {pkg_root}!"
-                    " Is this correct package?"
-                )
+        filelist_record = PurePosixPath(self.name, self.FILELIST_NAME)
+        for file in self.distribution.files:
+            if PurePosixPath(file) == filelist_record:
+                return Path(str(self.distribution.locate_file(file)))
+        return None
 
-            self._filelist = pkg_filelist
-        return self._filelist
+    def _find_loader_filelist(self) -> Path:
+        """Find filelist using package loader."""
+        with timings.span("metainfo.get_loader", package=self.name):
+            pkg_loader = pkgutil.get_loader(self.name)
+        if pkg_loader is None:
+            raise ModuleNotFoundError(f"Can't find package '{self.name}'. It has to be installed.")
+
+        pkg_root = Path(pkg_loader.get_filename()).parent  # type: ignore
+        pkg_filelist = pkg_root / self.FILELIST_NAME
+
+        if not pkg_filelist.exists():
+            raise FileNotFoundError(
+                f"{self.FILELIST_NAME} was not found within '{self.name}' component at {pkg_root}!"
+                " Is this correct package?"
+            )
+        return pkg_filelist
 
     @property
     def sources_root(self) -> Path:
@@ -0,0 +1,135 @@
+"""Generator of Ninja build files for per-package compilation.
+
+Every package is compiled into its own library by a separate build edge, so Ninja compiles independent
+packages in parallel and recompiles only packages with changed sources. Sources referenced by a filelist
+are implicit inputs of the edge, and compilation of upstream packages is its order-only dependency
+(or implicit one, if dependants have to be recompiled on any upstream change).
+"""
+from __future__ import annotations
+
+import os
+import shlex
+from typing import Dict, Mapping, NamedTuple, Optional
+
+from .filelist import FilelistParser
+from .graph import DependencyGraph
+from .manifest import package_files
+from .scheduler import substitute_fields
+
+
+class NinjaTool(NamedTuple):
+    """Compilation command templates of an EDA tool.
+
+    Command is a template with fields (values are quoted for shell):
+        - `{name}` - name of the package
+        - `{filelist}` - filelist of the package
+        - `{sources_root}` - sources root of the package
+        - `{lib}` - library to compile the package into
+        - `{libs}` - `library_arg` formatted for every upstream package (direct or indirect)
+        - `{filelists}` - `-f FILELIST` for every upstream package
+    Library argument is a template with the `{name}` and `{lib}` fields of an upstream package.
+    Upstream packages are listed in a dependency-aware order. Other braces are kept as is.
+    """
+
+    command: str
+    library_arg: str = ""
+
+
+TOOLS: Dict[str, NinjaTool] = {
+    "questa": NinjaTool("vlib {lib} && vlog -work {lib} {libs} -f {filelist}", library_arg="-L {lib}"),
+    # verilator has no precompiled libraries, so every package is linted with all its upstream sources
+    "verilator": NinjaTool("verilator --lint-only {filelists} -f {filelist}"),
+}
+
+
+def generate_ninja(
+    graph: DependencyGraph,
+    tool: NinjaTool,
+    builddir: str = "pip_hdl_build",
+    rebuild_dependants: bool = False,
+    env: Optional[Mapping[str, str]] = None,
+) -> str:
+    """Generate Ninja build file for the graph.
+
+    Library of every package is `<builddir>/<name>`, and the edge output is a `<builddir>/<name>.stamp` file,
+    which is touched after successful compilation. Every package is also a phony target `<name>`,
+    and `all` builds everything. Environment variables for sources of all packages are exported
+    for every command, as they are used within filelists.
+
+    Args:
+        graph: Graph with packages to compile.
+        tool: Command templates.
+        builddir: Directory for libraries, relative to the build file.
+        rebuild_dependants: Recompile packages when any of their upstream packages is recompiled.
+            By default, upstream compilation is only an order-only dependency.
+        env: Environment variables to substitute within filelists to find sources, along with variables
+            for sources of all packages. Process environment is used if not provided.
+    """
+    nodes = list(graph.traverse(key=lambda n: n.id))
+    sources_vars = [n.metainfo.sources_var for n in nodes]
+    full_env = dict(os.environ if env is None else env)
+    full_env.update(sources_vars)
+    parser = FilelistParser(full_env)
+
+    exports = " ".join(f"{v.name}={shlex.quote(v.value)}" for v in sources_vars)
+    lines = [
+        "# Generated by pip-hdl. Do not edit.",
+        "ninja_required_version = 1.3",
+        f"builddir = {_escape_value(builddir)}",
+        f"exports = {_escape_value(f'export {exports};' if exports else '')}",
+        "",
+        "rule compile",
+        "  command = $exports $cmd && touch $out",
+        "  description = COMPILE $name",
+        "",
+    ]
+
+    stamps: Dict[str, str] = {}
+    for node in nodes:
+        metainfo = node.metainfo
+        lib = f"{builddir}/{node.id}"
+        stamps[node.id] = f"{lib}.stamp"
+        upstreams = graph.ancestors([node.id])
+        libs = (
+            substitute_fields(tool.library_arg, {"name": shlex.quote(u.id), "lib": shlex.quote(f"{builddir}/{u.id}")})
+            for u in upstreams
+        )
+        cmd = substitute_fields(
+            tool.command,
+            {
+                "name": shlex.quote(node.id),
+                "filelist": shlex.quote(str(metainfo.filelist)),
+                "sources_root": shlex.quote(str(metainfo.sources_root)),
+                "lib": shlex.quote(lib),
+                "libs": " ".join(libs),
+                "filelists": " ".join(f"-f {shlex.quote(str(u.metainfo.filelist))}" for u in upstreams),
+            },
+        )
+
+        inputs = list(dict.fromkeys(str(f) for f in package_files(metainfo, parser)[1:]))
+        upstream_stamps = [stamps[u.id] for u in upstreams if u in node.upstreams]
+        build = [f"build {_escape_path(stamps[node.id])}: compile {_escape_path(str(metainfo.filelist))}"]
+        implicit = inputs + (upstream_stamps if rebuild_dependants else [])
+        if implicit:
+            build.append("| " + " ".join(_escape_path(p) for p in implicit))
+        if upstream_stamps and not rebuild_dependants:
+            build.append("|| " + " ".join(_escape_path(p) for p in upstream_stamps))
+        lines.append(" ".join(build))
+        lines.append(f"  name = {_escape_value(node.id)}")
+        lines.append(f"  cmd = {_escape_value(cmd)}")
+        lines.append(f"build {_escape_path(node.id)}: phony {_escape_path(stamps[node.id])}")
+        lines.append("")
+
+    lines.append(f"build all: phony {' '.join(_escape_path(s) for s in stamps.values())}")
+    lines.append("default all")
+    return "\n".join(lines) + "\n"
+
+
+def _escape_path(path: str) -> str:
+    """Escape path to be used within a build statement."""
+    return path.replace("$", "$$").replace(" ", "$ ").replace(":", "$:")
+
+
+def _escape_value(value: str) -> str:
+    """Escape value of a variable."""
+    return value.replace("$", "$$")
@@ -0,0 +1,107 @@
+"""Report with all inspectable attributes of packages.
+
+Attributes are resolved in a single pass through the dependency graph and can be formatted
+for different consumers: Makefile, shell script or any other tool via JSON.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shlex
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from .graph import DependencyGraph
+from .metainfo import EnvVar, PackageMetaInfo
+
+
+class InspectionReport:
+    """All inspectable attributes of requested packages and their dependencies.
+
+    Single package attributes (`filelist`, `sources_root`, `sources_var`) describe the first requested package.
+    """
+
+    VAR_PREFIX = "PIP_HDL_"
+
+    def __init__(self, requested: Sequence[PackageMetaInfo], graph: DependencyGraph) -> None:
+        """Resolve all attributes."""
+        first: Optional[PackageMetaInfo] = requested[0] if requested else None
+        self.filelist: Optional[Path] = None if first is None else first.filelist
+        self.sources_root: Optional[Path] = None if first is None else first.sources_root
+        self.sources_var: Optional[EnvVar] = None if first is None else first.sources_var
+
+        packages = [node.metainfo for node in graph.traverse(key=lambda n: n.id)]
+        self.all_filelists: List[Path] = [p.filelist for p in packages]
+        self.all_sources_roots: List[Path] = [p.sources_root for p in packages]
+        self.all_sources_vars: List[EnvVar] = [p.sources_var for p in packages]
+
+    def _as_strings(self) -> Dict[str, str]:
+        """Get attributes formatted the same way as `pip-hdl inspect` prints them."""
+        attrs: Dict[str, str] = {}
+        if self.filelist is not None:
+            attrs["filelist"] = str(self.filelist)
+        if self.sources_root is not None:
+            attrs["sources_root"] = str(self.sources_root)
+        if self.sources_var is not None:
+            attrs["sources_var"] = f"{self.sources_var.name}={self.sources_var.value}"
+        attrs["all_filelists"] = " ".join(str(f) for f in self.all_filelists)
+        attrs["all_filelists_as_args"] = " ".join(f"-f {f}" for f in self.all_filelists)
+        attrs["all_sources_roots"] = " ".join(str(r) for r in self.all_sources_roots)
+        attrs["all_sources_vars"] = " ".join(f"{v.name}={v.value}" for v in self.all_sources_vars)
+        return attrs
+
+    def as_makefile(self) -> str:
+        """Format as Makefile fragment to be included.
+
+        Environment variables for sources are exported, other attributes are available as `PIP_HDL_<ATTR>`.
+        """
+        lines = ["# Generated by pip-hdl. Do not edit."]
+        lines.extend(f"export {v.name} := {_make_escape(v.value)}" for v in self.all_sources_vars)
+        lines.extend(f"{self.VAR_PREFIX}{k.upper()} := {_make_escape(v)}" for k, v in self._as_strings().items())
+        return "\n".join(lines) + "\n"
+
+    def as_shell(self) -> str:
+        """Format as shell script to be sourced.
+
+        Environment variables for sources are exported, other attributes are available as `PIP_HDL_<ATTR>`.
+        """
+        lines = ["# Generated by pip-hdl. Do not edit."]
+        lines.extend(f"export {v.name}={shlex.quote(v.value)}" for v in self.all_sources_vars)
+        lines.extend(f"{self.VAR_PREFIX}{k.upper()}={shlex.quote(v)}" for k, v in self._as_strings().items())
+        return "\n".join(lines) + "\n"
+
+    def as_json(self) -> str:
+        """Format as JSON object with attribute names as keys."""
+        data = {
+            "filelist": None if self.filelist is None else str(self.filelist),
+            "sources_root": None if self.sources_root is None else str(self.sources_root),
+            "sources_var": None if self.sources_var is None else self.sources_var._asdict(),
+            "all_filelists": [str(f) for f in self.all_filelists],
+            "all_sources_roots": [str(r) for r in self.all_sources_roots],
+            "all_sources_vars": [v._asdict() for v in self.all_sources_vars],
+        }
+        return json.dumps(data, indent=2) + "\n"
+
+
+def _make_escape(value: str) -> str:
+    """Escape value to be used literally within Makefile."""
+    return value.replace("$", "$$").replace("#", "\\#")
+
+
+def write_if_changed(path: Path, text: str) -> bool:
+    """Write text to a file only if its content is different, so file modification time changes only when needed.
+
+    File is replaced atomically, so readers never see partially written content. Returns `True` if file was written.
+    """
+    if path.exists() and path.read_text() == text:
+        return False
+    # temporary name is unique for every writer, so concurrent writes of the same file don't interfere
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp_path.write_text(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return True
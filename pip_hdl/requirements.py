@@ -0,0 +1,165 @@
+"""Requests for inspection: package names, requirements files and lockfiles."""
+from __future__ import annotations
+
+import configparser
+import re
+from pathlib import Path
+from typing import Iterator, List, Optional, Set, Tuple
+
+from packaging.requirements import InvalidRequirement, Requirement
+
+from . import timings
+from .lockfile import Lockfile, is_lockfile
+from .metainfo import DistributionIndex, PackageMetaInfo
+
+_INCLUDE_RE = re.compile(r"^(?:-r|--requirement)(?:\s*=\s*|\s*)(\S+)$")
+_COMMENT_RE = re.compile(r"(^|\s+)#.*$")
+_OPTIONS_RE = re.compile(r"\s+--?[a-zA-Z].*$")  # per-requirement options, e.g. '--hash=...'
+_EDITABLE_RE = re.compile(r"^(?:-e|--editable)(?:\s*=\s*|\s+)(\S+)$")
+_EGG_RE = re.compile(r"[#&]egg=([\w.\-]+(?:\[[\w.,\- ]*\])?)")
+_EXTRAS_RE = re.compile(r"^(.*?)(\[[\w.,\- ]*\])?$")
+
+
+def read_requirements(path: Path) -> Iterator[Requirement]:
+    """Read requirements file line by line.
+
+    Comments, blank lines and line continuations are handled. Nested requirements files (`-r FILE`) are read
+    in place, paths are relative to the including file. Editable requirements (`-e PATH` or `-e URL#egg=NAME`)
+    are required by the project name, which is taken from `#egg=` fragment or from `pyproject.toml`
+    (or `setup.cfg`) of a local project, paths are relative to the including file as well. All other pip options
+    (`-c`, `-i`, etc.) and per-requirement options are ignored. Requirements with environment markers
+    not matching the current environment are skipped.
+
+    Raises:
+        InvalidRequirement: requirement can't be parsed or name of editable project can't be found,
+            error message has file and line number.
+    """
+    # stack of active files to avoid recursion for nested requirements
+    stack: List[Tuple[Path, Iterator[Tuple[int, str]]]] = [(path, _logical_lines(path))]
+    active: Set[Path] = {path.resolve()}
+
+    while stack:
+        current, lines = stack[-1]
+        lineno_line = next(lines, None)
+        if lineno_line is None:
+            stack.pop()
+            active.discard(current.resolve())
+            continue
+
+        lineno, line = lineno_line
+        include = _INCLUDE_RE.match(line)
+        if include:
+            nested = current.parent / include.group(1)
+            if nested.resolve() in active:
+                raise InvalidRequirement(f"{current}:{lineno}: recursive include of {nested}")
+            active.add(nested.resolve())
+            stack.append((nested, _logical_lines(nested)))
+            continue
+        editable = _EDITABLE_RE.match(line)
+        if not editable and line.startswith("-"):
+            continue
+
+        try:
+            if editable:
+                requirement = _editable_requirement(editable.group(1), current.parent)
+            else:
+                requirement = Requirement(_OPTIONS_RE.sub("", line))
+        except InvalidRequirement as e:
+            raise InvalidRequirement(f"{current}:{lineno}: {e}") from e
+        if requirement.marker is None or requirement.marker.evaluate({"extra": ""}):
+            yield requirement
+
+
+def _editable_requirement(target: str, base: Path) -> Requirement:
+    """Get requirement for an editable project, given by a local path or VCS URL, with optional extras.
+
+    Raises:
+        InvalidRequirement: name of the project can't be found.
+    """
+    egg = _EGG_RE.search(target)
+    if egg:
+        return Requirement(egg.group(1))
+
+    path, extras = _EXTRAS_RE.match(target).groups()  # type: ignore
+    project = base / path
+    name = _project_name(project) if "://" not in path else None
+    if name is None:
+        raise InvalidRequirement(f"can't find project name of editable requirement '{target}', add '#egg=NAME'")
+    return Requirement(name + (extras or ""))
+
+
+def _project_name(project: Path) -> Optional[str]:
+    """Get project name from `pyproject.toml` (PEP 621 or poetry) or `setup.cfg` of a local project."""
+    pyproject = project / "pyproject.toml"
+    if pyproject.is_file():
+        try:
+            import tomllib  # type: ignore
+        except ImportError:
+            try:
+                import tomli as tomllib  # type: ignore
+            except ImportError as e:
+                raise InvalidRequirement(f"Python 3.11+ or 'tomli' package is required to read {pyproject}") from e
+        with pyproject.open("rb") as f:
+            data = tomllib.load(f)
+        tool = data.get("tool", {})
+        name = data.get("project", {}).get("name") or tool.get("poetry", {}).get("name")
+        if name:
+            return str(name)
+
+    setup_cfg = configparser.ConfigParser()
+    setup_cfg.read(project / "setup.cfg")
+    return setup_cfg.get("metadata", "name", fallback=None)
+
+
+def _logical_lines(path: Path) -> Iterator[Tuple[int, str]]:
+    """Read non-empty lines without comments, joining continued lines. Line number of the first line is given."""
+    with path.open("r") as f:
+        start_lineno: Optional[int] = None
+        parts: List[str] = []
+        for lineno, raw_line in enumerate(f, start=1):
+            if start_lineno is None:
+                start_lineno = lineno
+            line = _COMMENT_RE.sub("", raw_line.rstrip("\n"))
+            if line.endswith("\\"):
+                parts.append(line[:-1])
+                continue
+            parts.append(line)
+            logical_line = " ".join(parts).strip()
+            if logical_line:
+                yield start_lineno, logical_line
+            start_lineno, parts = None, []
+        if parts and " ".join(parts).strip():
+            yield start_lineno or 0, " ".join(parts).strip()
+
+
+def is_requirements_file(obj: str) -> bool:
+    """Check if object for inspection is a requirements file, not a package name."""
+    return Path(obj).exists()
+
+
+def request_key(obj: str) -> str:
+    """Get string, which identifies the requested packages, e.g. to be used as cache key.
+
+    Key for a requirements file depends on all requirements read from it, including nested files.
+    Key for a lockfile is its content.
+    """
+    if is_lockfile(obj):
+        return Path(obj).read_text()
+    if is_requirements_file(obj):
+        return "\n".join(str(r) for r in read_requirements(Path(obj)))
+    return obj
+
+
+def load_packages(obj: str, index: Optional[DistributionIndex] = None) -> List[PackageMetaInfo]:
+    """Get packages from a lockfile, a requirements file or a package name.
+
+    All packages share the same distribution index, which is created if not provided.
+    Packages from a lockfile are already resolved, so no index is needed for them.
+    """
+    with timings.span("requirements.load"):
+        if is_lockfile(obj):
+            return Lockfile.read(Path(obj)).load_packages()
+        index = DistributionIndex() if index is None else index
+        if is_requirements_file(obj):
+            return [PackageMetaInfo.from_requirement(r, index) for r in read_requirements(Path(obj))]
+        return [PackageMetaInfo.from_requirement(Requirement(obj), index)]
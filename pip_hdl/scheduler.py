@@ -0,0 +1,160 @@
+"""Parallel execution of per-package tasks in dependency-aware order.
+
+Task for a package is started as soon as tasks for all its dependencies are finished,
+so independent packages (e.g. compilation of each package into its own EDA library) are processed concurrently.
+"""
+from __future__ import annotations
+
+import re
+import shlex
+import subprocess
+import sys
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, List, Mapping, Optional, TypeVar
+
+from .graph import DependencyGraph, GraphNode
+
+T = TypeVar("T")
+
+
+class GraphExecutionError(RuntimeError):
+    """Some tasks failed during graph execution."""
+
+    def __init__(self, failed: Dict[str, BaseException], skipped: List[str], results: Dict[str, object]) -> None:
+        """Init error with exceptions of failed tasks, ids of skipped nodes and results of succeeded tasks."""
+        self.failed = failed
+        self.skipped = skipped
+        self.results = results
+        super().__init__(
+            f"Tasks failed for {', '.join(failed)}" + (f"; skipped {', '.join(skipped)}" if skipped else "")
+        )
+
+
+def run_graph(
+    graph: DependencyGraph,
+    task: Callable[[GraphNode], T],
+    jobs: Optional[int] = None,
+    keep_going: bool = False,
+    executor: Optional[Executor] = None,
+) -> Dict[str, T]:
+    """Run `task(node)` for every node of the graph. Returns results of the tasks by node id.
+
+    Task for a node is submitted as soon as tasks for all its upstreams are succeeded. Nodes which are ready
+    at the same time are submitted in order of their ids.
+
+    Args:
+        graph: Graph to execute.
+        task: Callable to run for every node.
+        jobs: Maximum number of tasks to run concurrently. Used only if `executor` is not provided,
+            to create a thread pool.
+        keep_going: Continue to run tasks for other nodes if some task failed. Downstreams of failed nodes are
+            skipped anyway. Otherwise, no new tasks are submitted after the first failure.
+        executor: Executor to submit tasks to, e.g. `ProcessPoolExecutor`. Task and nodes have to be picklable
+            in case of process pool.
+
+    Raises:
+        GraphExecutionError: some tasks failed.
+        CircularDependencyError: graph has a cycle, no tasks are started.
+    """
+    waiting: Dict[GraphNode, int] = {node: len(node.upstreams) for node in graph.nodes.values()}
+    ready: Deque[GraphNode] = deque(graph.levels()[0] if graph.nodes else [])  # levels() checks for cycles as well
+    running: Dict[Future[T], GraphNode] = {}
+    results: Dict[str, T] = {}
+    failed: Dict[str, BaseException] = {}
+
+    pool = ThreadPoolExecutor(max_workers=jobs) if executor is None else executor
+    try:
+        while ready or running:
+            while ready and (keep_going or not failed):
+                node = ready.popleft()
+                running[pool.submit(task, node)] = node
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=lambda f: running[f].id):
+                node = running.pop(future)
+                if future.cancelled():
+                    continue
+                exc = future.exception()
+                if exc is not None:
+                    failed[node.id] = exc
+                    if not keep_going:
+                        # drop tasks which are submitted but not started yet
+                        for pending in running:
+                            pending.cancel()
+                    continue
+                results[node.id] = future.result()
+                for downstream in sorted(node.downstreams, key=lambda n: n.id):
+                    waiting[downstream] -= 1
+                    if waiting[downstream] == 0:
+                        ready.append(downstream)
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+    if failed:
+        skipped = sorted(n.id for n in graph.nodes.values() if n.id not in results and n.id not in failed)
+        raise GraphExecutionError(failed, skipped, dict(results))
+    return results
+
+
+def substitute_fields(template: str, fields: Mapping[str, str]) -> str:
+    """Replace `{field}` of every known field in the template with its value.
+
+    Unlike `str.format()`, any other braces are kept as is, so shell `${VAR}` (even if `VAR` is a name
+    of a field) or awk `{print $1}` need no escaping.
+    """
+    pattern = re.compile(r"(?<!\$)\{(" + "|".join(re.escape(f) for f in fields) + r")\}")
+    return pattern.sub(lambda m: fields[m.group(1)], template)
+
+
+class CommandTask:
+    """Shell command to run for a package.
+
+    Command is a template, where `{name}`, `{filelist}`, `{sources_root}` and `{sources_var}` (name of
+    environment variable) fields are replaced with values of a package. Values are quoted for shell.
+    Other braces are kept as is (see `substitute_fields()`).
+    Output of the command is printed at once, when command is finished, so outputs of concurrent commands
+    are not interleaved.
+    """
+
+    _print_lock = threading.Lock()
+
+    def __init__(self, template: str, env: Optional[Mapping[str, str]] = None) -> None:
+        """Init task with a command template and an environment to run it with."""
+        self.template = template
+        self.env = None if env is None else dict(env)
+
+    def format(self, node: GraphNode) -> str:
+        """Get command for a node."""
+        metainfo = node.metainfo
+        return substitute_fields(
+            self.template,
+            {
+                "name": shlex.quote(metainfo.name),
+                "filelist": shlex.quote(str(metainfo.filelist)),
+                "sources_root": shlex.quote(str(metainfo.sources_root)),
+                "sources_var": shlex.quote(metainfo.sources_var.name),
+            },
+        )
+
+    def __call__(self, node: GraphNode) -> str:
+        """Run command for a node. Returns its output.
+
+        Raises:
+            subprocess.CalledProcessError: command exited with non-zero code.
+        """
+        cmd = self.format(node)
+        result = subprocess.run(
+            cmd, shell=True, env=self.env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        with self._print_lock:
+            print(f"[{node.id}] {cmd}\n{result.stdout}", end="", flush=True)
+            if result.returncode != 0:
+                print(f"[{node.id}] exited with code {result.returncode}", file=sys.stderr, flush=True)
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, cmd, output=result.stdout)
+        return result.stdout
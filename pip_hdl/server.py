@@ -0,0 +1,162 @@
+"""Long-lived resolver daemon to answer inspect queries.
+
+Daemon keeps resolved packages in memory and answers queries over a local Unix socket,
+so clients don't pay for metadata lookups and imports on every call.
+State is dropped as soon as any distribution is installed or uninstalled.
+
+Protocol is a single line of JSON request and a single line of JSON response per connection.
+Response has either `text` field with the result, or `error` field with the description of a failure.
+
+Socket is created within a private directory of the current user, and clients connect only to a socket
+owned by the current user. Every request has `env` field with the client environment, and daemon rejects
+requests from other environments, as they may resolve packages differently.
+"""
+from __future__ import annotations
+
+import hashlib
+import importlib
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .cache import ResolutionCache
+from .graph import DependencyGraph
+from .metainfo import DistributionIndex, PackageMetaInfo
+from .requirements import load_packages, request_key
+
+SOCKET_ENV_VAR = "PIP_HDL_SOCKET"
+
+
+def default_socket_path() -> Path:
+    """Socket path for the current interpreter, so every virtual environment has its own daemon.
+
+    Can be overridden with environment variable. Otherwise, private directory of the current user is created for it.
+
+    Raises:
+        PermissionError: directory for sockets is not private, e.g. it was created by another user.
+    """
+    if SOCKET_ENV_VAR in os.environ:
+        return Path(os.environ[SOCKET_ENV_VAR])
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR", tempfile.gettempdir())
+    env_id = hashlib.sha256(sys.prefix.encode()).hexdigest()[:12]
+    return _private_dir(Path(runtime_dir) / f"pip-hdl-{_user_id()}") / f"{env_id}.sock"
+
+
+def environment_id() -> str:
+    """Identifier of the current Python environment: interpreter and import paths define how packages are resolved."""
+    return hashlib.sha256(json.dumps([sys.executable, sys.path]).encode()).hexdigest()
+
+
+def _user_id() -> int:
+    """Get identifier of the current user."""
+    return os.getuid() if hasattr(os, "getuid") else 0
+
+
+def _private_dir(path: Path) -> Path:
+    """Create directory accessible only by the current user, or check that the existing one is such.
+
+    Raises:
+        PermissionError: directory is not private.
+    """
+    path.mkdir(mode=0o700, exist_ok=True)
+    st = path.lstat()
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != _user_id() or st.st_mode & 0o077:
+        raise PermissionError(f"Directory {path} has to be owned by the current user and have 0700 mode")
+    return path
+
+
+class WarmResolver:
+    """Resolver, which keeps resolved packages until the environment is changed."""
+
+    def __init__(self) -> None:
+        """Init resolver."""
+        self._fingerprint: Optional[str] = None
+        self._index: Optional[DistributionIndex] = None
+        self._resolved: Dict[Tuple[str, str], Tuple[List[PackageMetaInfo], DependencyGraph]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, obj: str) -> Tuple[List[PackageMetaInfo], DependencyGraph]:
+        """Get requested packages and dependency graph for them."""
+        fingerprint = ResolutionCache.environment_fingerprint()
+        if fingerprint != self._fingerprint:
+            self._resolved.clear()
+            importlib.invalidate_caches()
+            self._index = DistributionIndex()
+            self._fingerprint = fingerprint
+
+        key = (obj, request_key(obj))
+        if key in self._resolved:
+            self.hits += 1
+        else:
+            self.misses += 1
+            packages = load_packages(obj, self._index)
+            self._resolved[key] = (packages, DependencyGraph(packages))
+        return self._resolved[key]
+
+
+class ResolverServer(socketserver.UnixStreamServer):
+    """Unix socket server to answer queries one by one."""
+
+    def __init__(self, socket_path: Path, handler: Callable[[Dict[str, Any]], str]) -> None:
+        """Init server, which passes every request to a handler and responds with its result."""
+        if socket_path.exists():
+            if query(socket_path, {"ping": True}) is not None:
+                raise RuntimeError(f"Another daemon is already running at {socket_path}")
+            socket_path.unlink()  # stale socket of a killed daemon
+        self.socket_path = socket_path
+        self.handler = handler
+        self.environment = environment_id()
+        super().__init__(str(socket_path), _RequestHandler)
+        os.chmod(socket_path, 0o600)
+
+    def server_close(self) -> None:
+        """Close server and remove socket file."""
+        super().server_close()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Handler of a single connection."""
+
+    server: ResolverServer
+
+    def handle(self) -> None:
+        """Read request, handle it and write response."""
+        try:
+            request = json.loads(self.rfile.readline())
+            if request.get("env") != self.server.environment:
+                raise ValueError("Request is sent from another Python environment")
+            response = {"text": "pong"} if request.get("ping") else {"text": self.server.handler(request)}
+        except Exception as e:  # any failure is reported to a client
+            response = {"error": f"{type(e).__name__}: {e}"}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+def query(socket_path: Path, request: Dict[str, Any], timeout: float = 60.0) -> Optional[Dict[str, Any]]:
+    """Send request to a daemon. Returns `None` if no daemon is running, or its socket is not owned by the current user.
+
+    Environment of the current interpreter is added to the request, so the daemon can reject it.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    try:
+        st = socket_path.stat()
+        if not stat.S_ISSOCK(st.st_mode) or st.st_uid != _user_id():
+            return None
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(socket_path))
+            sock.sendall(json.dumps({**request, "env": environment_id()}).encode() + b"\n")
+            with sock.makefile("rb") as f:
+                return json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,409 @@
+"""Index of HDL design units declared and referenced by sources of every package.
+
+Sources referenced by filelists are lexed for declarations of modules, interfaces, packages and classes
+(entities and packages for VHDL) and for references to such units: instantiations, imports, class
+specializations, etc. Lexing is a lightweight token scan, not a full parse, so references are
+over-approximated: a reference only matters if some package declares a unit with that name.
+
+The index answers two questions:
+    - which units are declared by more than one package (and so clash at compile time)
+    - which packages are actually needed to compile a top module
+
+Packages are the unit of pruning, because their filelists are compiled as a whole. So once a package is needed,
+references from all its sources are followed, which keeps the pruned set compilable.
+
+Lexing is CPU bound, so stale files are lexed in parallel processes. Results are cached per package
+on disk, and a file is lexed again only if its modification time or size is changed.
+"""
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple
+
+from . import timings
+from .filelist import FilelistParser
+from .graph import DependencyGraph, GraphNode
+from .manifest import package_files
+from .report import write_if_changed
+
+
+class SymbolKind(str, Enum):
+    """Kind of a design unit."""
+
+    MODULE = "module"  # as well as program and VHDL entity
+    INTERFACE = "interface"
+    PACKAGE = "package"
+    CLASS = "class"
+
+
+class Symbol(NamedTuple):
+    """Declaration of a design unit."""
+
+    kind: SymbolKind
+    name: str
+    path: str
+    line: int
+
+    def __str__(self) -> str:
+        """Format as `kind name (path:line)`."""
+        return f"{self.kind.value} {self.name} ({self.path}:{self.line})"
+
+
+class FileSymbols(NamedTuple):
+    """Declarations and references found within a single file."""
+
+    definitions: List[Symbol]
+    references: List[str]
+
+
+class Duplicate(NamedTuple):
+    """Design unit declared by more than one package."""
+
+    name: str
+    definitions: List[Tuple[str, Symbol]]  # pairs of package and declaration
+
+    def __str__(self) -> str:
+        """Format as a single line."""
+        return f"{self.name}: " + ", ".join(f"{package} {symbol}" for package, symbol in self.definitions)
+
+
+SV_SUFFIXES = frozenset({".sv", ".svh", ".svi", ".svp", ".v", ".vh", ".vp"})
+VHDL_SUFFIXES = frozenset({".vhd", ".vhdl"})
+_HDL_SUFFIXES = SV_SUFFIXES | VHDL_SUFFIXES
+
+# attributes `(* keep *)` are skipped as comments, but not the event control `@(*)`; an attribute never spans
+# a statement end, so an unterminated one doesn't blank (and scan) the rest of the file
+_SV_COMMENTS_RE = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\(\*(?!\s*\))[^;]*?\*\)', re.DOTALL)
+_SV_TOKEN_RE = re.compile(r"[A-Za-z_][\w$]*|::|\S")
+_SV_DEFINITIONS = {
+    "module": SymbolKind.MODULE,
+    "macromodule": SymbolKind.MODULE,
+    "program": SymbolKind.MODULE,
+    "interface": SymbolKind.INTERFACE,
+    "package": SymbolKind.PACKAGE,
+    "class": SymbolKind.CLASS,
+}
+# keywords, which are never names of user design units, but may appear in positions of references
+_SV_KEYWORDS = frozenset(
+    """
+    alias always always_comb always_ff always_latch and assert assign assume automatic before begin bind bins
+    binsof bit break buf bufif0 bufif1 byte case casex casez cell chandle checker class clocking cmos config
+    const constraint context continue cover covergroup coverpoint cross deassign default defparam design disable
+    dist do edge else end endcase endchecker endclass endclocking endconfig endfunction endgenerate endgroup
+    endinterface endmodule endpackage endprimitive endprogram endproperty endspecify endsequence endtable endtask
+    enum event eventually expect export extends extern final first_match for force foreach forever fork forkjoin
+    function generate genvar global highz0 highz1 if iff ifnone ignore_bins illegal_bins implements implies import
+    incdir include initial inout input inside instance int integer interconnect interface intersect join join_any
+    join_none large let liblist library local localparam logic longint macromodule matches medium modport module
+    nand negedge nettype new nexttime nmos nor noshowcancelled not notif0 notif1 null or output package packed
+    parameter pmos posedge primitive priority program property protected pull0 pull1 pulldown pullup
+    pulsestyle_ondetect pulsestyle_onevent pure rand randc randcase randsequence rcmos real realtime ref reg
+    reject_on release repeat restrict return rnmos rpmos rtran rtranif0 rtranif1 s_always s_eventually s_nexttime
+    s_until s_until_with scalared sequence shortint shortreal showcancelled signed small soft solve specify
+    specparam static string strong strong0 strong1 struct super supply0 supply1 sync_accept_on sync_reject_on
+    table tagged task this throughout time timeprecision timeunit tran tranif0 tranif1 tri tri0 tri1 triand trior
+    trireg type typedef union unique unique0 unsigned until until_with untyped use uwire var vectored virtual void
+    wait wait_order wand weak weak0 weak1 while wildcard wire with within wor xnor xor
+    """.split()
+)
+# a name is referenced, if it goes after one of these keywords
+_SV_REFERENCE_AFTER = frozenset({"extends", "implements", "bind", "import", "export", "virtual"})
+# a name followed by an identifier is referenced, if the identifier is followed by one of these tokens,
+# e.g. module instance `fifo u_fifo (...)` or class handle `my_item item;`
+_SV_INSTANCE_END = frozenset({"(", ";", ",", "=", "["})
+
+_VHDL_COMMENTS_RE = re.compile(r'--[^\n]*|/\*.*?\*/|"[^"\n]*"', re.DOTALL)
+_VHDL_TOKEN_RE = re.compile(r"[A-Za-z][\w]*|\S")
+_VHDL_STANDARD_LIBRARIES = frozenset({"ieee", "std"})
+
+
+def lex_sv(text: str, path: str) -> FileSymbols:
+    """Find declarations and references within SystemVerilog (or Verilog) source."""
+    text = _SV_COMMENTS_RE.sub(_blank, text)
+    tokens, lines = _tokenize(_SV_TOKEN_RE, text)
+    definitions: List[Symbol] = []
+    references: Set[str] = set()
+
+    def at(i: int) -> str:
+        return tokens[i] if 0 <= i < len(tokens) else ""
+
+    def is_name(i: int) -> bool:
+        return _is_identifier(at(i)) and at(i) not in _SV_KEYWORDS
+
+    for i, token in enumerate(tokens):
+        prev = at(i - 1)
+        if token in _SV_DEFINITIONS:
+            if prev in ("typedef", "extern") or (token == "interface" and (prev == "virtual" or at(i + 1) == "class")):
+                continue  # forward declaration, virtual interface type, or `interface class` declared as a class
+            j = i + 1
+            while at(j) in ("automatic", "static"):
+                j += 1
+            if is_name(j):
+                definitions.append(Symbol(_SV_DEFINITIONS[token], tokens[j], path, lines[j]))
+        elif not is_name(i) or prev in ("`", ".", "$"):
+            continue  # macros, hierarchical names and port connections, system tasks
+        elif prev in _SV_REFERENCE_AFTER or at(i + 1) in ("::", "#"):
+            references.add(token)
+        elif is_name(i + 1) and at(i + 2) in _SV_INSTANCE_END:
+            references.add(token)
+
+    return FileSymbols(definitions, sorted(references - {d.name for d in definitions}))
+
+
+def lex_vhdl(text: str, path: str) -> FileSymbols:
+    """Find declarations and references within VHDL source. Names are case-insensitive, so they are lowercased."""
+    text = _VHDL_COMMENTS_RE.sub(_blank, text).lower()
+    tokens, lines = _tokenize(_VHDL_TOKEN_RE, text)
+    definitions: List[Symbol] = []
+    references: Set[str] = set()
+
+    def at(i: int) -> str:
+        return tokens[i] if 0 <= i < len(tokens) else ""
+
+    for i, token in enumerate(tokens):
+        if token in ("entity", "package") and _is_identifier(at(i + 1)) and at(i + 1) != "body" and at(i + 2) == "is":
+            kind = SymbolKind.MODULE if token == "entity" else SymbolKind.PACKAGE
+            definitions.append(Symbol(kind, at(i + 1), path, lines[i + 1]))
+        elif token in ("entity", "use") and at(i + 2) == "." and at(i + 1) not in _VHDL_STANDARD_LIBRARIES:
+            references.add(at(i + 3))  # `entity work.unit` instance or `use work.unit.all` clause
+        elif token in ("component", "of") and _is_identifier(at(i + 1)):
+            references.add(at(i + 1))  # component declaration or architecture of an entity
+        elif token == ":" and _is_identifier(at(i + 1)) and at(i + 2) in ("port", "generic"):
+            references.add(at(i + 1))  # component instance
+
+    references.discard("")
+    return FileSymbols(definitions, sorted(references - {d.name for d in definitions}))
+
+
+def lex_file(path: str) -> Optional[FileSymbols]:
+    """Find declarations and references within HDL source. `None` is returned for unknown file types."""
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in SV_SUFFIXES:
+        lexer = lex_sv
+    elif suffix in VHDL_SUFFIXES:
+        lexer = lex_vhdl
+    else:
+        return None
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return lexer(f.read(), path)
+
+
+def _blank(match: re.Match) -> str:
+    """Replace comment or string with spaces, but keep line breaks, so line numbers are preserved."""
+    return re.sub(r"[^\n]", " ", match.group(0))
+
+
+def _tokenize(token_re: re.Pattern, text: str) -> Tuple[List[str], List[int]]:
+    """Split text into tokens, and get line number of every token."""
+    newlines = [i for i, c in enumerate(text) if c == "\n"]
+    tokens: List[str] = []
+    lines: List[int] = []
+    for match in token_re.finditer(text):
+        tokens.append(match.group(0))
+        lines.append(bisect.bisect_right(newlines, match.start()) + 1)
+    return tokens, lines
+
+
+def _is_identifier(token: str) -> bool:
+    """Check if token is an identifier."""
+    return bool(token) and (token[0].isalpha() or token[0] == "_")
+
+
+class _FileEntry(NamedTuple):
+    """Cached symbols of a file."""
+
+    mtime_ns: int
+    size: int
+    symbols: FileSymbols
+
+
+class SymbolIndex:
+    """Declarations and references of all packages in a graph."""
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, packages: Mapping[str, Sequence[FileSymbols]]) -> None:
+        """Init index with symbols of every file of every package."""
+        self.packages: Dict[str, List[FileSymbols]] = {name: list(files) for name, files in packages.items()}
+        self._definers: Dict[str, List[Tuple[str, Symbol]]] = {}
+        for package, files in self.packages.items():
+            for file in files:
+                for symbol in file.definitions:
+                    self._definers.setdefault(symbol.name, []).append((package, symbol))
+        self.lexed = 0  # number of files lexed while building, the rest were cached
+
+    @classmethod
+    def build(
+        cls,
+        graph: DependencyGraph,
+        env: Optional[Mapping[str, str]] = None,
+        jobs: Optional[int] = None,
+        cache_dir: Optional[Path] = None,
+    ) -> SymbolIndex:
+        """Build index for all sources referenced by filelists of packages in the graph.
+
+        Args:
+            graph: Graph with packages to index.
+            env: Environment variables to substitute within filelists, along with variables for sources of
+                all packages. Process environment is used if not provided.
+            jobs: Number of processes to lex files in parallel. Number of CPUs by default.
+            cache_dir: Directory to store lexed symbols of every package between runs. Nothing is cached if
+                not provided.
+        """
+        nodes = list(graph.traverse(key=lambda n: n.id))
+        full_env = dict(os.environ if env is None else env)
+        full_env.update(n.metainfo.sources_var for n in nodes)
+        parser = FilelistParser(full_env)
+
+        with timings.span("symbols.stat"):
+            files_by_package: Dict[str, List[str]] = {}
+            cached: Dict[str, Dict[str, _FileEntry]] = {}
+            stamps: Dict[str, Tuple[int, int]] = {}
+            for node in nodes:
+                files = [str(f) for f in dict.fromkeys(package_files(node.metainfo, parser)[1:])]
+                files_by_package[node.id] = [f for f in files if os.path.splitext(f)[1].lower() in _HDL_SUFFIXES]
+                cached[node.id] = cls._load(cache_dir, node) if cache_dir is not None else {}
+                for file in files_by_package[node.id]:
+                    try:
+                        stat = os.stat(file)
+                    except OSError:
+                        continue  # missing sources are reported by `check`
+                    stamps[file] = (stat.st_mtime_ns, stat.st_size)
+
+        # the same file may be referenced by several packages, it is lexed only once
+        symbols: Dict[str, FileSymbols] = {}
+        for entries in cached.values():
+            for file, entry in entries.items():
+                if stamps.get(file) == (entry.mtime_ns, entry.size):
+                    symbols[file] = entry.symbols
+        stale = sorted(set(stamps) - set(symbols))
+        with timings.span("symbols.lex"):
+            symbols.update(zip(stale, _lex_all(stale, jobs)))
+
+        index = cls({p: [symbols[f] for f in files if f in symbols] for p, files in files_by_package.items()})
+        index.lexed = len(stale)
+        if cache_dir is not None:
+            for node in nodes:
+                entries = {f: _FileEntry(*stamps[f], symbols[f]) for f in files_by_package[node.id] if f in symbols}
+                cls._store(cache_dir, node, entries)
+        return index
+
+    def definers(self, name: str) -> List[Tuple[str, Symbol]]:
+        """Get packages which declare the unit, and the declarations."""
+        return list(self._definers.get(name, []))
+
+    def duplicates(self) -> List[Duplicate]:
+        """Get modules, interfaces and packages declared by more than one package.
+
+        Classes are not reported, as they are usually declared within packages, so the same name in different
+        packages doesn't clash.
+        """
+        duplicates: List[Duplicate] = []
+        for name, definitions in sorted(self._definers.items()):
+            for kinds in ({SymbolKind.MODULE, SymbolKind.INTERFACE}, {SymbolKind.PACKAGE}):
+                clashing = [(p, s) for p, s in definitions if s.kind in kinds]
+                if len({p for p, _ in clashing}) > 1:
+                    duplicates.append(Duplicate(name, clashing))
+        return duplicates
+
+    def required(self, graph: DependencyGraph, tops: Iterable[str]) -> List[GraphNode]:
+        """Get packages needed to compile top modules in dependency-aware order.
+
+        Package with a top module is needed, and so is every package declaring any unit referenced from sources
+        of a needed package. If a unit is declared by several packages, the referencing package itself and
+        its dependencies are preferred.
+
+        Raises:
+            KeyError: top module is not declared by any package.
+        """
+        needed: Set[str] = set()
+        planned: List[str] = []
+        for top in tops:
+            definers = self._definers.get(top, [])
+            if not definers:
+                raise KeyError(f"Top module '{top}' is not declared by any package")
+            planned.extend(p for p, _ in definers)
+
+        while planned:
+            package = planned.pop()
+            if package in needed:
+                continue
+            needed.add(package)
+            preferred = {n.id for n in graph.ancestors([package], inclusive=True)}
+            references: FrozenSet[str] = frozenset(r for f in self.packages.get(package, []) for r in f.references)
+            for reference in references:
+                candidates = {p for p, _ in self._definers.get(reference, [])}
+                planned.extend(candidates & preferred or candidates)
+
+        return [n for n in graph.traverse(key=lambda n: n.id) if n.id in needed]
+
+    @classmethod
+    def _cache_path(cls, cache_dir: Path, node: GraphNode) -> Path:
+        """Get path to cached symbols of the package."""
+        key = hashlib.sha256(f"{node.id}\0{node.metainfo.filelist}".encode()).hexdigest()[:16]
+        return cache_dir / f"{key}.json"
+
+    @classmethod
+    def _load(cls, cache_dir: Path, node: GraphNode) -> Dict[str, _FileEntry]:
+        """Load cached symbols of package files. Missing or corrupted cache is just ignored."""
+        try:
+            with cls._cache_path(cache_dir, node).open("r") as f:
+                data = json.load(f)
+            if data["version"] != cls.FORMAT_VERSION:
+                return {}
+            return {
+                file: _FileEntry(
+                    mtime_ns,
+                    size,
+                    FileSymbols([Symbol(SymbolKind(k), n, file, line) for k, n, line in definitions], references),
+                )
+                for file, (mtime_ns, size, definitions, references) in data["files"].items()
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    @classmethod
+    def _store(cls, cache_dir: Path, node: GraphNode, entries: Dict[str, _FileEntry]) -> None:
+        """Store symbols of package files. Cache is only an optimization, so failures to write are ignored."""
+        data = {
+            "version": cls.FORMAT_VERSION,
+            "package": node.id,
+            "files": {
+                file: [
+                    e.mtime_ns,
+                    e.size,
+                    [[s.kind.value, s.name, s.line] for s in e.symbols.definitions],
+                    e.symbols.references,
+                ]
+                for file, e in entries.items()
+            },
+        }
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            write_if_changed(cls._cache_path(cache_dir, node), json.dumps(data, sort_keys=True))
+        except OSError:
+            pass
+
+
+def _lex_all(files: Sequence[str], jobs: Optional[int]) -> List[FileSymbols]:
+    """Lex files in parallel processes. Files, which can't be read, have no symbols."""
+    workers = min(jobs or os.cpu_count() or 1, len(files))
+    if workers <= 1:
+        return [_lex_safe(f) for f in files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_lex_safe, files, chunksize=max(1, len(files) // (workers * 4))))
+
+
+def _lex_safe(path: str) -> FileSymbols:
+    """Lex file, file which can't be read has no symbols."""
+    try:
+        return lex_file(path) or FileSymbols([], [])
+    except OSError:
+        return FileSymbols([], [])
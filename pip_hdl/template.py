@@ -1,10 +1,13 @@
 """Templating utilities."""
 
+import json
 import shutil
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Mapping, Optional, Sequence
 
+from .report import write_if_changed
 from .version import __version__
 
 
@@ -16,6 +19,11 @@ class TemplateConfig:
     package_description: str
     author_name: str
     is_private_package: bool
+    dependencies: Dict[str, str] = field(default_factory=dict)  # distribution name -> poetry version constraint
+
+
+class SpecError(ValueError):
+    """Spec with package configurations is invalid."""
 
 
 def ask_user_for_string(question: str, default_answer: Optional[str] = None) -> str:
@@ -68,69 +76,168 @@ def template_package_example(outdir: Path, cfg: TemplateConfig) -> None:
     package_root.mkdir()
     print(package_root)
 
-    print(_create_init_py(package_root, cfg))
-    print(_create_pkg_sv(package_root, cfg))
-    print(_create_filelist_f(package_root, cfg))
-    print(_create_pyproject_toml(project_root, cfg))
+    for rel_path, text in render_package(cfg).items():
+        file = project_root / rel_path
+        file.write_text(text)
+        print(file)
+
+
+def render_package(cfg: TemplateConfig) -> Dict[str, str]:
+    """Render all files of the example project. Returns file content by path relative to the project root."""
+    return {
+        f"{cfg.package_name}/__init__.py": _init_py_text(cfg),
+        f"{cfg.package_name}/{cfg.package_name}_pkg.sv": _pkg_sv_text(cfg),
+        f"{cfg.package_name}/filelist.f": _filelist_f_text(cfg),
+        "pyproject.toml": _pyproject_toml_text(cfg),
+    }
+
 
+def write_package(outdir: Path, cfg: TemplateConfig) -> List[Path]:
+    """Create project of the package or update it in place.
 
-def _create_init_py(outdir: Path, cfg: TemplateConfig) -> Path:
+    Unlike `template_package_example()`, existing project is not removed: only files with different content
+    are rewritten (atomically), and any other files within the project are kept. Returns written files.
+    """
+    project_root = outdir / cfg.package_name
+    written = []
+    for rel_path, text in render_package(cfg).items():
+        file = project_root / rel_path
+        file.parent.mkdir(parents=True, exist_ok=True)
+        if write_if_changed(file, text):
+            written.append(file)
+    return written
+
+
+def template_packages(
+    outdir: Path, configs: Sequence[TemplateConfig], jobs: Optional[int] = None
+) -> Dict[str, List[Path]]:
+    """Create or update projects of many packages in parallel. Returns written files by package name."""
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(lambda cfg: write_package(outdir, cfg), configs)
+        return {cfg.package_name: written for cfg, written in zip(configs, results)}
+
+
+def load_spec(path: Path) -> List[TemplateConfig]:
+    """Load configurations of packages from JSON or TOML spec.
+
+    Spec has a list of `packages`, where every item has the same fields as `TemplateConfig`,
+    and optional `defaults` with values of fields, which are the same for most of packages.
+    `dependencies` are either a list of names or a table of names and version constraints, e.g.:
+
+        [defaults]
+        author_name = "John Doe <johndoe@mail.com>"
+        is_private_package = true
+
+        [[packages]]
+        package_name = "my_ip"
+        dependencies = {my-lib = "^1.2"}
+
+    Raises:
+        SpecError: spec can't be read or is invalid.
+    """
+    if path.suffix == ".toml":
+        try:
+            import tomllib  # type: ignore
+        except ImportError:
+            try:
+                import tomli as tomllib  # type: ignore
+            except ImportError as e:
+                raise SpecError(f"{path}: Python 3.11+ or 'tomli' package is required for TOML specs") from e
+    try:
+        if path.suffix == ".toml":
+            with path.open("rb") as fb:
+                data = tomllib.load(fb)
+        else:
+            with path.open("r") as f:
+                data = json.load(f)
+    except (OSError, ValueError) as e:  # decode errors of both formats are subclasses of ValueError
+        raise SpecError(f"{path}: {e}") from e
+
+    if not isinstance(data, dict) or not isinstance(data.get("packages"), list):
+        raise SpecError(f"{path}: list of 'packages' is expected")
+    defaults = data.get("defaults", {})
+    if not isinstance(defaults, dict) or not all(isinstance(pkg, dict) for pkg in data["packages"]):
+        raise SpecError(f"{path}: 'defaults' and every item of 'packages' are expected to be tables")
+    configs = [_parse_config({**defaults, **pkg}, path) for pkg in data["packages"]]
+
+    names = [cfg.package_name for cfg in configs]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise SpecError(f"{path}: packages are defined more than once: {', '.join(duplicates)}")
+    return configs
+
+
+def _parse_config(values: Mapping[str, Any], path: Path) -> TemplateConfig:
+    """Create configuration of a single package from spec values."""
+    known = {f.name for f in fields(TemplateConfig)}
+    unknown = sorted(set(values) - known)
+    if unknown:
+        raise SpecError(f"{path}: unknown fields {', '.join(unknown)}")
+    cfg = {"package_description": "", "is_private_package": False, **values}
+    missing = sorted(known - set(cfg) - {"dependencies"})
+    if missing:
+        raise SpecError(f"{path}: fields {', '.join(missing)} are required for package {dict(values)}")
+    # name is used as a directory and inserted into sources, so it has to be a valid Python identifier
+    name = cfg["package_name"]
+    if not isinstance(name, str) or not name.isidentifier():
+        raise SpecError(f"{path}: package name {name!r} is not a valid Python identifier")
+
+    dependencies = cfg.get("dependencies", {})
+    if isinstance(dependencies, list):
+        dependencies = {name: "*" for name in dependencies}
+    if not isinstance(dependencies, dict):
+        raise SpecError(f"{path}: dependencies of '{cfg['package_name']}' are expected as list or table")
+    cfg["dependencies"] = {name.replace("_", "-"): str(version) for name, version in dependencies.items()}
+    return TemplateConfig(**cfg)
+
+
+def _init_py_text(cfg: TemplateConfig) -> str:
     """Create __init__.py for the example project."""
-    init_py_file = outdir / "__init__.py"
-    init_py_text = f'''"""{cfg.package_name}."""
+    return f'''"""{cfg.package_name}."""
 from pip_hdl import PackageMetaInfo
 
 metainfo = PackageMetaInfo("{cfg.package_name}")
 '''
-    with init_py_file.open("w") as f:
-        f.write(init_py_text)
-    return init_py_file
 
 
-def _create_pkg_sv(outdir: Path, cfg: TemplateConfig) -> Path:
+def _pkg_sv_text(cfg: TemplateConfig) -> str:
     """Create SV package for the example project."""
-    pkg_sv_file = outdir / f"{cfg.package_name}_pkg.sv"
-    pkg_sv_text = f"""package {cfg.package_name}_pkg;
+    return f"""package {cfg.package_name}_pkg;
 endpackage
 """
-    with pkg_sv_file.open("w") as f:
-        f.write(pkg_sv_text)
-    return pkg_sv_file
 
 
-def _create_filelist_f(outdir: Path, cfg: TemplateConfig) -> Path:
+def _filelist_f_text(cfg: TemplateConfig) -> str:
     """Create filelist.f for the example project."""
-    filelist_f_file = outdir / "filelist.f"
-    filelist_f_text = f"""${{{cfg.package_name.upper()}_SOURCES_ROOT}}/{cfg.package_name}_pkg.sv
+    return f"""${{{cfg.package_name.upper()}_SOURCES_ROOT}}/{cfg.package_name}_pkg.sv
 """
 
-    with filelist_f_file.open("w") as f:
-        f.write(filelist_f_text)
-    return filelist_f_file
-
 
-def _create_pyproject_toml(outdir: Path, cfg: TemplateConfig) -> Path:
+def _pyproject_toml_text(cfg: TemplateConfig) -> str:
     """Create pyproject.toml for the example project."""
     private_classifier = """classifiers = [
     "Private :: Do not Upload", # Prevent uploading to PyPI
 ]
 """
-    pyproject_toml_file = outdir / "pyproject.toml"
-    pyproject_toml_text = f"""[tool.poetry]
+    # JSON strings are valid TOML basic strings, so values given by user are quoted and escaped this way
+    dependencies = "".join(
+        f"{json.dumps(name)} = {json.dumps(version)}\n" for name, version in cfg.dependencies.items()
+    )
+    return f"""[tool.poetry]
 name = "{cfg.package_name.replace("_", "-")}"
 version = "0.1.0"
-description = "{cfg.package_description}"
-authors = ["{cfg.author_name}"]
+description = {json.dumps(cfg.package_description)}
+authors = [{json.dumps(cfg.author_name)}]
 {private_classifier if cfg.is_private_package else ''}
 
 [tool.poetry.dependencies]
 python = "^3.8"
 pip_hdl = "^{__version__}"
+{dependencies}
+[tool.poetry.plugins."pip_hdl"]  # Allow to discover package without importing it
+"{cfg.package_name}" = "{cfg.package_name}"
 
 [build-system]
 requires = ["poetry-core"]
 build-backend = "poetry.core.masonry.api"
 """
-    with pyproject_toml_file.open("w") as f:
-        f.write(pyproject_toml_text)
-    return pyproject_toml_file
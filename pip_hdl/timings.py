@@ -0,0 +1,131 @@
+"""Lightweight timing instrumentation.
+
+Code is instrumented with spans, which measure phases (e.g. graph building) and per-package steps
+(e.g. metadata lookup of a single package):
+
+    with timings.span("metainfo.filelist", package=name):
+        ...
+
+Recording is disabled by default, and `span()` returns a shared no-op context manager then, so instrumentation
+costs a single function call. Recorded spans can be summarized as text or exported as Chrome trace events JSON
+to be opened with `chrome://tracing` or https://ui.perfetto.dev.
+"""
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List, NamedTuple, Optional
+
+ENV_VAR = "PIP_HDL_TIMINGS"
+TRACE_ENV_VAR = "PIP_HDL_TRACE"
+
+
+class Span(NamedTuple):
+    """Single measured interval."""
+
+    name: str
+    start_ns: int
+    duration_ns: int
+    thread_id: int
+    args: Dict[str, Any]
+
+
+class Recorder:
+    """Storage of measured spans."""
+
+    def __init__(self) -> None:
+        """Init empty recorder."""
+        self.spans: List[Span] = []
+        self.origin_ns = time.perf_counter_ns()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[None]:
+        """Measure the enclosed block."""
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            # list append is atomic, so spans from different threads can be recorded without a lock
+            self.spans.append(Span(name, start_ns, time.perf_counter_ns() - start_ns, threading.get_ident(), args))
+
+    def summary(self, top: int = 5) -> str:
+        """Summarize spans by name: number of calls, total and maximum time, and the slowest packages."""
+        by_name: Dict[str, List[Span]] = {}
+        for s in self.spans:
+            by_name.setdefault(s.name, []).append(s)
+
+        lines = [f"{'span':32}{'calls':>8}{'total, ms':>12}{'max, ms':>12}"]
+        for name, spans in sorted(by_name.items(), key=lambda item: -sum(s.duration_ns for s in item[1])):
+            total_ns = sum(s.duration_ns for s in spans)
+            max_ns = max(s.duration_ns for s in spans)
+            lines.append(f"{name:32}{len(spans):8}{total_ns / 1e6:12.2f}{max_ns / 1e6:12.2f}")
+
+        per_package = sorted((s for s in self.spans if "package" in s.args), key=lambda s: -s.duration_ns)
+        if per_package:
+            lines.append("")
+            lines.append("slowest packages:")
+            for s in per_package[:top]:
+                lines.append(f"  {s.args['package']:30}{s.name:32}{s.duration_ns / 1e6:10.2f} ms")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> str:
+        """Export spans as Chrome trace events JSON."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": s.name,
+                "cat": s.name.split(".", 1)[0],
+                "ph": "X",
+                "ts": (s.start_ns - self.origin_ns) / 1e3,
+                "dur": s.duration_ns / 1e3,
+                "pid": pid,
+                "tid": s.thread_id,
+                "args": {k: str(v) for k, v in s.args.items()},
+            }
+            for s in self.spans
+        ]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+_recorder: Optional[Recorder] = None
+_NO_SPAN: ContextManager[None] = contextlib.nullcontext()
+
+
+def span(name: str, **args: Any) -> ContextManager[None]:
+    """Measure the enclosed block if recording is enabled, do nothing otherwise.
+
+    Args:
+        name: Name of the span, prefix before the first dot is used as a category.
+        args: Additional details, e.g. `package` name for per-package spans.
+    """
+    if _recorder is None:
+        return _NO_SPAN
+    return _recorder.span(name, **args)
+
+
+def enable() -> Recorder:
+    """Start recording spans. Returns recorder to get results from."""
+    global _recorder
+    _recorder = Recorder()
+    return _recorder
+
+
+def disable() -> None:
+    """Stop recording spans."""
+    global _recorder
+    _recorder = None
+
+
+def summary_requested() -> bool:
+    """Check if text summary is requested with environment variable."""
+    return os.environ.get(ENV_VAR, "") not in ("", "0")
+
+
+def trace_requested() -> Optional[Path]:
+    """Get path to write trace to, if it is requested with environment variable."""
+    path = os.environ.get(TRACE_ENV_VAR)
+    return Path(path) if path else None
@@ -0,0 +1,321 @@
+"""Watcher of package sources, which reports packages affected by every change.
+
+Sources root and filelist of every package are watched. Changes are debounced: a burst of file events
+(e.g. an editor saving several files, or a `git checkout`) is reported as a single event once the sources
+are quiet for a while, or once the burst lasts for the maximum delay, so constant writes (e.g. a simulation
+log within sources) don't postpone events forever. Every event names the changed packages along with all their
+dependants in a dependency-aware order, so an external build loop can recompile only them.
+
+Linux inotify is used when available, otherwise file stamps are polled periodically.
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+from .graph import DependencyGraph
+
+# directories, which never contain sources, but may change a lot
+_IGNORED_DIRS = frozenset({"__pycache__", ".git"})
+
+
+class WatchEvent(NamedTuple):
+    """Sources of packages were changed."""
+
+    changed: List[str]  # packages with changed files
+    affected: List[str]  # changed packages and all their dependants in dependency-aware order
+    paths: List[str]  # changed files and directories
+
+    def to_json(self) -> str:
+        """Get event as a single line of JSON."""
+        return json.dumps(self._asdict(), separators=(",", ":"))
+
+    def __str__(self) -> str:
+        """Get event as a single line of text: comma-separated changed packages, then all affected ones."""
+        return " ".join([",".join(self.changed), *self.affected])
+
+
+class PollingBackend:
+    """Backend, which compares modification time and size of all files under watched paths periodically."""
+
+    def __init__(self, paths: List[Path], interval: float = 0.5) -> None:
+        """Init backend and take the initial snapshot."""
+        self.paths = paths
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def poll(self, timeout: float) -> Set[Path]:
+        """Get paths changed since the previous call, wait up to the timeout for any change."""
+        deadline = time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {Path(p) for p in set(snapshot) | set(self._snapshot) if snapshot.get(p) != self._snapshot.get(p)}
+            self._snapshot = snapshot
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.interval, remaining))
+
+    def close(self) -> None:
+        """Release resources."""
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """Get stamps of all files under watched paths."""
+        stamps: Dict[str, Tuple[int, int]] = {}
+        for path in self.paths:
+            if path.is_dir():
+                for dirpath, dirnames, filenames in os.walk(path):
+                    dirnames[:] = [d for d in dirnames if d not in _IGNORED_DIRS]
+                    for name in filenames:
+                        self._stamp(os.path.join(dirpath, name), stamps)
+            else:
+                self._stamp(str(path), stamps)
+        return stamps
+
+    @staticmethod
+    def _stamp(file: str, stamps: Dict[str, Tuple[int, int]]) -> None:
+        """Add stamp of the file, if it exists."""
+        try:
+            stat = os.stat(file)
+        except OSError:
+            return
+        stamps[file] = (stat.st_mtime_ns, stat.st_size)
+
+
+class InotifyBackend:
+    """Backend, which subscribes to Linux inotify events for every directory under watched paths."""
+
+    _IN_MODIFY = 0x2
+    _IN_ATTRIB = 0x4
+    _IN_CLOSE_WRITE = 0x8
+    _IN_MOVED_FROM = 0x40
+    _IN_MOVED_TO = 0x80
+    _IN_CREATE = 0x100
+    _IN_DELETE = 0x200
+    _IN_ISDIR = 0x40000000
+    _IN_Q_OVERFLOW = 0x4000
+    _IN_IGNORED = 0x8000
+    _MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, paths: List[Path]) -> None:
+        """Init backend and watch all directories under paths.
+
+        Raises:
+            OSError: inotify is not available.
+        """
+        if sys.platform != "linux":
+            raise OSError(errno.ENOSYS, "inotify is supported only on Linux")
+        libc_name = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        # flags of inotify_init1() are the same as of open(), they are looked up here, as only Linux has them all
+        flags = getattr(os, "O_NONBLOCK", 0) | getattr(os, "O_CLOEXEC", 0)
+        self._fd: int = self._libc.inotify_init1(flags)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._dirs: Dict[int, Path] = {}
+        self._paths = paths
+        try:
+            self._add_paths()
+        except OSError:
+            self.close()
+            raise
+
+    def poll(self, timeout: float) -> Set[Path]:
+        """Get paths changed since the previous call, wait up to the timeout for any change.
+
+        If the kernel queue of events is overflowed, some events are lost, so all watched paths are reported.
+        """
+        ready, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+        if not ready:
+            return set()
+
+        changed: Set[Path] = set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            end = offset + length
+            name = data[offset:end].rstrip(b"\0").decode(errors="surrogateescape")
+            offset = end
+
+            if mask & self._IN_Q_OVERFLOW:
+                # lost events may include creation of new directories, so they are watched again as well
+                self._add_paths()
+                changed.update(self._paths)
+                continue
+            directory = self._dirs.get(wd)
+            if mask & self._IN_IGNORED:
+                self._dirs.pop(wd, None)
+            if directory is None:
+                continue
+            path = directory / name if name else directory
+            changed.add(path)
+            if mask & self._IN_ISDIR and mask & (self._IN_CREATE | self._IN_MOVED_TO):
+                # new directory is not watched yet, and it may already have files inside
+                self._add_tree(path)
+                changed.update(p for p in path.rglob("*") if p.is_file())
+        return changed
+
+    def close(self) -> None:
+        """Release resources."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _add_paths(self) -> None:
+        """Watch all watched paths. Watching a directory again is harmless."""
+        for path in self._paths:
+            if path.is_dir():
+                self._add_tree(path)
+            else:
+                # files are watched through their directories, so rename-and-replace saves are noticed as well
+                self._add_dir(str(path.parent))
+
+    def _add_tree(self, root: Path) -> None:
+        """Watch directory and all its subdirectories."""
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d not in _IGNORED_DIRS]
+            self._add_dir(dirpath)
+
+    def _add_dir(self, path: str) -> None:
+        """Watch directory itself."""
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self._MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return  # removed while walking
+            raise OSError(err, f"Can't watch {path}: {os.strerror(err)}")
+        self._dirs[wd] = Path(path)
+
+
+class SourceWatcher:
+    """Watcher of sources of all packages in the graph."""
+
+    def __init__(
+        self,
+        graph: DependencyGraph,
+        debounce: float = 0.2,
+        interval: float = 0.5,
+        use_inotify: Optional[bool] = None,
+        max_delay: float = 2.0,
+    ) -> None:
+        """Init watcher.
+
+        Args:
+            graph: Graph with packages to watch.
+            debounce: Time in seconds without any changes, after which collected changes are reported.
+            max_delay: Maximum time in seconds since the first change, after which collected changes are reported,
+                even if changes are still going on.
+            interval: Polling interval in seconds, if inotify is not used.
+            use_inotify: Use inotify (`True`), polling (`False`) or inotify only if available (`None`).
+
+        Raises:
+            OSError: inotify is required, but not available.
+        """
+        self.graph = graph
+        self.debounce = debounce
+        self.max_delay = max_delay
+        # every path (root or filelist) maps to the package it belongs to
+        self._owners: Dict[Path, str] = {}
+        for node in graph.traverse(key=lambda n: n.id):
+            for path in (node.metainfo.sources_root, node.metainfo.filelist):
+                self._owners.setdefault(Path(os.path.abspath(path)), node.id)
+        paths = sorted(self._owners)
+
+        self.backend: Union[PollingBackend, InotifyBackend]
+        if use_inotify is False:
+            self.backend = PollingBackend(paths, interval)
+        else:
+            try:
+                self.backend = InotifyBackend(paths)
+            except (OSError, AttributeError):
+                # no inotify in this OS or libc
+                if use_inotify:
+                    raise
+                self.backend = PollingBackend(paths, interval)
+
+    def __enter__(self) -> SourceWatcher:
+        """Enter context."""
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        """Exit context."""
+        self.close()
+
+    def close(self) -> None:
+        """Stop watching."""
+        self.backend.close()
+
+    def owner(self, path: Path) -> Optional[str]:
+        """Get package, which the changed path belongs to."""
+        for candidate in (path, *path.parents):
+            if candidate in self._owners:
+                return self._owners[candidate]
+            if candidate.name in _IGNORED_DIRS:
+                return None
+        return None
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[WatchEvent]:
+        """Wait for changes of package sources.
+
+        Once any change is noticed, changes are collected until there are no new ones during the debounce time,
+        but no longer than the maximum delay. Changes noticed after that are reported by the next event.
+
+        Args:
+            timeout: Time in seconds to wait for the first change. Wait forever if not provided.
+
+        Returns:
+            Event with all collected changes, or `None` if nothing was changed within the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changes: Dict[Path, str] = {}
+        while not changes:
+            remaining = 1.0 if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            changes = self._owned(self.backend.poll(remaining))
+
+        flush_at = time.monotonic() + self.max_delay
+        while True:
+            remaining = flush_at - time.monotonic()
+            if remaining <= 0:
+                break
+            burst = self._owned(self.backend.poll(min(self.debounce, remaining)))
+            if not burst:
+                break
+            changes.update(burst)
+
+        changed = sorted(set(changes.values()))
+        affected = [n.id for n in self.graph.descendants(changed, inclusive=True)]
+        return WatchEvent(changed=changed, affected=affected, paths=sorted(str(p) for p in changes))
+
+    def events(self) -> Iterator[WatchEvent]:
+        """Get events forever."""
+        while True:
+            event = self.wait()
+            if event is not None:
+                yield event
+
+    def _owned(self, paths: Set[Path]) -> Dict[Path, str]:
+        """Get packages of changed paths, paths out of packages (or ignored) are skipped."""
+        owned: Dict[Path, str] = {}
+        for path in paths:
+            owner = self.owner(path)
+            if owner is not None:
+                owned[path] = owner
+        return owned
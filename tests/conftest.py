@@ -0,0 +1,65 @@
+"""Shared fixtures for tests."""
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence
+
+import pytest
+
+
+class FakeSitePackages:
+    """Directory with pip-hdl packages installed the same way as pip does it."""
+
+    def __init__(self, root: Path) -> None:
+        """Init site directory."""
+        self.root = root
+
+    def install(
+        self,
+        name: str,
+        requires: Sequence[str] = (),
+        version: str = "0.1.0",
+        entry_point: bool = True,
+        sources: Optional[Dict[str, str]] = None,
+        filelist: Optional[str] = None,
+    ) -> Path:
+        """Install a package with sources and filelist. Returns path to the package root directory."""
+        pkg_root = self.root / name
+        pkg_root.mkdir(parents=True)
+        if sources is None:
+            sources = {f"{name}_pkg.sv": f"package {name}_pkg;\nendpackage\n"}
+        if filelist is None:
+            filelist = "".join(f"${{{name.upper()}_SOURCES_ROOT}}/{src}\n" for src in sources)
+
+        files = {
+            "__init__.py": f'from pip_hdl import PackageMetaInfo\nmetainfo = PackageMetaInfo("{name}")\n',
+            "filelist.f": filelist,
+            **sources,
+        }
+        for file_name, text in files.items():
+            (pkg_root / file_name).parent.mkdir(parents=True, exist_ok=True)
+            (pkg_root / file_name).write_text(text)
+
+        dist_info = self.root / f"{name}-{version}.dist-info"
+        dist_info.mkdir()
+        requires_dist = "".join(f"Requires-Dist: {r}\n" for r in requires)
+        (dist_info / "METADATA").write_text(
+            f"Metadata-Version: 2.1\nName: {name.replace('_', '-')}\nVersion: {version}\n{requires_dist}"
+        )
+        if entry_point:
+            (dist_info / "entry_points.txt").write_text(f"[pip_hdl]\n{name}={name}\n")
+
+        records = [f"{name}/{f}" for f in files] + [f"{dist_info.name}/{f.name}" for f in dist_info.iterdir()]
+        (dist_info / "RECORD").write_text("".join(f"{r},,\n" for r in records + [f"{dist_info.name}/RECORD"]))
+        return pkg_root
+
+
+@pytest.fixture
+def site_packages(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[FakeSitePackages]:
+    """Empty site directory, which is visible for `importlib` machinery."""
+    root = tmp_path / "site-packages"
+    root.mkdir()
+    monkeypatch.syspath_prepend(str(root))
+    modules_before = set(sys.modules)
+    yield FakeSitePackages(root)
+    for module in set(sys.modules) - modules_before:
+        del sys.modules[module]
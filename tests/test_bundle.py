@@ -0,0 +1,90 @@
+"""Tests of `bundle` module."""
+import errno
+import os
+from pathlib import Path
+
+import pytest
+
+from pip_hdl.bundle import _LINK_FUNCS, Bundle, LinkMode
+from pip_hdl.graph import DependencyGraph
+from pip_hdl.metainfo import PackageMetaInfo
+from tests.conftest import FakeSitePackages
+
+
+def _install(site_packages: FakeSitePackages) -> DependencyGraph:
+    """Install `top`, which requires `lib_a` with an include directory."""
+    site_packages.install(
+        "lib_a",
+        sources={"lib_a_pkg.sv": "package lib_a_pkg;\nendpackage\n", "inc/defs.svh": "`define X 1\n"},
+        filelist="+incdir+${LIB_A_SOURCES_ROOT}/inc\n${LIB_A_SOURCES_ROOT}/lib_a_pkg.sv\n",
+    )
+    site_packages.install("top", requires=["lib-a"])
+    return DependencyGraph([PackageMetaInfo("top")])
+
+
+def test_stage(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test that sources are linked and merged filelist is relative to the bundle."""
+    graph = _install(site_packages)
+    outdir = tmp_path / "bundle"
+
+    result = Bundle(outdir).stage(graph, env={})
+    assert (result.staged, result.unchanged, result.removed) == (["lib_a", "top"], [], [])
+    assert result.methods == {"hardlink": 7}
+    assert os.path.samefile(outdir / "lib_a" / "inc" / "defs.svh", site_packages.root / "lib_a" / "inc" / "defs.svh")
+    assert result.filelist.read_text().splitlines()[1:] == [
+        "+incdir+lib_a/inc",
+        "lib_a/lib_a_pkg.sv",
+        "top/top_pkg.sv",
+    ]
+
+
+def test_incremental(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test that only changed packages are restaged."""
+    graph = _install(site_packages)
+    outdir = tmp_path / "bundle"
+    Bundle(outdir).stage(graph, env={})
+    filelist_mtime = (outdir / Bundle.FILELIST_NAME).stat().st_mtime_ns
+
+    result = Bundle(outdir).stage(graph, env={})
+    assert (result.staged, result.unchanged, result.methods) == ([], ["lib_a", "top"], {})
+    assert (outdir / Bundle.FILELIST_NAME).stat().st_mtime_ns == filelist_mtime
+
+    (site_packages.root / "top" / "top_tb.sv").write_text("module top_tb;\nendmodule\n")
+    result = Bundle(outdir).stage(graph, env={})
+    assert (result.staged, result.unchanged) == (["top"], ["lib_a"])
+    assert (outdir / "top" / "top_tb.sv").is_file()
+
+    result = Bundle(outdir).stage(graph.subgraph(["lib_a"]), env={})
+    assert result.removed == ["top"]
+    assert not (outdir / "top").exists()
+
+
+@pytest.mark.parametrize("mode", [LinkMode.COPY, LinkMode.SYMLINK])
+def test_modes(site_packages: FakeSitePackages, tmp_path: Path, mode: LinkMode):
+    """Test that mode is respected and change of mode restages everything."""
+    graph = _install(site_packages)
+    outdir = tmp_path / "bundle"
+    Bundle(outdir).stage(graph, env={})
+
+    result = Bundle(outdir).stage(graph, mode=mode, env={})
+    assert result.staged == ["lib_a", "top"]
+    assert result.methods == {mode.value: 7}
+    staged = outdir / "top" / "top_pkg.sv"
+    assert staged.is_symlink() == (mode == LinkMode.SYMLINK)
+    assert staged.read_text() == (site_packages.root / "top" / "top_pkg.sv").read_text()
+
+
+@pytest.mark.parametrize("mode", [LinkMode.HARDLINK, LinkMode.SYMLINK])
+def test_fallback(site_packages: FakeSitePackages, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, mode: LinkMode):
+    """Test that files are copied if links are not supported."""
+    graph = _install(site_packages)
+    calls = []
+
+    def unsupported_link(src: str, dst: str) -> None:
+        calls.append(src)
+        raise OSError(errno.EPERM, "Operation not permitted")
+
+    monkeypatch.setitem(_LINK_FUNCS, mode.value, unsupported_link)
+    result = Bundle(tmp_path / "bundle").stage(graph, mode=mode, env={}, jobs=1)
+    assert result.methods == {"copy": 7}
+    assert len(calls) == 1  # method is not retried once it is known to be unsupported
@@ -0,0 +1,71 @@
+"""Tests of `cache` module."""
+from pathlib import Path
+
+from pip_hdl.cache import CacheStats, ResolutionCache
+from pip_hdl.graph import DependencyGraph
+from pip_hdl.metainfo import PackageMetaInfo
+from tests.conftest import FakeSitePackages
+
+
+def test_roundtrip(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test that cached packages are restored with the same graph and paths."""
+    site_packages.install("lib_a")
+    site_packages.install("lib_b", requires=["lib-a"])
+    site_packages.install("top", requires=["lib-b", "lib_a"])
+    cache = ResolutionCache(tmp_path / "cache")
+    key = cache.key("top\n")
+
+    assert cache.load(key) is None
+    packages = [PackageMetaInfo("top")]
+    graph = DependencyGraph(packages)
+    cache.store(key, packages, graph)
+    cached_packages = cache.load(key)
+
+    assert cached_packages is not None
+    cached_graph = DependencyGraph(cached_packages)
+    assert [n.id for n in cached_graph] == [n.id for n in graph] == ["lib_a", "lib_b", "top"]
+    assert [n.metainfo.filelist for n in cached_graph] == [n.metainfo.filelist for n in graph]
+    assert [n.metainfo.sources_var for n in cached_graph] == [n.metainfo.sources_var for n in graph]
+    assert cache.stats == CacheStats(hits=1, misses=1)
+    assert cache.entries == 1
+
+
+def test_invalidation(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test that install of any package changes cache key."""
+    site_packages.install("top")
+    cache = ResolutionCache(tmp_path / "cache")
+    key = cache.key("top\n")
+
+    assert cache.key("top\n") == key
+    assert cache.key("top>=0.1\n") != key
+    site_packages.install("other")
+    assert cache.key("top\n") != key
+
+
+def test_clear(tmp_path: Path):
+    """Test that clear removes entries and statistics."""
+    cache = ResolutionCache(tmp_path / "cache")
+    cache.load(cache.key("foo"))
+    cache.store("bar", [], DependencyGraph([]))
+
+    assert cache.entries == 1
+    assert cache.stats.misses == 1
+    assert cache.clear() == 1
+    assert cache.entries == 0
+    assert cache.stats == CacheStats(hits=0, misses=0)
+
+
+def test_renders(tmp_path: Path):
+    """Test that rendered images are stored by key and removed on clear."""
+    cache = ResolutionCache(tmp_path / "cache")
+    image = tmp_path / "graph.png"
+    image.write_bytes(b"png")
+    restored = tmp_path / "restored.png"
+
+    assert not cache.load_render("key", ".png", restored)
+    cache.store_render("key", image)
+    assert cache.load_render("key", ".png", restored)
+    assert restored.read_bytes() == b"png"
+
+    cache.clear()
+    assert not cache.load_render("key", ".png", restored)
@@ -0,0 +1,42 @@
+"""Tests of `check` module."""
+from pip_hdl.check import PathProblem, check_graph
+from pip_hdl.graph import DependencyGraph
+from pip_hdl.metainfo import PackageMetaInfo
+from tests.conftest import FakeSitePackages
+
+
+def test_healthy(site_packages: FakeSitePackages):
+    """Test that installed environment passes the check."""
+    site_packages.install("lib_a", filelist="+incdir+${LIB_A_SOURCES_ROOT}\n${LIB_A_SOURCES_ROOT}/lib_a_pkg.sv\n")
+    site_packages.install("top", requires=["lib-a"])
+
+    report = check_graph(DependencyGraph([PackageMetaInfo("top")]), env={})
+    assert report.ok
+    assert (report.packages, report.paths) == (2, 3)
+    assert report.format() == "OK: 3 paths of 2 packages checked"
+
+
+def test_problems(site_packages: FakeSitePackages):
+    """Test that problems are detected and grouped by package."""
+    lib_a = site_packages.install(
+        "lib_a",
+        filelist="+incdir+${LIB_A_SOURCES_ROOT}/lib_a_pkg.sv\n${LIB_A_SOURCES_ROOT}/lib_a_pkg.sv\n"
+        "${LIB_A_SOURCES_ROOT}/missing.sv\n-y ${LIB_A_SOURCES_ROOT}\n",
+    )
+    site_packages.install("lib_b", filelist="${UNDEFINED}/lib_b.sv\n")
+    site_packages.install("top", requires=["lib-a", "lib-b"], filelist="${LIB_A_SOURCES_ROOT}/lib_a_pkg.sv\n")
+
+    report = check_graph(DependencyGraph([PackageMetaInfo("top")]), env={})
+    assert not report.ok
+    source = str(lib_a / "lib_a_pkg.sv")
+    problems = [p for p in report.problems if p.kind != "filelist error"]
+    assert problems == [
+        PathProblem("lib_a", "invalid incdir", source, "not a directory"),
+        PathProblem("lib_a", "missing source", str(lib_a / "missing.sv")),
+        PathProblem("top", "duplicate source", source, "also in lib_a"),
+    ]
+    assert [p.package for p in report.problems if p.kind == "filelist error"] == ["lib_b"]
+
+    text = report.format()
+    assert text.startswith(f"lib_a:\n  invalid incdir {source} (not a directory)\n")
+    assert text.endswith("4 problems in 3 packages: 4 paths of 3 packages checked")
@@ -0,0 +1,49 @@
+"""Tests of `export` module."""
+import json
+
+from pip_hdl.export import dependency_edges, to_dot, to_json, to_mermaid
+from pip_hdl.graph import DependencyGraph
+from tests.test_graph import MockPackageMetaInfo
+
+
+def _graph() -> DependencyGraph:
+    """Create graph, where `top` requires `lib_b` and `lib-a` directly, while `lib_b` requires `lib-a` as well."""
+    lib_a_pkg = MockPackageMetaInfo("lib-a", [])
+    lib_b_pkg = MockPackageMetaInfo("lib_b", [lib_a_pkg])
+    vip_pkg = MockPackageMetaInfo('vip "x"', [lib_a_pkg])
+    top_pkg = MockPackageMetaInfo("top", [lib_b_pkg, lib_a_pkg, vip_pkg])
+    return DependencyGraph([top_pkg])
+
+
+def test_transitive_reduction():
+    """Test that only implied edges are removed."""
+    graph = _graph()
+
+    assert dependency_edges(graph) == {
+        "lib-a": [],
+        "lib_b": ["lib-a"],
+        'vip "x"': ["lib-a"],
+        "top": ["lib-a", "lib_b", 'vip "x"'],
+    }
+    assert dependency_edges(graph, reduce=True) == {
+        "lib-a": [],
+        "lib_b": ["lib-a"],
+        'vip "x"': ["lib-a"],
+        "top": ["lib_b", 'vip "x"'],
+    }
+
+
+def test_formats():
+    """Test text formats of the graph."""
+    graph = _graph()
+
+    dot = to_dot(graph, reduce=True)
+    assert dot.startswith('digraph "graph" {\n    rankdir=RL\n    "lib-a"\n    "lib_b" -> "lib-a"\n')
+    assert '"top" -> "vip \\"x\\""' in dot
+    assert '"top" -> "lib-a"' not in dot
+
+    assert json.loads(to_json(graph))["nodes"][1] == {"id": "lib_b", "dependencies": ["lib-a"]}
+
+    mermaid = to_mermaid(graph).splitlines()
+    assert mermaid[:3] == ["graph RL", '    n0["lib-a"]', '    n1["lib_b"]']
+    assert "    n3 --> n0" in mermaid
@@ -0,0 +1,92 @@
+"""Tests of `filelist` module."""
+from pathlib import Path
+
+import pytest
+
+from pip_hdl.filelist import EntryKind, FilelistEntry, FilelistError, FilelistParser, expand_graph
+from pip_hdl.graph import DependencyGraph
+from pip_hdl.metainfo import PackageMetaInfo
+from tests.conftest import FakeSitePackages
+
+
+def test_parse(tmp_path: Path):
+    """Test parsing of filelist syntax."""
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "nested.f").write_text("nested.sv\n+incdir+inc\n")
+    (tmp_path / "other.f").write_text("$(ROOT)/other.sv\n")
+    filelist = tmp_path / "top.f"
+    filelist.write_text(
+        """# header comment
++incdir+${ROOT}/a+$ROOT/b
++define+FOO=1+BAR
+/* block
+   comment */ -v $ROOT/cells.v -y lib
+${ROOT}/top.sv // trailing comment
+-F ${ROOT}/sub/nested.f
+-f ${ROOT}/other.f
+-timescale=1ns/1ps
+"""
+    )
+
+    entries = list(FilelistParser({"ROOT": str(tmp_path)}).parse(filelist))
+
+    assert entries == [
+        FilelistEntry(EntryKind.INCDIR, f"{tmp_path}/a"),
+        FilelistEntry(EntryKind.INCDIR, f"{tmp_path}/b"),
+        FilelistEntry(EntryKind.DEFINE, "FOO=1"),
+        FilelistEntry(EntryKind.DEFINE, "BAR"),
+        FilelistEntry(EntryKind.OPTION, f"-v {tmp_path}/cells.v"),
+        FilelistEntry(EntryKind.OPTION, "-y lib"),
+        FilelistEntry(EntryKind.SOURCE, f"{tmp_path}/top.sv"),
+        FilelistEntry(EntryKind.SOURCE, str(tmp_path / "sub" / "nested.sv")),
+        FilelistEntry(EntryKind.INCDIR, str(tmp_path / "sub" / "inc")),
+        FilelistEntry(EntryKind.SOURCE, f"{tmp_path}/other.sv"),
+        FilelistEntry(EntryKind.OPTION, "-timescale=1ns/1ps"),
+    ]
+    assert [str(e) for e in entries[:3]] == [f"+incdir+{tmp_path}/a", f"+incdir+{tmp_path}/b", "+define+FOO=1"]
+
+
+def test_parse_errors(tmp_path: Path):
+    """Test that errors are reported with location."""
+    filelist = tmp_path / "top.f"
+    filelist.write_text("a.sv\n${UNKNOWN}/b.sv\n")
+    with pytest.raises(FilelistError, match=r"top.f:2: environment variable 'UNKNOWN'"):
+        list(FilelistParser({}).parse(filelist))
+
+    filelist.write_text(f"a.sv\n-f {filelist}\n")
+    with pytest.raises(FilelistError, match="recursive include"):
+        list(FilelistParser({}).parse(filelist))
+
+
+def test_parse_large(tmp_path: Path):
+    """Test that large filelists are streamed."""
+    filelist = tmp_path / "large.f"
+    with filelist.open("w") as f:
+        for i in range(100_000):
+            f.write(f"$ROOT/src{i}.sv\n")
+
+    entries = FilelistParser({"ROOT": "/root"}).parse(filelist)
+
+    assert next(entries) == FilelistEntry(EntryKind.SOURCE, "/root/src0.sv")
+    assert sum(1 for _ in entries) == 99_999
+
+
+def test_expand_graph(site_packages: FakeSitePackages):
+    """Test expanding filelists of the whole graph."""
+    common = {"common_pkg.sv": "", "include/common_defs.svh": ""}
+    site_packages.install(
+        "lib_a",
+        sources=common,
+        filelist="+incdir+${LIB_A_SOURCES_ROOT}/include\n${LIB_A_SOURCES_ROOT}/common_pkg.sv\n",
+    )
+    site_packages.install(
+        "top",
+        requires=["lib-a"],
+        filelist="+incdir+${LIB_A_SOURCES_ROOT}/include\n$LIB_A_SOURCES_ROOT/common_pkg.sv\n${TOP_SOURCES_ROOT}/t.sv\n",
+        sources={"t.sv": ""},
+    )
+    root = site_packages.root
+
+    entries = [str(e) for e in expand_graph(DependencyGraph([PackageMetaInfo("top")]), env={})]
+
+    assert entries == [f"+incdir+{root}/lib_a/include", f"{root}/lib_a/common_pkg.sv", f"{root}/top/t.sv"]
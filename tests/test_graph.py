@@ -1,9 +1,20 @@
 """Tests of `graph` module."""
+import asyncio
+import importlib
 import random
+import threading
+import time
+from importlib.metadata import PackageNotFoundError
+from types import ModuleType
 from typing import List, Sequence
 
-from pip_hdl.graph import DependencyGraph
-from pip_hdl.metainfo import PackageDependency, PackageMetaInfo
+import pytest
+from packaging.requirements import Requirement
+
+from pip_hdl import metainfo
+from pip_hdl.graph import CircularDependencyError, DependencyGraph
+from pip_hdl.metainfo import DistributionIndex, PackageDependency, PackageMetaInfo
+from tests.conftest import FakeSitePackages
 
 
 class MockPackageMetaInfo(PackageMetaInfo):
@@ -13,10 +24,12 @@ class MockPackageMetaInfo(PackageMetaInfo):
         """Init object."""
         super().__init__(name)
         self._dependencies_meta = dependencies
+        self.expanded = 0
 
     @property
     def dependencies(self) -> List[PackageDependency]:
         """Simplified dependencies."""
+        self.expanded += 1
         return [PackageDependency(spec="", module=None, metainfo=d) for d in self._dependencies_meta]
 
 
@@ -98,3 +111,375 @@ def test_tree():
     assert set(graph_nodes[:4]) == set(["a1", "a2", "b1", "b2"])
     assert set(graph_nodes[4:6]) == set(["c1", "c2"])
     assert graph_nodes[6] == "d"
+
+
+def test_deterministic_tie_break():
+    """Test iterating graph with a key to order nodes which are ready at the same time."""
+    a1_pkg = MockPackageMetaInfo("a1", [])
+    a2_pkg = MockPackageMetaInfo("a2", [])
+    b1_pkg = MockPackageMetaInfo("b1", [a2_pkg])
+    b2_pkg = MockPackageMetaInfo("b2", [a1_pkg])
+    c_pkg = MockPackageMetaInfo("c", [b1_pkg, b2_pkg])
+
+    packages = [a1_pkg, a2_pkg, b1_pkg, b2_pkg, c_pkg]
+    random.shuffle(packages)
+    graph = DependencyGraph(packages)
+
+    assert list(node.id for node in graph.traverse(key=lambda n: n.id)) == ["a1", "a2", "b1", "b2", "c"]
+
+
+def test_cycle():
+    """Test that circular dependency is reported with the exact loop."""
+    foo_pkg = MockPackageMetaInfo("foo", [])
+    bar_pkg = MockPackageMetaInfo("bar", [foo_pkg])
+    baz_pkg = MockPackageMetaInfo("baz", [bar_pkg])
+    ham_pkg = MockPackageMetaInfo("ham", [])
+    graph = DependencyGraph([baz_pkg, ham_pkg])
+    graph.nodes["foo"].add_upstreams([graph.nodes["baz"]])
+
+    with pytest.raises(CircularDependencyError) as excinfo:
+        list(graph)
+
+    cycle = excinfo.value.cycle
+    assert sorted(cycle) == ["bar", "baz", "foo"]
+    # every package in the report requires the next one
+    for pkg, upstream in zip(cycle, cycle[1:] + cycle[:1]):
+        assert graph.nodes[upstream] in graph.nodes[pkg].upstreams
+
+
+def test_traverse_scaling():
+    """Test that iterating a large graph takes linear time."""
+    roots = [MockPackageMetaInfo(f"root{i}", []) for i in range(100)]
+    packages: List[PackageMetaInfo] = list(roots)
+    for i in range(10_000 - len(roots)):
+        packages.append(MockPackageMetaInfo(f"pkg{i}", random.sample(roots, 3)))
+    graph = DependencyGraph(packages)
+
+    start = time.perf_counter()
+    order = [node.id for node in graph]
+    elapsed = time.perf_counter() - start
+
+    assert len(order) == 10_000
+    assert set(order[:100]) == set(p.name for p in roots)
+    assert elapsed < 1.0
+
+
+def test_shared_dependencies():
+    """Test that packages shared by many dependency paths are expanded only once."""
+    layers: List[List[MockPackageMetaInfo]] = [[MockPackageMetaInfo("common", [])]]
+    for depth in range(1, 30):
+        layers.append([MockPackageMetaInfo(f"l{depth}_{i}", layers[-1]) for i in range(3)])
+    top_pkg = MockPackageMetaInfo("top", layers[-1])
+
+    graph = DependencyGraph([top_pkg, layers[0][0]])
+
+    assert len(graph.nodes) == 1 + 29 * 3 + 1
+    assert all(pkg.expanded == 1 for layer in layers for pkg in layer)
+    graph_nodes = list(node.id for node in graph)
+    assert graph_nodes[0] == "common"
+    assert graph_nodes[-1] == "top"
+
+
+def test_same_package_different_spelling():
+    """Test that package names are normalized to find the same package."""
+    foo_pkg = MockPackageMetaInfo("foo_lib", [])
+    foo_alias_pkg = MockPackageMetaInfo("Foo-Lib", [])
+    bar_pkg = MockPackageMetaInfo("bar", [foo_alias_pkg])
+    graph = DependencyGraph([foo_pkg, bar_pkg])
+
+    assert list(node.id for node in graph) == ["foo_lib", "bar"]
+
+
+def test_deep_chain():
+    """Test that deep chains don't hit recursion limit."""
+    packages = [MockPackageMetaInfo("pkg0", [])]
+    for i in range(1, 5_000):
+        packages.append(MockPackageMetaInfo(f"pkg{i}", [packages[-1]]))
+    graph = DependencyGraph([packages[-1]])
+
+    assert list(node.id for node in graph) == [p.name for p in packages]
+
+
+def test_levels():
+    """Test grouping nodes by dependency levels."""
+    a_pkg = MockPackageMetaInfo("a", [])
+    b_pkg = MockPackageMetaInfo("b", [a_pkg])
+    c_pkg = MockPackageMetaInfo("c", [])
+    d_pkg = MockPackageMetaInfo("d", [b_pkg, c_pkg])
+    e_pkg = MockPackageMetaInfo("e", [c_pkg])
+    graph = DependencyGraph([d_pkg, e_pkg])
+
+    assert [[node.id for node in level] for level in graph.levels()] == [["a", "c"], ["b", "e"], ["d"]]
+
+
+def test_reachability():
+    """Test ancestors, descendants and subgraph queries."""
+    a_pkg = MockPackageMetaInfo("a", [])
+    b_pkg = MockPackageMetaInfo("b", [a_pkg])
+    c_pkg = MockPackageMetaInfo("c", [])
+    d_pkg = MockPackageMetaInfo("d", [b_pkg, c_pkg])
+    e_pkg = MockPackageMetaInfo("e_vip", [c_pkg])
+    graph = DependencyGraph([d_pkg, e_pkg])
+
+    assert [n.id for n in graph.ancestors(["d"])] == ["a", "b", "c"]
+    assert [n.id for n in graph.ancestors(["b", "E-VIP"], inclusive=True)] == ["a", "b", "c", "e_vip"]
+    assert [n.id for n in graph.descendants(["c"])] == ["d", "e_vip"]
+    assert [n.id for n in graph.descendants(["a"], inclusive=True)] == ["a", "b", "d"]
+    assert graph.descendants(["d"]) == []
+    assert graph.depends_on("d", "a")
+    assert not graph.depends_on("a", "d")
+    assert not graph.depends_on("e_vip", "b")
+    with pytest.raises(KeyError):
+        graph.ancestors(["x"])
+
+    subgraph = graph.subgraph(["b", "e_vip"])
+    assert [n.id for n in subgraph.traverse(key=lambda n: n.id)] == ["a", "b", "c", "e_vip"]
+    assert subgraph.nodes["b"].metainfo is b_pkg
+    assert subgraph.nodes["a"].downstreams == {subgraph.nodes["b"]}
+
+
+def test_reachability_scaling():
+    """Test that repeated queries on a large graph are fast."""
+    packages: List[PackageMetaInfo] = [MockPackageMetaInfo(f"root{i}", []) for i in range(100)]
+    for i in range(5_000):
+        packages.append(MockPackageMetaInfo(f"pkg{i}", random.sample(packages, 3)))
+    graph = DependencyGraph(packages)
+    ids = list(graph.nodes)
+
+    start = time.perf_counter()
+    for node_id in random.sample(ids, 1_000):
+        graph.descendants([node_id])
+        graph.depends_on(node_id, random.choice(ids))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 2.0
+
+
+def test_async_build(site_packages: FakeSitePackages, monkeypatch: pytest.MonkeyPatch):
+    """Test that concurrent resolution gives the same graph as the synchronous one and resolves all lookups."""
+    site_packages.install("lib_y")
+    site_packages.install("lib_x", requires=['lib-y; extra == "sim"'])
+    site_packages.install("lib_b", requires=["lib-x[sim]"])
+    site_packages.install("lib_a", requires=["lib-b"])
+    site_packages.install("lib_c", requires=["lib-x"])
+    site_packages.install("top", requires=["lib-a", "lib-c"])
+
+    def edges(graph: DependencyGraph) -> List[tuple]:
+        return [(n.id, sorted(u.id for u in n.upstreams), n.metainfo.extras) for n in graph.traverse(lambda n: n.id)]
+
+    sync_graph = DependencyGraph([PackageMetaInfo("top")])
+    async_graph = asyncio.run(DependencyGraph.from_packages_async([PackageMetaInfo("top")], concurrency=4))
+    assert edges(async_graph) == edges(sync_graph)
+    assert async_graph.nodes["lib_x"].metainfo.extras == {"sim"}
+
+    monkeypatch.setattr(PackageMetaInfo, "_find_recorded_filelist", lambda self: pytest.fail())
+    assert [n.metainfo.filelist.parent.name for n in async_graph.traverse(lambda n: n.id)] == [
+        "lib_y",
+        "lib_x",
+        "lib_b",
+        "lib_a",
+        "lib_c",
+        "top",
+    ]
+
+
+@pytest.mark.parametrize("order", [["lib-b", "top"], ["top", "lib-b"]])
+def test_extras_are_merged(site_packages: FakeSitePackages, order: List[str]):
+    """Test that optional dependencies are found regardless of which spelling of a package is seen first."""
+    site_packages.install("lib_sim")
+    site_packages.install("lib_b", requires=['lib-sim; extra == "sim"'])
+    site_packages.install("top", requires=["lib-b[sim]"])
+    index = DistributionIndex([str(site_packages.root)])
+    graph = DependencyGraph([PackageMetaInfo.from_requirement(Requirement(r), index) for r in order])
+
+    assert [n.id for n in graph.traverse(key=lambda n: n.id)] == ["lib_sim", "lib_b", "top"]
+    assert graph.nodes["lib_b"].metainfo.extras == {"sim"}
+
+
+def test_add_package_with_extras(site_packages: FakeSitePackages):
+    """Test that an existing package is expanded again, when it is added with more extras."""
+    site_packages.install("lib_sim")
+    site_packages.install("lib_b", requires=['lib-sim; extra == "sim"'])
+    graph = DependencyGraph([PackageMetaInfo("lib_b")])
+    assert list(n.id for n in graph) == ["lib_b"]
+
+    node = graph.add_package(PackageMetaInfo("lib_b", extras=["sim"]))
+    assert node is graph.nodes["lib_b"]
+    assert _assert_topological(graph) == ["lib_sim", "lib_b"]
+
+
+def test_add_package_error(site_packages: FakeSitePackages):
+    """Test that the graph is not changed, if some of new packages can't be resolved."""
+    site_packages.install("lib_a")
+    bad_root = site_packages.install("bad", entry_point=False)
+    (bad_root / "__init__.py").write_text("raise RuntimeError('boom')\n")
+    site_packages.install("lib_b", requires=["lib-a", 'bad; extra == "sim"'])
+    site_packages.install("lib_c", requires=["lib-a", "lib-b[sim]"])
+    graph = DependencyGraph([PackageMetaInfo("lib_b")])
+    order = _assert_topological(graph)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match="boom"):
+            graph.add_package(PackageMetaInfo("lib_c"))
+        assert sorted(graph.nodes) == ["lib_a", "lib_b"]
+        assert graph.nodes["lib_b"].metainfo.extras == frozenset()
+        assert graph.nodes["lib_a"].downstreams == {graph.nodes["lib_b"]}
+        assert _assert_topological(graph) == order
+
+    with pytest.raises(PackageNotFoundError):
+        graph.add_package(PackageMetaInfo("not_installed_package"))
+    with pytest.raises(RuntimeError, match="boom"):
+        graph.update_package(MockPackageMetaInfo("lib_a", [PackageMetaInfo("lib_b", extras=["sim"])]))
+    assert sorted(graph.nodes) == ["lib_a", "lib_b"]
+    assert graph.nodes["lib_b"].metainfo.extras == frozenset()
+    assert graph.nodes["lib_a"].upstreams == set()
+
+
+def test_async_build_concurrency():
+    """Test that lookups are overlapped, but concurrency is bounded."""
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    class SlowPackageMetaInfo(MockPackageMetaInfo):
+        def prefetch(self) -> None:
+            nonlocal active, max_active
+            with lock:
+                active += 1
+                max_active = max(max_active, active)
+            time.sleep(0.01)
+            with lock:
+                active -= 1
+
+    leaves = [SlowPackageMetaInfo(f"leaf{i}", []) for i in range(20)]
+    top_pkg = SlowPackageMetaInfo("top", leaves)
+    graph = asyncio.run(DependencyGraph.from_packages_async([top_pkg], concurrency=4))
+
+    assert len(graph.nodes) == 21
+    assert 1 < max_active <= 4
+
+
+def test_async_build_error():
+    """Test that resolution errors are the same as for the synchronous build."""
+    with pytest.raises(PackageNotFoundError):
+        DependencyGraph([PackageMetaInfo("not_installed_package")])
+    with pytest.raises(PackageNotFoundError):
+        asyncio.run(DependencyGraph.from_packages_async([PackageMetaInfo("not_installed_package")]))
+
+
+def test_async_build_dependency_error(site_packages: FakeSitePackages, monkeypatch: pytest.MonkeyPatch):
+    """Test that an error of a dependency discovery is raised by the async build as well, without a retry."""
+    site_packages.install("good")
+    bad_root = site_packages.install("bad", entry_point=False)
+    (bad_root / "__init__.py").write_text("raise RuntimeError('boom')\n")
+    site_packages.install("top", requires=["good", "bad"])
+
+    with pytest.raises(RuntimeError, match="boom"):
+        DependencyGraph([PackageMetaInfo("top")])
+
+    imports: List[str] = []
+
+    def import_module(name: str) -> ModuleType:
+        imports.append(name)
+        return importlib.import_module(name)
+
+    monkeypatch.setattr(metainfo, "import_module", import_module)
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(DependencyGraph.from_packages_async([PackageMetaInfo("top")]))
+    assert imports == ["bad"]
+
+
+def _assert_topological(graph: DependencyGraph) -> List[str]:
+    """Check that the default order of the graph is dependency-aware and return it."""
+    order = list(graph)
+    positions = {node: i for i, node in enumerate(order)}
+    assert len(order) == len(graph.nodes)
+    assert all(positions[u] < positions[node] for node in order for u in node.upstreams)
+    return [node.id for node in order]
+
+
+def test_add_remove_package():
+    """Test that packages are added and removed in place along with the cached order."""
+    foo_pkg = MockPackageMetaInfo("foo", [])
+    bar_pkg = MockPackageMetaInfo("bar", [foo_pkg])
+    graph = DependencyGraph([bar_pkg])
+    assert _assert_topological(graph) == ["foo", "bar"]
+
+    baz_pkg = MockPackageMetaInfo("baz", [MockPackageMetaInfo("Foo", []), MockPackageMetaInfo("ham", [])])
+    assert graph.add_package(baz_pkg) is graph.nodes["baz"]
+    assert graph.add_package(MockPackageMetaInfo("BAZ", [])) is graph.nodes["baz"]
+    assert _assert_topological(graph) == ["foo", "bar", "ham", "baz"]
+    assert graph.nodes["baz"].upstreams == {graph.nodes["foo"], graph.nodes["ham"]}
+    assert [n.id for n in graph.descendants(["foo"])] == ["bar", "baz"]
+
+    with pytest.raises(ValueError, match="required by bar, baz"):
+        graph.remove_package("foo")
+    graph.remove_package("bar")
+    assert _assert_topological(graph) == ["foo", "ham", "baz"]
+    assert [n.id for n in graph.descendants(["foo"])] == ["baz"]
+    with pytest.raises(KeyError):
+        graph.remove_package("bar")
+
+
+def test_update_package():
+    """Test that changed dependencies are relinked and the order is patched."""
+    a_pkg = MockPackageMetaInfo("a", [])
+    b_pkg = MockPackageMetaInfo("b", [a_pkg])
+    c_pkg = MockPackageMetaInfo("c", [])
+    d_pkg = MockPackageMetaInfo("d", [c_pkg])
+    graph = DependencyGraph([b_pkg, d_pkg])
+    assert _assert_topological(graph) == ["a", "c", "b", "d"]
+
+    # `a` now requires `d`, so `a` with its dependants move after `d`
+    graph.update_package(MockPackageMetaInfo("a", [d_pkg, MockPackageMetaInfo("e", [])]))
+    assert _assert_topological(graph) == ["c", "d", "e", "a", "b"]
+    assert [n.id for n in graph.ancestors(["b"])] == ["c", "d", "e", "a"]
+
+    graph.update_package(MockPackageMetaInfo("a", []))
+    assert graph.nodes["a"].upstreams == set()
+    assert graph.nodes["d"].downstreams == set()
+    assert _assert_topological(graph) == ["c", "d", "e", "a", "b"]
+
+
+def test_update_package_cycle():
+    """Test that a dependency, which introduces a cycle, is rejected and the graph is not changed."""
+    a_pkg = MockPackageMetaInfo("a", [])
+    b_pkg = MockPackageMetaInfo("b", [a_pkg])
+    c_pkg = MockPackageMetaInfo("c", [b_pkg])
+    graph = DependencyGraph([c_pkg])
+    order = _assert_topological(graph)
+
+    with pytest.raises(CircularDependencyError) as excinfo:
+        graph.update_package(MockPackageMetaInfo("a", [MockPackageMetaInfo("x", [c_pkg])]))
+    assert excinfo.value.cycle == ["a", "x", "c", "b"]
+    assert _assert_topological(graph) == order
+    assert "x" not in graph.nodes and graph.nodes["a"].upstreams == set()
+    assert graph.nodes["c"].downstreams == set()
+
+    with pytest.raises(KeyError):
+        graph.update_package(MockPackageMetaInfo("missing", []))
+
+
+def test_incremental_updates_random():
+    """Test that the order stays dependency-aware after many random updates."""
+    rng = random.Random(42)
+    packages = [MockPackageMetaInfo(f"pkg{i}", []) for i in range(50)]
+    graph = DependencyGraph(packages)
+    for _ in range(300):
+        node = graph.nodes[rng.choice(packages).name]
+        dependencies = [graph.nodes[p.name].metainfo for p in rng.sample(packages, 3)]
+        try:
+            graph.update_package(MockPackageMetaInfo(node.id, dependencies))
+        except CircularDependencyError as exc:
+            assert node.id == exc.cycle[0]
+        _assert_topological(graph)
+
+    # reachability index is rebuilt from the patched graph
+    for node in graph.nodes.values():
+        expected, stack = set(), list(node.upstreams)
+        while stack:
+            upstream = stack.pop()
+            if upstream not in expected:
+                expected.add(upstream)
+                stack.extend(upstream.upstreams)
+        assert set(graph.ancestors([node.id])) == expected
@@ -0,0 +1,82 @@
+"""Tests of `lockfile` module."""
+import shutil
+from pathlib import Path
+
+import pytest
+
+from pip_hdl.graph import DependencyGraph
+from pip_hdl.lockfile import Lockfile, LockfileError, is_lockfile
+from pip_hdl.metainfo import DistributionIndex, PackageMetaInfo
+from pip_hdl.requirements import load_packages
+from tests.conftest import FakeSitePackages
+
+
+def _lock(site_packages: FakeSitePackages, path: Path) -> Lockfile:
+    """Install `top`, which requires `lib_b` and `lib_a`, and lock it."""
+    site_packages.install("lib_a", version="1.2.0")
+    site_packages.install("lib_b", requires=["lib-a"])
+    site_packages.install("top", requires=["lib-b", "lib-a>=1"])
+    packages = [PackageMetaInfo("top")]
+    lockfile = Lockfile.from_graph(packages, DependencyGraph(packages), site_root=site_packages.root)
+    lockfile.write(path)
+    return lockfile
+
+
+def test_roundtrip(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test that locked packages are restored without resolution and relocated with site-packages."""
+    lockfile = _lock(site_packages, tmp_path / "pip-hdl.lock")
+
+    lib_a = lockfile.packages[0]
+    assert [p.name for p in lockfile.packages] == ["lib_a", "lib_b", "top"]
+    assert (lib_a.distribution, lib_a.version, lib_a.filelist) == ("lib-a", "1.2.0", "lib_a/filelist.f")
+    assert lib_a.sources_var == "LIB_A_SOURCES_ROOT"
+    assert lockfile.packages[2].dependencies == ["lib_a", "lib_b"]
+
+    relocated = tmp_path / "relocated"
+    shutil.copytree(site_packages.root, relocated)
+    (top,) = Lockfile.read(tmp_path / "pip-hdl.lock").load_packages(site_root=relocated)
+    graph = DependencyGraph([top])
+    assert [n.id for n in graph] == ["lib_a", "lib_b", "top"]
+    assert top.filelist == relocated / "top" / "filelist.f"
+
+    assert is_lockfile(str(tmp_path / "pip-hdl.lock"))
+    assert not is_lockfile(str(tmp_path / "other.lock"))
+
+
+def test_verify(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test detection of changes in the installed environment."""
+    lockfile = _lock(site_packages, tmp_path / "pip-hdl.lock")
+    site = site_packages.root
+
+    assert lockfile.verify(site_root=site, check_hashes=True) == []
+
+    (site / "lib_b" / "lib_b_pkg.sv").write_text("package lib_b_pkg; int x; endpackage\n")
+    assert lockfile.verify(site_root=site) == []
+    assert lockfile.verify(site_root=site, check_hashes=True) == ["lib_b: sources are changed"]
+
+    metadata = site / "lib_a-1.2.0.dist-info" / "METADATA"
+    metadata.write_text(metadata.read_text().replace("Version: 1.2.0", "Version: 1.3.0"))
+    assert lockfile.verify(site_root=site, index=DistributionIndex([str(site)])) == [
+        "lib_a: version 1.3.0, locked 1.2.0"
+    ]
+
+
+def test_inspect_lockfile(site_packages: FakeSitePackages, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """Test that lockfile is accepted as a request."""
+    _lock(site_packages, tmp_path / "pip-hdl.lock")
+    monkeypatch.setattr("pip_hdl.lockfile.default_site_root", lambda: site_packages.root)
+    monkeypatch.setattr("pip_hdl.metainfo.PackageMetaInfo.dependencies", property(lambda self: pytest.fail()))
+
+    (top,) = load_packages(str(tmp_path / "pip-hdl.lock"))
+    assert top.filelist == site_packages.root / "top" / "filelist.f"
+
+
+def test_corrupted(tmp_path: Path):
+    """Test that corrupted lockfile is reported."""
+    path = tmp_path / "pip-hdl.lock"
+    path.write_text('{"version": 1, "packages": []}')
+    with pytest.raises(LockfileError, match="corrupted"):
+        Lockfile.read(path)
+    path.write_text('{"version": 100}')
+    with pytest.raises(LockfileError, match="unsupported lockfile version 100"):
+        Lockfile.read(path)
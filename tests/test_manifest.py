@@ -0,0 +1,86 @@
+"""Tests of `manifest` module."""
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from pip_hdl.graph import DependencyGraph
+from pip_hdl.manifest import BuildManifest
+from pip_hdl.metainfo import PackageMetaInfo
+from tests.conftest import FakeSitePackages
+
+
+def _graph(site_packages: FakeSitePackages) -> DependencyGraph:
+    """Create graph: `lib_b` and `lib_c` require `lib_a`, `top` requires `lib_b` and `lib_c`."""
+    site_packages.install(
+        "lib_a",
+        sources={"a.sv": "", "include/a.svh": ""},
+        filelist="+incdir+${LIB_A_SOURCES_ROOT}/include\n${LIB_A_SOURCES_ROOT}/a.sv\n",
+    )
+    site_packages.install("lib_b", requires=["lib-a"])
+    site_packages.install("lib_c", requires=["lib-a"])
+    site_packages.install("top", requires=["lib-b", "lib-c"])
+    return DependencyGraph([PackageMetaInfo("top")])
+
+
+def test_dirty(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test detection of changed packages and their dependants."""
+    graph = _graph(site_packages)
+    manifest = BuildManifest(tmp_path / "manifest.json")
+
+    digests = manifest.scan(graph)
+    assert [n.id for n in manifest.dirty(graph, digests)] == ["lib_a", "lib_b", "lib_c", "top"]
+    manifest.update(digests)
+    manifest.save()
+
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    assert manifest.dirty(graph, manifest.scan(graph)) == []
+
+    (site_packages.root / "lib_b" / "lib_b_pkg.sv").write_text("package lib_b_pkg; int x; endpackage\n")
+    assert [n.id for n in manifest.dirty(graph, manifest.scan(graph))] == ["lib_b", "top"]
+
+    (site_packages.root / "lib_a" / "include" / "a.svh").write_text("`define A\n")
+    assert [n.id for n in manifest.dirty(graph, manifest.scan(graph))] == ["lib_a", "lib_b", "lib_c", "top"]
+
+
+def test_unchanged_files_not_rehashed(site_packages: FakeSitePackages, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """Test that files with the same stamps are not hashed again."""
+    graph = _graph(site_packages)
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    digests = manifest.scan(graph)
+
+    hashed: List[Path] = []
+
+    def hash_file(path: Path) -> str:
+        hashed.append(path)
+        return ""
+
+    monkeypatch.setattr("pip_hdl.manifest.hash_file", hash_file)
+
+    assert manifest.scan(graph) == digests
+    assert hashed == []
+
+
+@pytest.mark.parametrize(
+    "content", ['{"version": 1, "packages": {', '{"version": 1, "packages": {}, "files": 1}', "[]"]
+)
+def test_corrupted_manifest(site_packages: FakeSitePackages, tmp_path: Path, content: str):
+    """Test that manifest, which can't be read, is treated as missing."""
+    graph = _graph(site_packages)
+    path = tmp_path / "manifest.json"
+    path.write_text(content)
+    manifest = BuildManifest(path)
+    assert len(manifest.dirty(graph, manifest.scan(graph))) == 4
+
+
+def test_unreadable_file(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test that a directory within a filelist is treated as a missing file."""
+    graph = _graph(site_packages)
+    manifest = BuildManifest(tmp_path / "manifest.json")
+    digests = manifest.scan(graph)
+    manifest.update(digests)
+
+    sources = site_packages.root / "lib_a" / "a.sv"
+    sources.unlink()
+    sources.mkdir()
+    assert [n.id for n in manifest.dirty(graph, manifest.scan(graph))] == ["lib_a", "lib_b", "lib_c", "top"]
@@ -0,0 +1,133 @@
+"""Tests of `metainfo` module."""
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from pip_hdl.metainfo import DistributionIndex, PackageMetaInfo
+from pip_hdl.requirements import load_packages
+from tests.conftest import FakeSitePackages
+
+
+def test_discover_without_import(site_packages: FakeSitePackages):
+    """Test that packages with entry point are discovered from metadata only."""
+    site_packages.install("lib_a")
+    site_packages.install("lib_b", requires=["lib-a>=0.1"])
+    top_root = site_packages.install("top", requires=["lib-b"])
+
+    top = PackageMetaInfo("top")
+    (dependency,) = top.dependencies
+
+    assert dependency.spec == "lib-b"
+    assert dependency.module is None
+    assert dependency.metainfo.name == "lib_b"
+    assert [d.metainfo.name for d in dependency.metainfo.dependencies] == ["lib_a"]
+    assert top.filelist == top_root / "filelist.f"
+    assert dependency.metainfo.sources_root == site_packages.root / "lib_b"
+    assert not {"top", "lib_a", "lib_b"}.intersection(sys.modules)
+
+
+def test_discover_legacy(site_packages: FakeSitePackages):
+    """Test that packages without entry point are imported to check for metainfo."""
+    site_packages.install("legacy_lib", entry_point=False)
+    site_packages.install("top", requires=["legacy_lib"])
+
+    (dependency,) = PackageMetaInfo("top").dependencies
+
+    assert dependency.module is sys.modules["legacy_lib"]
+    assert dependency.metainfo is dependency.module.metainfo
+
+
+def test_skip_non_hdl(site_packages: FakeSitePackages):
+    """Test that distributions without filelists are not imported."""
+    non_hdl_root = site_packages.install("non_hdl", entry_point=False)
+    (non_hdl_root / "filelist.f").unlink()
+    record = next(site_packages.root.glob("non_hdl-*.dist-info")) / "RECORD"
+    record.write_text(record.read_text().replace("non_hdl/filelist.f,,\n", ""))
+    site_packages.install("top", requires=["non_hdl", "not_installed"])
+
+    assert PackageMetaInfo("top").dependencies == []
+    assert "non_hdl" not in sys.modules
+
+
+def test_filelist_without_record(site_packages: FakeSitePackages):
+    """Test that filelist is found with package loader, if it is not recorded (e.g. editable install)."""
+    pkg_root = site_packages.install("editable")
+    record = next(site_packages.root.glob("editable-*.dist-info")) / "RECORD"
+    record.write_text("")
+
+    assert PackageMetaInfo("editable").filelist == pkg_root / "filelist.f"
+
+
+def test_distribution_index(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test that distributions are found in the index by any spelling of the name."""
+    site_packages.install("lib_a")
+    shadowed = tmp_path / "shadowed"
+    FakeSitePackages(shadowed).install("lib_a", version="0.0.1")
+
+    index = DistributionIndex([str(site_packages.root), str(shadowed), str(tmp_path / "not_exists")])
+
+    assert len(index) == 1
+    dist = index.get("Lib-A")
+    assert dist is not None
+    assert dist.version == "0.1.0"
+    assert index.get("lib_b") is None
+    assert PackageMetaInfo("lib_a", index=index).filelist == site_packages.root / "lib_a" / "filelist.f"
+
+
+def test_shared_packages(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test that packages are shared between requests within the same index, so they are resolved once."""
+    site_packages.install("lib_a")
+    site_packages.install("lib_b", requires=["lib-a"])
+    site_packages.install("tb_x", requires=["lib-b"])
+    site_packages.install("tb_y", requires=["lib-b", "lib-a[sim]"])
+    index = DistributionIndex([str(site_packages.root)])
+
+    (tb_x,) = load_packages("tb-x", index)
+    tb_y, lib_b = load_packages(_requirements(tmp_path, "tb_y\nLib_B\n"), index)
+
+    assert lib_b is tb_x.dependencies[0].metainfo
+    assert tb_y.dependencies[0].metainfo is lib_b
+    lib_a = lib_b.dependencies[0].metainfo
+    assert tb_y.dependencies[1].metainfo is not lib_a  # different extras
+    assert index.intern(PackageMetaInfo("lib-a", index=index)) is lib_a
+    assert PackageMetaInfo("tb_x").dependencies[0].metainfo is not lib_b  # packages without index are never shared
+
+
+def test_shared_package_threads(site_packages: FakeSitePackages, monkeypatch: pytest.MonkeyPatch):
+    """Test that a package shared between threads is never seen partially resolved."""
+    for i in range(5):
+        site_packages.install(f"lib{i}")
+    site_packages.install("common", requires=[f"lib{i}" for i in range(5)])
+    index = DistributionIndex([str(site_packages.root)])
+    common = index.intern(PackageMetaInfo("common", index=index))
+
+    discover = PackageMetaInfo._discover_dependency
+
+    def slow_discover(self: PackageMetaInfo, *args: object) -> object:
+        time.sleep(0.01)
+        return discover(self, *args)  # type: ignore
+
+    monkeypatch.setattr(PackageMetaInfo, "_discover_dependency", slow_discover)
+    results = []
+
+    def resolve() -> None:
+        # names are taken immediately, as a list filled later would look complete at the end
+        results.append([d.metainfo.name for d in common.dependencies])
+
+    threads = [threading.Thread(target=resolve) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [[f"lib{i}" for i in range(5)]] * 4
+
+
+def _requirements(tmp_path: Path, text: str) -> str:
+    """Write requirements file."""
+    path = tmp_path / "requirements.txt"
+    path.write_text(text)
+    return str(path)
@@ -0,0 +1,55 @@
+"""Tests of `ninja` module."""
+from pip_hdl.graph import DependencyGraph
+from pip_hdl.metainfo import PackageMetaInfo
+from pip_hdl.ninja import TOOLS, NinjaTool, generate_ninja
+from tests.conftest import FakeSitePackages
+
+
+def _install(site_packages: FakeSitePackages) -> DependencyGraph:
+    """Install `top`, which requires `lib_b` and `lib_a`."""
+    site_packages.install("lib_a", sources={"lib_a_pkg.sv": "", "inc/defs.svh": ""})
+    site_packages.install("lib_b", requires=["lib-a"])
+    site_packages.install("top", requires=["lib-b"])
+    return DependencyGraph([PackageMetaInfo("top")])
+
+
+def test_generate(site_packages: FakeSitePackages):
+    """Test that every package has its own edge with sources as implicit inputs."""
+    graph = _install(site_packages)
+    root = site_packages.root
+    text = generate_ninja(graph, TOOLS["questa"], env={})
+    lines = text.splitlines()
+
+    assert f"exports = export LIB_A_SOURCES_ROOT={root / 'lib_a'} LIB_B_SOURCES_ROOT" in text
+    assert (
+        f"build pip_hdl_build/lib_a.stamp: compile {root / 'lib_a' / 'filelist.f'} | "
+        f"{root / 'lib_a' / 'lib_a_pkg.sv'} {root / 'lib_a' / 'inc/defs.svh'}"
+    ) in lines
+    assert (
+        f"build pip_hdl_build/top.stamp: compile {root / 'top' / 'filelist.f'} | {root / 'top' / 'top_pkg.sv'} "
+        "|| pip_hdl_build/lib_b.stamp"
+    ) in lines
+    assert (
+        "  cmd = vlib pip_hdl_build/top && vlog -work pip_hdl_build/top -L pip_hdl_build/lib_a -L pip_hdl_build/lib_b "
+        f"-f {root / 'top' / 'filelist.f'}"
+    ) in lines
+    assert "build top: phony pip_hdl_build/top.stamp" in lines
+    assert lines[-2:] == [
+        "build all: phony pip_hdl_build/lib_a.stamp pip_hdl_build/lib_b.stamp pip_hdl_build/top.stamp",
+        "default all",
+    ]
+
+
+def test_custom_tool(site_packages: FakeSitePackages):
+    """Test custom templates, rebuild of dependants and escaping."""
+    graph = _install(site_packages)
+    tool = NinjaTool("xrun -compile -work {name} {libs} -f {filelist} -define COST=${X} -define {Y}", "-reflib {lib}")
+    lines = generate_ninja(graph, tool, builddir="out dir", rebuild_dependants=True, env={}).splitlines()
+
+    assert (
+        f"  cmd = xrun -compile -work lib_b -reflib 'out dir/lib_a' -f {graph.nodes['lib_b'].metainfo.filelist} "
+        "-define COST=$${X} -define {Y}" in lines
+    )
+    top_edge = next(line for line in lines if line.startswith("build out$ dir/top.stamp"))
+    assert top_edge.endswith("| " + str(site_packages.root / "top" / "top_pkg.sv") + " out$ dir/lib_b.stamp")
+    assert "||" not in top_edge
@@ -0,0 +1,63 @@
+"""Tests of `report` module."""
+import json
+import subprocess
+from pathlib import Path
+
+from pip_hdl.graph import DependencyGraph
+from pip_hdl.metainfo import PackageMetaInfo
+from pip_hdl.report import InspectionReport, write_if_changed
+from tests.conftest import FakeSitePackages
+
+
+def _report(site_packages: FakeSitePackages) -> InspectionReport:
+    """Create report for a simple chain of packages."""
+    site_packages.install("lib_a")
+    site_packages.install("top", requires=["lib-a"])
+    packages = [PackageMetaInfo("top")]
+    return InspectionReport(packages, DependencyGraph(packages))
+
+
+def test_makefile(site_packages: FakeSitePackages):
+    """Test Makefile fragment."""
+    text = _report(site_packages).as_makefile()
+    root = site_packages.root
+
+    assert f"export LIB_A_SOURCES_ROOT := {root / 'lib_a'}\n" in text
+    assert f"export TOP_SOURCES_ROOT := {root / 'top'}\n" in text
+    assert f"PIP_HDL_FILELIST := {root / 'top' / 'filelist.f'}\n" in text
+    assert (
+        f"PIP_HDL_ALL_FILELISTS_AS_ARGS := -f {root / 'lib_a' / 'filelist.f'} -f {root / 'top' / 'filelist.f'}\n"
+        in text
+    )
+
+
+def test_shell(site_packages: FakeSitePackages):
+    """Test shell script can be sourced."""
+    text = _report(site_packages).as_shell()
+    script = f"{text}\necho $LIB_A_SOURCES_ROOT\necho $PIP_HDL_ALL_SOURCES_ROOTS\n"
+
+    result = subprocess.run(["sh", "-c", script], capture_output=True, text=True, check=True)
+
+    root = site_packages.root
+    assert result.stdout.splitlines() == [str(root / "lib_a"), f"{root / 'lib_a'} {root / 'top'}"]
+
+
+def test_json(site_packages: FakeSitePackages):
+    """Test JSON report."""
+    data = json.loads(_report(site_packages).as_json())
+    root = site_packages.root
+
+    assert data["sources_root"] == str(root / "top")
+    assert data["all_filelists"] == [str(root / "lib_a" / "filelist.f"), str(root / "top" / "filelist.f")]
+    assert data["all_sources_vars"][0] == {"name": "LIB_A_SOURCES_ROOT", "value": str(root / "lib_a")}
+
+
+def test_write_if_changed(tmp_path: Path):
+    """Test that file is written only if content is changed."""
+    path = tmp_path / "out.mk"
+
+    assert write_if_changed(path, "foo\n")
+    assert not write_if_changed(path, "foo\n")
+    assert write_if_changed(path, "bar\n")
+    assert path.read_text() == "bar\n"
+    assert [p.name for p in tmp_path.iterdir()] == ["out.mk"]
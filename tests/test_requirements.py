@@ -0,0 +1,87 @@
+"""Tests of `requirements` module."""
+from pathlib import Path
+
+import pytest
+from packaging.requirements import InvalidRequirement
+
+from pip_hdl.requirements import load_packages, read_requirements, request_key
+from tests.conftest import FakeSitePackages
+
+
+def test_read(tmp_path: Path):
+    """Test reading of requirements file syntax."""
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "common.txt").write_text("common-lib>=1.0  # nested\n")
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text(
+        """# comment
+
+--index-url https://example.com/simple
+-r sub/common.txt
+foo_agent==0.1.0 \\
+    --hash=sha256:0123456789abcdef
+bar[sim,extra]>=2 ; python_version >= "3"
+never ; python_version < "3"
+-e ./local/package[sim]
+--editable=git+https://example.com/repo.git#egg=remote_lib
+baz
+"""
+    )
+    (tmp_path / "local" / "package").mkdir(parents=True)
+    (tmp_path / "local" / "package" / "setup.cfg").write_text("[metadata]\nname = local-lib\n")
+
+    assert [str(r) for r in read_requirements(requirements)] == [
+        "common-lib>=1.0",
+        "foo_agent==0.1.0",
+        'bar[extra,sim]>=2; python_version >= "3"',
+        "local-lib[sim]",
+        "remote_lib",
+        "baz",
+    ]
+
+
+def test_read_errors(tmp_path: Path):
+    """Test that errors are reported with location."""
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("foo\nbar==\n")
+    with pytest.raises(InvalidRequirement, match=r"requirements.txt:2: "):
+        list(read_requirements(requirements))
+
+    requirements.write_text("-r requirements.txt\n")
+    with pytest.raises(InvalidRequirement, match="recursive include"):
+        list(read_requirements(requirements))
+
+    requirements.write_text("-e git+https://example.com/repo.git\n")
+    with pytest.raises(InvalidRequirement, match="requirements.txt:1: can't find project name"):
+        list(read_requirements(requirements))
+
+
+def test_request_key(tmp_path: Path):
+    """Test that key depends on nested requirements and ignores formatting."""
+    (tmp_path / "common.txt").write_text("foo\n")
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("-r common.txt\nbar  # comment\n")
+    key = request_key(str(requirements))
+
+    requirements.write_text("-r common.txt\n\nbar\n")
+    assert request_key(str(requirements)) == key
+    (tmp_path / "common.txt").write_text("foo>=1\n")
+    assert request_key(str(requirements)) != key
+    assert request_key("foo") == "foo"
+
+
+def test_load_packages(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test that packages are named after entry points and extras select optional dependencies."""
+    site_packages.install("lib_a")
+    site_packages.install("lib_sim")
+    site_packages.install("top", requires=["lib-a", 'lib-sim; extra == "sim"', 'lib-a; python_version < "3"'])
+    requirements = tmp_path / "requirements.txt"
+
+    requirements.write_text("Top\n")
+    (top,) = load_packages(str(requirements))
+    assert top.name == "top"
+    assert [d.metainfo.name for d in top.dependencies] == ["lib_a"]
+
+    requirements.write_text("top[sim]\n")
+    (top,) = load_packages(str(requirements))
+    assert [d.metainfo.name for d in top.dependencies] == ["lib_a", "lib_sim"]
@@ -0,0 +1,100 @@
+"""Tests of `scheduler` module."""
+import threading
+import time
+from typing import List
+
+import pytest
+
+from pip_hdl.graph import DependencyGraph, GraphNode
+from pip_hdl.metainfo import PackageMetaInfo
+from pip_hdl.scheduler import CommandTask, GraphExecutionError, run_graph
+from tests.conftest import FakeSitePackages
+from tests.test_graph import MockPackageMetaInfo
+
+
+def _graph() -> DependencyGraph:
+    """Create graph: `a` and `c` are independent, `b` requires `a`, `d` requires `b` and `c`."""
+    a_pkg = MockPackageMetaInfo("a", [])
+    b_pkg = MockPackageMetaInfo("b", [a_pkg])
+    c_pkg = MockPackageMetaInfo("c", [])
+    d_pkg = MockPackageMetaInfo("d", [b_pkg, c_pkg])
+    return DependencyGraph([d_pkg])
+
+
+def test_run_order():
+    """Test that tasks are started only after tasks for upstreams are finished."""
+    finished: List[str] = []
+    lock = threading.Lock()
+
+    def task(node: GraphNode) -> str:
+        with lock:
+            assert all(u.id in finished for u in node.upstreams)
+        time.sleep(0.01)
+        with lock:
+            finished.append(node.id)
+        return node.id.upper()
+
+    results = run_graph(_graph(), task, jobs=4)
+
+    assert results == {"a": "A", "b": "B", "c": "C", "d": "D"}
+    assert finished[-1] == "d"
+
+
+def test_run_concurrently():
+    """Test that independent tasks are run in parallel."""
+    barrier = threading.Barrier(2, timeout=5)
+
+    def task(node: GraphNode) -> None:
+        if node.id in ("a", "c"):
+            barrier.wait()  # deadlock if tasks are serialized
+
+    run_graph(_graph(), task, jobs=2)
+
+
+def test_keep_going():
+    """Test that only downstreams of a failed task are skipped in keep-going mode."""
+    started: List[str] = []
+
+    def task(node: GraphNode) -> None:
+        started.append(node.id)
+        if node.id == "a":
+            raise ValueError("a is broken")
+
+    with pytest.raises(GraphExecutionError) as excinfo:
+        run_graph(_graph(), task, jobs=1, keep_going=True)
+
+    assert set(excinfo.value.failed) == {"a"}
+    assert excinfo.value.skipped == ["b", "d"]
+    assert sorted(started) == ["a", "c"]
+
+
+def test_fail_fast():
+    """Test that no new tasks are started after failure."""
+    started: List[str] = []
+
+    def task(node: GraphNode) -> None:
+        started.append(node.id)
+        raise ValueError(f"{node.id} is broken")
+
+    with pytest.raises(GraphExecutionError) as excinfo:
+        run_graph(_graph(), task, jobs=1)
+
+    assert started == ["a"]
+    assert excinfo.value.skipped == ["b", "c", "d"]
+
+
+def test_command_task(site_packages: FakeSitePackages, capsys: pytest.CaptureFixture):
+    """Test running shell command for packages."""
+    site_packages.install("lib_a")
+
+    graph = DependencyGraph([PackageMetaInfo("lib_a")])
+    results = run_graph(graph, CommandTask("echo {name} {sources_var} {filelist}"))
+
+    assert results == {"lib_a": f"lib_a LIB_A_SOURCES_ROOT {site_packages.root / 'lib_a' / 'filelist.f'}\n"}
+    assert "[lib_a] echo lib_a" in capsys.readouterr().out
+    with pytest.raises(GraphExecutionError):
+        run_graph(graph, CommandTask("exit 3"))
+
+    # braces of shell and awk are not fields
+    results = run_graph(graph, CommandTask("name=x; echo ${name} {name} | awk '{print $2}'"))
+    assert results == {"lib_a": "lib_a\n"}
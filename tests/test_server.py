@@ -0,0 +1,112 @@
+"""Tests of `server` module."""
+import socket
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+from pip_hdl.metainfo import DistributionIndex, PackageMetaInfo
+from tests.conftest import FakeSitePackages
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets are required")
+
+
+@pytest.fixture
+def socket_path() -> Iterator[Path]:
+    """Short path for a socket, as its length is limited."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield Path(tmp_dir) / "test.sock"
+
+
+def test_query(site_packages: FakeSitePackages, socket_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """Test that daemon answers queries and keeps resolved packages until the environment is changed."""
+    from pip_hdl.server import ResolverServer, WarmResolver, query
+
+    site_packages.install("lib_a")
+    site_packages.install("top", requires=["lib-a"])
+    loaded: List[str] = []
+
+    def load_packages(obj: str, index: DistributionIndex) -> List[PackageMetaInfo]:
+        loaded.append(obj)
+        return [PackageMetaInfo(obj, index=index)]
+
+    monkeypatch.setattr("pip_hdl.server.load_packages", load_packages)
+    resolver = WarmResolver()
+
+    def handle(request: Dict[str, Any]) -> str:
+        if request["obj"] == "fail":
+            raise ValueError("fail")
+        _, graph = resolver.resolve(request["obj"])
+        return " ".join(n.id for n in graph.traverse(key=lambda n: n.id))
+
+    assert query(socket_path, {"obj": "top"}) is None  # no daemon yet
+
+    with ResolverServer(socket_path, handle) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            assert query(socket_path, {"obj": "top"}) == {"text": "lib_a top"}
+            assert query(socket_path, {"obj": "top"}) == {"text": "lib_a top"}
+            assert loaded == ["top"]
+            assert query(socket_path, {"obj": "fail"}) == {"error": "ValueError: fail"}
+
+            site_packages.install("other")
+            assert query(socket_path, {"obj": "top"}) == {"text": "lib_a top"}
+            assert loaded == ["top", "top"]
+            assert (resolver.hits, resolver.misses) == (1, 2)
+        finally:
+            server.shutdown()
+            thread.join()
+
+    assert not socket_path.exists()
+
+
+def test_stale_socket(socket_path: Path):
+    """Test that socket left by a killed daemon is replaced."""
+    from pip_hdl.server import ResolverServer
+
+    socket_path.touch()
+    with ResolverServer(socket_path, lambda request: ""):
+        assert socket_path.is_socket()
+
+
+def test_default_socket_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """Test that socket is placed within a private directory, and a directory of someone else is rejected."""
+    from pip_hdl.server import SOCKET_ENV_VAR, default_socket_path
+
+    monkeypatch.delenv(SOCKET_ENV_VAR, raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    path = default_socket_path()
+    assert path.parent.parent == tmp_path
+    assert path.parent.stat().st_mode & 0o777 == 0o700
+
+    path.parent.chmod(0o777)
+    with pytest.raises(PermissionError, match="0700 mode"):
+        default_socket_path()
+
+
+def test_query_rejected(socket_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """Test that socket of another user is not connected, and requests of another environment are rejected."""
+    from pip_hdl import server
+
+    with server.ResolverServer(socket_path, lambda request: "ok") as daemon:
+        thread = threading.Thread(target=daemon.serve_forever)
+        thread.start()
+        try:
+            assert server.query(socket_path, {}) == {"text": "ok"}
+            assert socket_path.stat().st_mode & 0o777 == 0o600
+
+            monkeypatch.setattr("sys.path", [*sys.path, "/other/site-packages"])
+            assert server.query(socket_path, {}) == {
+                "error": "ValueError: Request is sent from another Python environment"
+            }
+            monkeypatch.undo()
+
+            monkeypatch.setattr(server, "_user_id", lambda: -1)
+            assert server.query(socket_path, {}) is None
+        finally:
+            daemon.shutdown()
+            thread.join()
@@ -0,0 +1,106 @@
+"""Tests of `symbols` module."""
+from pathlib import Path
+
+import pytest
+
+from pip_hdl.graph import DependencyGraph
+from pip_hdl.metainfo import PackageMetaInfo
+from pip_hdl.symbols import SymbolIndex, SymbolKind, lex_sv, lex_vhdl
+from tests.conftest import FakeSitePackages
+
+
+def _install(site_packages: FakeSitePackages) -> DependencyGraph:
+    """Install `top` testbench, which uses `lib_b` (and `lib_a` through it), but not `vip`."""
+    site_packages.install(
+        "lib_a", sources={"fifo.sv": "module fifo;\nendmodule\n", "a_pkg.sv": "package a_pkg;\nendpackage\n"}
+    )
+    site_packages.install(
+        "lib_b", requires=["lib-a"], sources={"bus.sv": "module bus;\n  fifo u_fifo ();\nendmodule\n"}
+    )
+    site_packages.install("vip", sources={"vip.sv": "module fifo;\nendmodule\n", "mon.vhd": "entity mon is\nend;\n"})
+    site_packages.install(
+        "top", requires=["lib-b", "vip"], sources={"tb_top.sv": "module tb_top;\n  bus u_bus ();\nendmodule\n"}
+    )
+    return DependencyGraph([PackageMetaInfo("top")])
+
+
+def test_lex_sv():
+    """Test that declarations and references are found, while comments, strings and keywords are skipped."""
+    symbols = lex_sv(
+        "// module skipped;\n"
+        "package automatic my_pkg;\n"
+        "  import uvm_pkg::*;\n"
+        "  typedef class fwd;\n"
+        "  class item extends uvm_sequence_item; cfg_t cfg; endclass\n"
+        "endpackage\n"
+        "module top #(W = 8) (input logic clk);\n"
+        '  virtual bus_if vif; fifo #(.W(W)) u_fifo (.clk(clk)); initial $display("module x;");\n'
+        "endmodule\n",
+        "a.sv",
+    )
+    assert [(s.kind, s.name, s.line) for s in symbols.definitions] == [
+        (SymbolKind.PACKAGE, "my_pkg", 2),
+        (SymbolKind.CLASS, "item", 5),
+        (SymbolKind.MODULE, "top", 7),
+    ]
+    assert symbols.references == ["bus_if", "cfg_t", "fifo", "uvm_pkg", "uvm_sequence_item"]
+
+
+def test_lex_sv_attributes():
+    """Test that attributes are skipped, but event control `@(*)` is not taken for an attribute."""
+    symbols = lex_sv(
+        "module a; always @(*) x = y; always @( * ) z = w; endmodule\n"
+        'module b; (* dont_touch = "yes" *) fifo u_fifo (); endmodule\n'
+        "(* keep *) module c; endmodule\n",
+        "a.sv",
+    )
+    assert [(s.name, s.line) for s in symbols.definitions] == [("a", 1), ("b", 2), ("c", 3)]
+    assert symbols.references == ["fifo"]
+
+
+def test_lex_vhdl():
+    """Test that VHDL names are case-insensitive and standard libraries are not referenced."""
+    symbols = lex_vhdl(
+        "library ieee; use IEEE.std_logic_1164.all; use work.Util_Pkg.all;\n"
+        "entity Top is end;\n"
+        "architecture rtl of top is begin\n"
+        "  u0: entity work.leaf port map (clk); u1: sub port map (a);\n"
+        "end;\n"
+        "package body util is end;\n",
+        "a.vhd",
+    )
+    assert [(s.kind, s.name, s.line) for s in symbols.definitions] == [(SymbolKind.MODULE, "top", 2)]
+    assert symbols.references == ["leaf", "sub", "util_pkg"]
+
+
+def test_duplicates_and_required(site_packages: FakeSitePackages):
+    """Test that duplicates across packages are reported and unused packages are pruned."""
+    graph = _install(site_packages)
+    index = SymbolIndex.build(graph, env={}, jobs=1)
+
+    (duplicate,) = index.duplicates()
+    assert duplicate.name == "fifo"
+    assert [p for p, _ in duplicate.definitions] == ["lib_a", "vip"]
+    assert str(duplicate).startswith(f"fifo: lib_a module fifo ({site_packages.root / 'lib_a' / 'fifo.sv'}:1), vip")
+
+    # `fifo` is used by `lib_b`, so the one of its dependency is preferred
+    assert [n.id for n in index.required(graph, ["tb_top"])] == ["lib_a", "lib_b", "top"]
+    assert [n.id for n in index.required(graph, ["mon"])] == ["vip"]
+    with pytest.raises(KeyError, match="'missing' is not declared"):
+        index.required(graph, ["missing"])
+
+
+def test_cache(site_packages: FakeSitePackages, tmp_path: Path):
+    """Test that only changed files are lexed again."""
+    graph = _install(site_packages)
+    cache_dir = tmp_path / "symbols"
+
+    assert SymbolIndex.build(graph, env={}, jobs=2, cache_dir=cache_dir).lexed == 6
+    assert len(list(cache_dir.iterdir())) == 4
+    assert SymbolIndex.build(graph, env={}, cache_dir=cache_dir).lexed == 0
+
+    (site_packages.root / "vip" / "vip.sv").write_text("module vip_fifo;\nendmodule\n")
+    index = SymbolIndex.build(graph, env={}, cache_dir=cache_dir)
+    assert index.lexed == 1
+    assert index.duplicates() == []
+    assert [p for p, _ in index.definers("vip_fifo")] == ["vip"]
@@ -0,0 +1,110 @@
+"""Tests of `template` module."""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+from pip_hdl.template import SpecError, TemplateConfig, load_spec, template_package_example, template_packages
+
+SPEC_TOML = """
+[defaults]
+author_name = "John Doe <johndoe@mail.com>"
+is_private_package = true
+
+[[packages]]
+package_name = "my_lib"
+
+[[packages]]
+package_name = "my_ip"
+package_description = "My IP core"
+dependencies = {my_lib = "^0.1.0"}
+"""
+
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="tomllib is required")
+def test_load_toml_spec(tmp_path: Path):
+    """Test that TOML spec is loaded with defaults applied."""
+    toml_spec = tmp_path / "spec.toml"
+    toml_spec.write_text(SPEC_TOML)
+    lib, ip = load_spec(toml_spec)
+    assert lib == TemplateConfig("my_lib", "", "John Doe <johndoe@mail.com>", True)
+    assert ip.dependencies == {"my-lib": "^0.1.0"}
+
+
+def test_load_json_spec(tmp_path: Path):
+    """Test that JSON spec is loaded with dependencies listed without versions."""
+    json_spec = tmp_path / "spec.json"
+    json_spec.write_text(json.dumps({"packages": [{"package_name": "a", "author_name": "x", "dependencies": ["b"]}]}))
+    (a,) = load_spec(json_spec)
+    assert (a.is_private_package, a.dependencies) == (False, {"b": "*"})
+
+
+@pytest.mark.parametrize(
+    "spec, match",
+    [
+        ({"packages": [{"package_name": "a"}]}, "author_name are required"),
+        ({"packages": [{"package_name": "a", "author_name": "x", "version": "1"}]}, "unknown fields version"),
+        ({"defaults": {"author_name": "x"}, "packages": [{"package_name": "a"}] * 2}, "more than once: a"),
+        ({"package_name": "a"}, "list of 'packages'"),
+        ({"packages": [{"package_name": "../a", "author_name": "x"}]}, "'../a' is not a valid Python identifier"),
+        ({"packages": [{"package_name": 1, "author_name": "x"}]}, "1 is not a valid Python identifier"),
+    ],
+)
+def test_invalid_spec(tmp_path: Path, spec: dict, match: str):
+    """Test that invalid spec is reported."""
+    path = tmp_path / "spec.json"
+    path.write_text(json.dumps(spec))
+    with pytest.raises(SpecError, match=match):
+        load_spec(path)
+
+
+def test_unreadable_spec(tmp_path: Path):
+    """Test that a spec, which can't be read or decoded, is reported as invalid."""
+    path = tmp_path / "spec.json"
+    with pytest.raises(SpecError, match="spec.json: .*No such file"):
+        load_spec(path)
+    path.write_text("{")
+    with pytest.raises(SpecError, match="spec.json: Expecting property name"):
+        load_spec(path)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="tomllib is required")
+def test_pyproject_escaping(tmp_path: Path):
+    """Test that values given by user are quoted and escaped within pyproject.toml."""
+    import tomllib  # type: ignore
+
+    cfg = TemplateConfig("my_ip", 'My "IP"\\core', "x", False, dependencies={"my.lib": ">=1.0,<2", "b": "*"})
+    template_packages(tmp_path, [cfg])
+    with (tmp_path / "my_ip" / "pyproject.toml").open("rb") as f:
+        poetry = tomllib.load(f)["tool"]["poetry"]
+    assert poetry["description"] == 'My "IP"\\core'
+    assert {k: v for k, v in poetry["dependencies"].items() if k in cfg.dependencies} == cfg.dependencies
+
+
+def test_template_packages(tmp_path: Path):
+    """Test that projects are generated in place and unchanged files are not rewritten."""
+    configs = [
+        TemplateConfig("my_lib", "", "x", False),
+        TemplateConfig("my_ip", "", "x", False, dependencies={"my-lib": "^0.1.0"}),
+    ]
+    written = template_packages(tmp_path, configs, jobs=2)
+    assert {k: len(v) for k, v in written.items()} == {"my_lib": 4, "my_ip": 4}
+    pyproject = (tmp_path / "my_ip" / "pyproject.toml").read_text()
+    assert 'pip_hdl = "^' in pyproject and '"my-lib" = "^0.1.0"\n' in pyproject
+
+    extra_file = tmp_path / "my_ip" / "my_ip" / "my_ip_core.sv"
+    extra_file.write_text("module my_ip_core;\nendmodule\n")
+    configs[1].package_description = "My IP core"
+    assert template_packages(tmp_path, configs) == {"my_lib": [], "my_ip": [tmp_path / "my_ip" / "pyproject.toml"]}
+    assert extra_file.exists()
+
+
+def test_interactive_template_is_the_same(tmp_path: Path):
+    """Test that batch and interactive generation produce the same project."""
+    cfg = TemplateConfig("my_ip", "My IP core", "x", True)
+    template_package_example(tmp_path / "interactive", cfg)
+    template_packages(tmp_path / "batch", [cfg])
+    for file in (tmp_path / "interactive").rglob("*"):
+        if file.is_file():
+            assert file.read_text() == (tmp_path / "batch" / file.relative_to(tmp_path / "interactive")).read_text()
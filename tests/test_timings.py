@@ -0,0 +1,63 @@
+"""Tests of `timings` module."""
+import json
+import threading
+from typing import Iterator
+
+import pytest
+
+from pip_hdl import timings
+
+
+@pytest.fixture
+def recorder() -> Iterator[timings.Recorder]:
+    """Enabled recorder, which is disabled after the test."""
+    yield timings.enable()
+    timings.disable()
+
+
+def test_disabled():
+    """Test that nothing is recorded by default."""
+    assert timings.span("phase") is timings.span("other.phase", package="foo")
+    with timings.span("phase"):
+        pass
+
+
+def test_spans(recorder: timings.Recorder):
+    """Test recording of nested spans from different threads and their export."""
+
+    def task() -> None:
+        with timings.span("metainfo.filelist", package="bar"):
+            pass
+
+    with timings.span("cli.resolve"):
+        with timings.span("metainfo.filelist", package="foo"):
+            pass
+        thread = threading.Thread(target=task)
+        thread.start()
+        thread.join()
+
+    assert [s.name for s in recorder.spans] == ["metainfo.filelist", "metainfo.filelist", "cli.resolve"]
+    assert recorder.spans[0].thread_id != recorder.spans[1].thread_id
+    outer = recorder.spans[-1]
+    assert all(outer.start_ns <= s.start_ns and s.duration_ns <= outer.duration_ns for s in recorder.spans)
+
+    summary = recorder.summary()
+    assert summary.splitlines()[1].split()[:2] == ["cli.resolve", "1"]
+    assert "metainfo.filelist" in summary and "slowest packages:" in summary
+
+    events = json.loads(recorder.chrome_trace())["traceEvents"]
+    assert [e["cat"] for e in events] == ["metainfo", "metainfo", "cli"]
+    assert events[0]["ph"] == "X" and events[0]["args"] == {"package": "foo"}
+
+
+def test_env(monkeypatch: pytest.MonkeyPatch):
+    """Test that recording can be requested with environment variables."""
+    monkeypatch.delenv(timings.ENV_VAR, raising=False)
+    monkeypatch.delenv(timings.TRACE_ENV_VAR, raising=False)
+    assert not timings.summary_requested() and timings.trace_requested() is None
+
+    monkeypatch.setenv(timings.ENV_VAR, "0")
+    assert not timings.summary_requested()
+    monkeypatch.setenv(timings.ENV_VAR, "1")
+    monkeypatch.setenv(timings.TRACE_ENV_VAR, "trace.json")
+    assert timings.summary_requested() and str(timings.trace_requested()) == "trace.json"
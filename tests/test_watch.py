@@ -0,0 +1,106 @@
+"""Tests of `watch` module."""
+import json
+import os
+import struct
+import sys
+import threading
+import time
+
+import pytest
+
+from pip_hdl.graph import DependencyGraph
+from pip_hdl.metainfo import PackageMetaInfo
+from pip_hdl.watch import InotifyBackend, SourceWatcher, WatchEvent
+from tests.conftest import FakeSitePackages
+
+BACKENDS = [
+    pytest.param(True, id="inotify", marks=pytest.mark.skipif(sys.platform != "linux", reason="inotify is required")),
+    pytest.param(False, id="polling"),
+]
+
+
+def _install(site_packages: FakeSitePackages) -> DependencyGraph:
+    """Install `top`, which requires `lib_b`, which requires `lib_a`."""
+    site_packages.install("lib_a")
+    site_packages.install("lib_b", requires=["lib-a"])
+    site_packages.install("top", requires=["lib-b"])
+    return DependencyGraph([PackageMetaInfo("top")])
+
+
+@pytest.mark.parametrize("use_inotify", BACKENDS)
+def test_watch(site_packages: FakeSitePackages, use_inotify: bool):
+    """Test that a change is reported with all dependants in dependency-aware order."""
+    graph = _install(site_packages)
+    root = site_packages.root
+
+    with SourceWatcher(graph, debounce=0.1, interval=0.02, use_inotify=use_inotify) as watcher:
+        assert watcher.wait(timeout=0.1) is None
+
+        (root / "lib_a" / "lib_a_pkg.sv").write_text("package lib_a_pkg;\n  int x;\nendpackage\n")
+        event = watcher.wait(timeout=5)
+        assert event is not None
+        assert (event.changed, event.affected) == (["lib_a"], ["lib_a", "lib_b", "top"])
+        assert str(root / "lib_a" / "lib_a_pkg.sv") in event.paths
+
+        # burst of changes is a single event, changes out of sources are ignored
+        (root / "top" / "__pycache__").mkdir()
+        (root / "top" / "__pycache__" / "top.pyc").write_text("x")
+        (root / "top" / "inc").mkdir()
+        (root / "top" / "inc" / "defs.svh").write_text("`define X 1\n")
+        (root / "lib_b" / "filelist.f").write_text("")
+        event = watcher.wait(timeout=5)
+        assert event is not None
+        assert (event.changed, event.affected) == (["lib_b", "top"], ["lib_b", "top"])
+        assert not any("__pycache__" in p for p in event.paths)
+        assert watcher.wait(timeout=0.1) is None
+
+
+def test_max_delay(site_packages: FakeSitePackages):
+    """Test that constant changes are reported after the maximum delay."""
+    graph = _install(site_packages)
+    path = site_packages.root / "lib_a" / "log.sv"
+
+    with SourceWatcher(graph, debounce=0.1, interval=0.02, use_inotify=False, max_delay=0.3) as watcher:
+        stop = threading.Event()
+
+        def write() -> None:
+            i = 0
+            while not stop.wait(0.01):
+                path.write_text(str(i))
+                i += 1
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            start = time.monotonic()
+            event = watcher.wait(timeout=5)
+            assert event is not None and event.changed == ["lib_a"]
+            assert time.monotonic() - start < 2
+        finally:
+            stop.set()
+            writer.join()
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="inotify is required")
+def test_inotify_overflow(site_packages: FakeSitePackages, monkeypatch: pytest.MonkeyPatch):
+    """Test that all packages are reported as changed, if inotify events are lost."""
+    graph = _install(site_packages)
+    read = os.read
+    overflow = [struct.pack("iIII", -1, InotifyBackend._IN_Q_OVERFLOW, 0, 0)]
+
+    def read_overflow(fd: int, size: int) -> bytes:
+        return overflow.pop() if overflow else read(fd, size)
+
+    with SourceWatcher(graph, debounce=0.1, use_inotify=True) as watcher:
+        monkeypatch.setattr(os, "read", read_overflow)
+        (site_packages.root / "top" / "new_dir").mkdir()
+        event = watcher.wait(timeout=5)
+        assert event is not None
+        assert (event.changed, event.affected) == (["lib_a", "lib_b", "top"], ["lib_a", "lib_b", "top"])
+
+
+def test_event_format():
+    """Test text and JSON lines of events."""
+    event = WatchEvent(changed=["a", "b"], affected=["a", "b", "c"], paths=["/a/x.sv"])
+    assert str(event) == "a,b a b c"
+    assert json.loads(event.to_json()) == {"changed": ["a", "b"], "affected": ["a", "b", "c"], "paths": ["/a/x.sv"]}